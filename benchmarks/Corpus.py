@@ -0,0 +1,165 @@
+import random
+from datetime import datetime, timedelta
+from typing import List
+
+
+# recurrence rules assigned to recurring events, all supported by calpy.ical.RRULE
+RRULES = ('FREQ=DAILY;COUNT=10', 'FREQ=WEEKLY', 'FREQ=WEEKLY;BYDAY=MO,WE,FR;COUNT=30', 'FREQ=MONTHLY;BYMONTHDAY=1,15',
+          'FREQ=YEARLY', 'FREQ=WEEKLY;INTERVAL=2;BYDAY=TU')
+
+# embedded into the resources of a corpus with timezones, events then refer to it by TZID
+VTIMEZONE = ('BEGIN:VTIMEZONE\r\nTZID:Europe/Berlin\r\nBEGIN:DAYLIGHT\r\nTZOFFSETFROM:+0100\r\nTZOFFSETTO:+0200\r\n'
+             'TZNAME:CEST\r\nDTSTART:19700329T020000\r\nRRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU\r\nEND:DAYLIGHT\r\n'
+             'BEGIN:STANDARD\r\nTZOFFSETFROM:+0200\r\nTZOFFSETTO:+0100\r\nTZNAME:CET\r\nDTSTART:19701025T030000\r\n'
+             'RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU\r\nEND:STANDARD\r\nEND:VTIMEZONE\r\n')
+
+NAMES = ('Anna Schmidt', 'Ben Carter', 'Chloé Dubois', 'Dmitri Ivanov', 'Emma Larsen', 'Farid Haddad', 'Grace Kim',
+         'Hiro Tanaka', 'Isabel Díaz', 'Jonas Weber')
+
+WORDS = ('meeting', 'review', 'planning', 'budget', 'release', 'team', 'customer', 'call', 'sync', 'design',
+         'roadmap', 'retro', 'lunch', 'workshop', 'interview', 'deadline', 'report', 'quarterly', 'demo', 'travel')
+
+
+def _content_line(name: str, params: dict, value: str) -> str:
+    """ folded, CRLF terminated content line
+
+    deliberately independent of calpy.ical.Writer: the corpus is benchmark input and must not change along with
+    the code being measured.
+    """
+    if params:
+        name += ''.join(';%s=%s' % (k, '"%s"' % v if any(c in v for c in ';:,') else v) for k, v in params.items())
+    line = '%s:%s' % (name, value)
+
+    # fold at 75 octets, never inside a multi-byte character, continuation lines start with a space
+    parts = []
+    start = size = 0
+    limit = 75
+    for idx, char in enumerate(line):
+        char_size = len(char.encode('utf-8'))
+        if size + char_size > limit:
+            parts.append(line[start:idx])
+            start, size, limit = idx, 0, 74
+        size += char_size
+    parts.append(line[start:])
+    return '\r\n '.join(parts) + '\r\n'
+
+
+class Corpus(object):
+    """ deterministic generator of synthetic iCalendar resources
+
+    every resource is derived from the seed and its uid alone, so a corpus is identical across runs, machines and
+    python versions, and any part of it can be generated without the rest. events start within a year from
+    `start`, last 30 minutes to 3 hours and a share of `recurring` of them are series.
+    """
+
+    def __init__(self, seed: int=0, recurring: float=0.1, payload: int=0, attendees: int=0, timezone: bool=False,
+                 start: datetime=datetime(2020, 1, 6)):
+        """
+        :param recurring: share of events carrying an RRULE
+        :param payload: characters of DESCRIPTION text per event/todo, folded like a real client would
+        :param attendees: ATTENDEE lines (plus an ORGANIZER) per event
+        :param timezone: embed a VTIMEZONE into every resource and give the times of its components as its local time
+        """
+        self.seed = seed
+        self.recurring = recurring
+        self.payload = payload
+        self.attendees = attendees
+        self.timezone = timezone
+        self.start = start
+
+    def _random(self, uid: str) -> random.Random:
+        return random.Random('%s/%s' % (self.seed, uid))
+
+    @staticmethod
+    def _text(rng: random.Random, length: int) -> str:
+        words = []
+        size = 0
+        while size < length:
+            word = rng.choice(WORDS)
+            words.append(word)
+            size += len(word) + 1
+        return ' '.join(words)[:length].rstrip()
+
+    def _start(self, rng: random.Random) -> datetime:
+        return self.start + timedelta(days=rng.randrange(365), hours=8 + rng.randrange(10),
+                                      minutes=15 * rng.randrange(4))
+
+    def _time(self, name: str, dt: datetime) -> str:
+        return _content_line(name, {'TZID': 'Europe/Berlin'} if self.timezone else None, dt.strftime('%Y%m%dT%H%M%S'))
+
+    @staticmethod
+    def _attendee(name: str, role: str='REQ-PARTICIPANT', partstat: str='NEEDS-ACTION') -> str:
+        address = 'mailto:%s@example.com' % name.split()[0].lower().encode('ascii', 'ignore').decode()
+        return _content_line('ATTENDEE', {'CN': name, 'ROLE': role, 'PARTSTAT': partstat, 'RSVP': 'TRUE'}, address)
+
+    def event_lines(self, uid: str, rng: random.Random=None) -> List[str]:
+        """ content lines (CRLF terminated) of the VEVENT with the given uid """
+        rng = rng or self._random(uid)
+        start = self._start(rng)
+        end = start + timedelta(minutes=30 * rng.randrange(1, 7))
+
+        lines = ['BEGIN:VEVENT\r\n',
+                 _content_line('UID', None, uid),
+                 _content_line('DTSTAMP', None, '20200101T000000Z'),
+                 _content_line('SUMMARY', None, self._text(rng, rng.randrange(10, 40))),
+                 self._time('DTSTART', start),
+                 self._time('DTEND', end)]
+        if rng.random() < self.recurring:
+            lines.append(_content_line('RRULE', None, rng.choice(RRULES)))
+        if self.payload:
+            lines.append(_content_line('DESCRIPTION', None, self._text(rng, self.payload)))
+        if self.attendees:
+            organizer = rng.choice(NAMES)
+            lines.append(_content_line('ORGANIZER', {'CN': organizer}, 'mailto:%s@example.com'
+                                       % organizer.split()[0].lower()))
+            for i in range(self.attendees):
+                lines.append(self._attendee('%s %s' % (rng.choice(NAMES), i),
+                                            rng.choice(('REQ-PARTICIPANT', 'OPT-PARTICIPANT', 'CHAIR')),
+                                            rng.choice(('ACCEPTED', 'DECLINED', 'TENTATIVE', 'NEEDS-ACTION'))))
+        lines.append('END:VEVENT\r\n')
+        return lines
+
+    def todo_lines(self, uid: str, rng: random.Random=None) -> List[str]:
+        """ content lines (CRLF terminated) of the VTODO with the given uid """
+        rng = rng or self._random(uid)
+        start = self._start(rng)
+
+        lines = ['BEGIN:VTODO\r\n',
+                 _content_line('UID', None, uid),
+                 _content_line('DTSTAMP', None, '20200101T000000Z'),
+                 _content_line('SUMMARY', None, self._text(rng, rng.randrange(10, 40))),
+                 self._time('DTSTART', start),
+                 _content_line('DURATION', None, 'P%sDT%sH' % (rng.randrange(14), rng.randrange(24))),
+                 _content_line('STATUS', None, rng.choice(('NEEDS-ACTION', 'IN-PROCESS', 'COMPLETED'))),
+                 _content_line('PRIORITY', None, str(rng.randrange(10))),
+                 _content_line('CATEGORIES', None, ','.join(rng.sample(WORDS, 3)))]
+        if self.payload:
+            lines.append(_content_line('DESCRIPTION', None, self._text(rng, self.payload)))
+        lines.append('END:VTODO\r\n')
+        return lines
+
+    def calendar(self, uid: str, component: str='VEVENT') -> str:
+        """ iCalendar text of a resource holding the event (or todo) with the given uid """
+        lines = ['BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//calpy//benchmarks//EN\r\n']
+        if self.timezone:
+            lines.append(VTIMEZONE)
+        lines.extend(self.todo_lines(uid) if component == 'VTODO' else self.event_lines(uid))
+        lines.append('END:VCALENDAR\r\n')
+        return ''.join(lines)
+
+    def datetimes(self, count: int) -> List[str]:
+        """ `count` DATE, local and UTC DATE-TIME values, as found in DTSTART/DTEND/DTSTAMP """
+        rng = self._random('datetimes')
+        values = []
+        for i in range(count):
+            dt = self._start(rng) + timedelta(seconds=rng.randrange(3600))
+            values.append(dt.strftime(('%Y%m%d', '%Y%m%dT%H%M%S', '%Y%m%dT%H%M%SZ')[i % 3]))
+        return values
+
+    def durations(self, count: int) -> List[str]:
+        """ `count` DURATION values of weeks, days and times """
+        rng = self._random('durations')
+        return [rng.choice(('P%sW' % rng.randrange(1, 5), 'PT%sH%sM' % (rng.randrange(24), rng.randrange(60)),
+                            'P%sDT%sH%sM%sS' % (rng.randrange(7), rng.randrange(24), rng.randrange(60),
+                                                rng.randrange(60))))
+                for _ in range(count)]
@@ -0,0 +1,97 @@
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+
+def reset_peak_rss():
+    """ restart the peak resident set size measurement of this process, a no-op where Linux' clear_refs is missing """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss() -> int:
+    """ peak resident set size of this process in KiB, since the last reset_peak_rss() where supported """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def environment() -> dict:
+    """ interpreter, machine and commit the benchmarks ran on """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'python': platform.python_version(), 'implementation': platform.python_implementation(),
+            'platform': platform.platform(), 'machine': platform.machine(), 'cpus': os.cpu_count(),
+            'commit': commit, 'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())}
+
+
+class Results(object):
+    """ samples of a benchmark suite run, printed as a table and written as JSON to compare across commits
+
+    every stage may be sampled several times, the summary holds the median of every value.
+    """
+
+    def __init__(self, suite: str, config: dict):
+        self.suite = suite
+        self.config = config
+        self.samples = {}       # type: Dict[str, List[dict]]
+
+    def add(self, name: str, **values):
+        self.samples.setdefault(name, []).append(values)
+
+    def summary(self) -> Dict[str, dict]:
+        return dict((name, dict((key, statistics.median(s[key] for s in samples)) for key in samples[0]))
+                    for name, samples in self.samples.items())
+
+    def as_dict(self) -> dict:
+        return {'suite': self.suite, 'config': self.config, 'environment': environment(),
+                'summary': self.summary(), 'samples': self.samples}
+
+    def write(self, path: str):
+        """ write the results as JSON to `path`, '-' for stdout """
+        if path == '-':
+            json.dump(self.as_dict(), sys.stdout, indent=2)
+            sys.stdout.write('\n')
+            return
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+    def table(self) -> str:
+        summary = self.summary()
+        keys = []
+        for values in summary.values():
+            keys.extend(k for k in values if k not in keys)
+
+        rows = [['stage'] + keys]
+        for name, values in summary.items():
+            rows.append([name] + [self._format(values.get(k)) for k in keys])
+        widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+        return '\n'.join('  '.join(cell.rjust(w) if i else cell.ljust(w)
+                                    for i, (cell, w) in enumerate(zip(row, widths)))
+                         for row in rows)
+
+    @staticmethod
+    def _format(value) -> str:
+        if value is None:
+            return '-'
+        if isinstance(value, float):
+            return '%.4g' % value if abs(value) < 10000 else '%.0f' % value
+        return str(value)
@@ -0,0 +1,313 @@
+import gzip
+import threading
+import time
+import xml.etree.ElementTree as Xml
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+from benchmarks.Corpus import Corpus
+from calpy.caldav.Server import OperationFailed
+from calpy.ical.VCALENDAR import VCALENDAR
+
+
+class Collection(object):
+    """ in-memory calendar collection answering the requests Calendar sends, records the request bodies
+
+    it has the interface of Server (propfind, report, report_stream, put, delete, ...) so it can stand in for one
+    directly, StandInServer serves it over HTTP.
+
+    resources maps href -> (etag, data). every change bumps the ctag and the sync-token, without `sync` the
+    sync-collection REPORT fails like on a server not supporting it. while `down` is set every PROPFIND and REPORT
+    fails.
+    """
+
+    C = '{urn:ietf:params:xml:ns:caldav}'
+
+    def __init__(self, resources: dict, sync: bool=True):
+        self.resources = dict(resources)
+        self.sync = sync
+        self.version = 1
+        self.log = []       # (version, href, deleted) of every change
+        self.requests = []
+        self.failures = 0   # number of following REPORTs to fail
+        self.down = False
+        self._parsed = {}   # type: Dict[str, VCALENDAR]
+        self._lock = threading.Lock()
+
+    def _in_range(self, href: str, time_range: Xml.Element) -> bool:
+        """ whether a resource matches the time-range filter of a calendar-query, times are compared as floating """
+        if time_range is None:
+            return True
+
+        etag, data = self.resources[href]
+        entry = self._parsed.get(href)
+        if entry is None or entry.etag != etag:
+            entry = self._parsed[href] = VCALENDAR(href, etag, data, lazy=True)
+
+        start, end = (time_range.get(a) for a in ('start', 'end'))
+        return entry.is_on(datetime.strptime(start, '%Y%m%dT%H%M%SZ') if start else datetime.min,
+                           datetime.strptime(end, '%Y%m%dT%H%M%SZ') if end else datetime.max)
+
+    def _precondition(self, method: str, href: str, headers):
+        """ raise like a server on a failed If-Match/If-None-Match, or on a missing resource """
+        etag = self.resources[href][0] if href in self.resources else None
+        if headers and (headers.get('If-None-Match') == '*' and etag is not None
+                        or headers.get('If-Match') is not None and headers.get('If-Match') != etag):
+            raise OperationFailed(method, href, (201, 204), 412)
+        if method == 'DELETE' and etag is None:
+            raise OperationFailed(method, href, (200, 204), 404)
+
+    def put(self, href: str, data, headers=None) -> str:
+        with self._lock:
+            self._precondition('PUT', href, headers)
+            self.version += 1
+            self.resources[href] = ('"%s"' % self.version, data.decode('utf-8') if isinstance(data, bytes) else data)
+            self.log.append((self.version, href, False))
+            return '"%s"' % self.version
+
+    def delete(self, href: str, headers=None):
+        with self._lock:
+            self._precondition('DELETE', href, headers)
+            self.version += 1
+            del self.resources[href]
+            self.log.append((self.version, href, True))
+
+    @staticmethod
+    def response(href: str, props: str='', status: str=None) -> str:
+        if status:
+            return '<d:response><d:href>%s</d:href><d:status>HTTP/1.1 %s</d:status></d:response>' % (href, status)
+        return '<d:response><d:href>%s</d:href><d:propstat><d:prop>%s</d:prop></d:propstat></d:response>' \
+               % (href, props)
+
+    @staticmethod
+    def multistatus(body: str) -> Xml.Element:
+        return Xml.fromstring('<d:multistatus xmlns:d="DAV:" xmlns:c="urn:ietf:params:xml:ns:caldav" '
+                              'xmlns:cs="http://calendarserver.org/ns/">%s</d:multistatus>' % body)
+
+    def propfind(self, url, req_data, headers=None):
+        self.requests.append(req_data)
+        if self.down:
+            return None
+        if str(headers.get('Depth')) == '0':
+            props = '<cs:getctag>%s</cs:getctag>' % self.version
+            if self.sync:
+                props += '<d:sync-token>token-%s</d:sync-token>' % self.version
+            return self.multistatus(self.response(url, props))
+
+        body = self.response(url, '<d:resourcetype><d:collection/></d:resourcetype>')
+        body += ''.join(self.response(href, '<d:getetag>%s</d:getetag>' % etag)
+                        for href, (etag, _) in self.resources.items())
+        return self.multistatus(body)
+
+    def propfind_nodes(self, url, xpath, req_data, headers=None):
+        tree = self.propfind(url, req_data, headers)
+        return tree.findall(xpath) if tree is not None else []
+
+    def report(self, url, req_data, headers=None):
+        with self._lock:
+            self.requests.append(req_data)
+            if self.down:
+                return None
+            if self.failures:
+                self.failures -= 1
+                return None
+        request = Xml.fromstring(req_data)
+
+        if request.tag == '{DAV:}sync-collection':
+            if not self.sync:
+                return None
+            since = int(request.find('{DAV:}sync-token').text.split('-')[1])
+            body = ''
+            for href in dict((href, None) for version, href, _ in self.log if version > since):
+                if href in self.resources:
+                    body += self.response(href, '<d:getetag>%s</d:getetag>' % self.resources[href][0])
+                else:
+                    body += self.response(href, status='404 Not Found')
+            return self.multistatus(body + '<d:sync-token>token-%s</d:sync-token>' % self.version)
+
+        if request.tag == self.C + 'calendar-multiget':
+            hrefs = [h.text for h in request.findall('{DAV:}href')]
+        else:
+            hrefs = [href for href in self.resources if self._in_range(href, request.find('.//%stime-range' % self.C))]
+        return self.multistatus(''.join(self.response(href, '<d:getetag>%s</d:getetag><c:calendar-data>%s'
+                                                            '</c:calendar-data>' % self.resources[href])
+                                        for href in hrefs if href in self.resources))
+
+    def report_nodes(self, url, xpath, req_data, headers=None):
+        tree = self.report(url, req_data, headers)
+        return tree.findall(xpath) if tree is not None else []
+
+    def report_stream(self, url, req_data, headers=None):
+        tree = self.report(url, req_data, headers)
+        if tree is None:
+            raise OperationFailed('REPORT', url, 207, 500)
+        return iter(tree.findall('{DAV:}response'))
+
+
+def account(calendars: int, events: int, corpus: Corpus=None, sync: bool=True) -> Dict[str, Collection]:
+    """ synthetic account of `calendars` collections /calendars/c<n>/ holding `events` resources each
+
+    :param corpus: generator of the resources, Corpus() by default
+    :param sync: whether the collections support sync-collection REPORTs
+    """
+    corpus = corpus or Corpus()
+    return dict(('/calendars/c%s/' % c,
+                 Collection(dict(('/calendars/c%s/e%s.ics' % (c, i), ('"1"', corpus.calendar('c%se%s' % (c, i))))
+                                 for i in range(events)), sync))
+                for c in range(calendars))
+
+
+def ics(uid: str, start: datetime, end: datetime, rrule: str=None) -> str:
+    """ iCalendar text of a resource holding one floating time event, summarized by its uid """
+    return "BEGIN:VCALENDAR\nVERSION:2.0\nPRODID:test\nBEGIN:VEVENT\nUID:%s\nSUMMARY:%s\nDTSTART:%s\nDTEND:%s\n%s" \
+           "END:VEVENT\nEND:VCALENDAR\n" % (uid, uid, start.strftime('%Y%m%dT%H%M%S'), end.strftime('%Y%m%dT%H%M%S'),
+                                          'RRULE:%s\n' % rrule if rrule else '')
+
+
+def resource(uid: str, start: datetime, end: datetime, rrule: str=None) -> VCALENDAR:
+    """ the ics() resource parsed, at /cal/<uid>.ics """
+    return VCALENDAR('/cal/%s.ics' % uid, '"1"', ics(uid, start, end, rrule))
+
+
+def fixed_account(calendars: int, events: int) -> Dict[str, Collection]:
+    """ account like `account`, but of ics() events c<n>e<i> all taking place 2020-03-02 from 9:00 to 10:00, for
+    tests asserting on the contents """
+    day = datetime(2020, 3, 2, 9)
+    return dict(('/calendars/c%s/' % c,
+                 Collection(dict(('/calendars/c%s/e%s.ics' % (c, i),
+                                  ('"1"', ics('c%se%s' % (c, i), day, day + timedelta(hours=1))))
+                                 for i in range(events))))
+                for c in range(calendars))
+
+
+class StandInServer(object):
+    """ CalDAV stand-in on a local port, discovery plus one Collection per calendar path, served from a thread
+
+    the principal is /principal/, the calendar-home-set /calendars/ holding the given calendars. responses are
+    gzip compressed if the client accepts it. the next `throttled` requests are answered with 429 and a
+    Retry-After of `retry_after` (if not None).
+
+    every request is answered `latency` seconds late, emulating the round trip to a remote server. `requests`
+    and `sent` (response body bytes as sent) count the traffic.
+    """
+
+    def __init__(self, calendars: Dict[str, Collection], component: str='VEVENT', latency: float=0):
+        self.calendars = calendars
+        self.component = component
+        self.latency = latency
+        self.requests = 0
+        self.sent = 0
+        self.compressed = 0
+        self.throttled = 0
+        self.retry_after = '0'
+        self._lock = threading.Lock()
+
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            wbufsize = -1
+
+            def log_message(self, *args):
+                pass
+
+            def do_PROPFIND(self):
+                body = self.body()
+                if not self.throttle():
+                    self.reply(stand_in.propfind(self.path, body, self.headers))
+
+            def do_REPORT(self):
+                calendar = stand_in.calendars.get(self.path)
+                body = self.body()
+                if not self.throttle():
+                    self.reply(calendar.report(self.path, body, self.headers) if calendar is not None else None)
+
+            def do_PUT(self):
+                self.write(lambda calendar, body: calendar.put(self.path, body, self.headers), 201)
+
+            def do_DELETE(self):
+                self.write(lambda calendar, body: calendar.delete(self.path, self.headers), 204)
+
+            def write(self, change, status: int):
+                body = self.body()
+                if self.throttle():
+                    return
+                calendar = stand_in.calendars.get(self.path.rsplit('/', 1)[0] + '/')
+                etag = None
+                try:
+                    if calendar is None:
+                        raise OperationFailed(self.command, self.path, status, 404)
+                    etag = change(calendar, body)
+                except OperationFailed as e:
+                    status = e.actual_code
+                self.send_response(status)
+                if etag is not None:
+                    self.send_header('ETag', etag)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def body(self) -> str:
+                with stand_in._lock:
+                    stand_in.requests += 1
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+                if stand_in.latency:
+                    time.sleep(stand_in.latency)
+                return body
+
+            def throttle(self) -> bool:
+                with stand_in._lock:
+                    if not stand_in.throttled:
+                        return False
+                    stand_in.throttled -= 1
+                self.send_response(429)
+                if stand_in.retry_after is not None:
+                    self.send_header('Retry-After', stand_in.retry_after)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return True
+
+            def reply(self, tree: Xml.Element):
+                content = Xml.tostring(tree) if tree is not None else b''
+                self.send_response(207 if tree is not None else 500)
+                if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    content = gzip.compress(content)
+                    self.send_header('Content-Encoding', 'gzip')
+                    with stand_in._lock:
+                        stand_in.compressed += 1
+                with stand_in._lock:
+                    stand_in.sent += len(content)
+                self.send_header('Content-Length', str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, args=(0.05,), daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def propfind(self, path: str, req_data: str, headers) -> Xml.Element:
+        if path in self.calendars:
+            return self.calendars[path].propfind(path, req_data, headers)
+
+        if path == '/':
+            body = Collection.response(path, '<d:current-user-principal><d:href>/principal/</d:href>'
+                                               '</d:current-user-principal>')
+        elif path == '/principal/':
+            body = Collection.response(path, '<c:calendar-home-set><d:href>/calendars/</d:href>'
+                                               '</c:calendar-home-set>')
+        else:
+            body = Collection.response(path, '<d:resourcetype><d:collection/></d:resourcetype>')
+            for href, calendar in self.calendars.items():
+                body += Collection.response(href, '<d:displayname>%s</d:displayname><cs:getctag>%s</cs:getctag>'
+                                                    '<c:supported-calendar-component-set><c:comp name="%s"/>'
+                                                    '</c:supported-calendar-component-set>'
+                                              % (href.strip('/').split('/')[-1], calendar.version, self.component))
+        return Collection.multistatus(body)
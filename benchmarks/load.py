@@ -0,0 +1,157 @@
+""" end-to-end benchmarks of Client/Calendar against a local CalDAV stand-in
+
+the stand-in runs in a child process serving a synthetic account, so its work does not compete with the client
+for the interpreter and the peak RSS is the client's alone. every stage is measured for wall time, HTTP
+requests, response bytes (decompressed) and peak RSS:
+
+    discovery         Client.discover() on a fresh client
+    full_load         Client.load_all() of all calendars, with the entries' memory (Client.memory_report) per entry
+    first_sync        Client.sync_all() right after the load, comparing the etags of every calendar
+    unchanged_sync    Client.sync_all() with nothing changed, one PROPFIND per calendar
+    incremental_sync  Client.sync_all() after `changes` resources per calendar were added and as many deleted
+    range_query       a calendar-query REPORT for one week of every calendar
+    get_events        52 weekly get_events() of every loaded calendar, building the index on the first one
+
+    python -m benchmarks.load --calendars 5 --events 2000 --latency 0.005 --json load.json
+"""
+import argparse
+import multiprocessing
+import sys
+import time
+from datetime import timedelta
+
+import calpy.Metrics as Metrics
+from benchmarks.Corpus import Corpus
+from benchmarks.Results import Results, peak_rss, reset_peak_rss
+from benchmarks.StandInServer import StandInServer, account
+from calpy.caldav.Client import Client
+from calpy.ical.VCALENDAR import VCALENDAR
+
+
+def _corpus(options: dict) -> Corpus:
+    return Corpus(options['seed'], options['recurring'], options['payload'])
+
+
+def _serve(options: dict, ports):
+    """ child process: serve the account until terminated """
+    calendars = account(options['calendars'], options['events'], _corpus(options))
+    with StandInServer(calendars, latency=options['latency']) as stand_in:
+        ports.put(stand_in.port)
+        stand_in.thread.join()
+
+
+class LoadBenchmark(object):
+    def __init__(self, options: dict, port: int):
+        self.options = options
+        self.port = port
+        self.corpus = _corpus(options)
+        self.results = Results('load', options)
+        self.sink = Metrics.enable()
+        self._generation = 0
+
+    def client(self) -> Client:
+        return Client('127.0.0.1', self.port, protocol='http', max_connections=self.options['connections'])
+
+    def measure(self, name: str, func, **derived):
+        """ run func() as stage `name`, derived maps extra result values to functions of func's return value """
+        self.sink.reset()
+        reset_peak_rss()
+        start = time.perf_counter()
+        result = func()
+        wall = time.perf_counter() - start
+        counters = self.sink.stats()['counters']
+        self.results.add(name, wall=wall, requests=counters.get('caldav.http.requests', 0),
+                         bytes=counters.get('caldav.http.bytes', 0), peak_rss_kib=peak_rss(),
+                         **dict((key, f(result)) for key, f in derived.items()))
+        return result
+
+    def change(self, calendars):
+        """ add and delete `changes` resources per calendar through a second client, like another device would """
+        self._generation += 1
+        changes = self.options['changes']
+        for cal, writer in zip(calendars, sorted(self.client().discover(), key=lambda c: c.path)):
+            uid = 'g%s-%s-%%s' % (self._generation, cal.path.strip('/').split('/')[-1])
+            writer.put_many(VCALENDAR(None, None, self.corpus.calendar(uid % i)) for i in range(changes))
+            writer.delete_many([e.href for e in cal.entries[:changes]])
+
+    def run_once(self):
+        client = self.client()
+        calendars = sorted(self.measure('discovery', client.discover), key=lambda c: c.path)
+
+        def bytes_per_entry(loaded) -> float:
+            reports = Client.memory_report(loaded).values()
+            return sum(r['bytes'] for r in reports) / max(1, sum(r['entries'] for r in reports))
+
+        self.measure('full_load', lambda: client.load_all(calendars),
+                     entries=lambda loaded: sum(len(c.entries) for c in loaded), bytes_per_entry=bytes_per_entry)
+
+        self.measure('first_sync', lambda: client.sync_all(calendars))
+        self.measure('unchanged_sync', lambda: client.sync_all(calendars))
+
+        self.change(calendars)
+        self.measure('incremental_sync', lambda: client.sync_all(calendars))
+
+        start = self.corpus.start + timedelta(days=180)
+        self.measure('range_query', lambda: [c.query(start, start + timedelta(days=7)) for c in calendars])
+
+        def get_events():
+            for c in calendars:
+                for week in range(52):
+                    c.get_events(self.corpus.start + timedelta(weeks=week), duration=timedelta(days=7))
+        self.measure('get_events', get_events)
+
+    def run(self) -> Results:
+        try:
+            for _ in range(self.options['repeat']):
+                self.run_once()
+        finally:
+            Metrics.disable()
+        return self.results
+
+
+def run(options: dict) -> Results:
+    """ start the stand-in, run all stages `repeat` times and return the results """
+    context = multiprocessing.get_context('spawn')
+    ports = context.Queue()
+    server = context.Process(target=_serve, args=(options, ports), daemon=True)
+    server.start()
+    try:
+        while True:
+            try:
+                port = ports.get(timeout=1)
+                break
+            except Exception:
+                if not server.is_alive():
+                    raise RuntimeError('stand-in server exited with %s' % server.exitcode)
+        return LoadBenchmark(options, port).run()
+    finally:
+        server.terminate()
+        server.join()
+
+
+def parse_args(args=None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--calendars', type=int, default=5)
+    parser.add_argument('--events', type=int, default=1000, help='resources per calendar')
+    parser.add_argument('--recurring', type=float, default=0.1, help='share of recurring events')
+    parser.add_argument('--payload', type=int, default=200, help='characters of DESCRIPTION per event')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--connections', type=int, default=10, help='max_connections of the client')
+    parser.add_argument('--changes', type=int, default=10, help='resources added/deleted per calendar for the '
+                                                                'incremental sync')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', metavar='PATH', help="write the results as JSON, '-' for stdout")
+    return vars(parser.parse_args(args))
+
+
+def main(args=None):
+    options = parse_args(args)
+    results = run(options)
+    print(results.table(), file=sys.stderr if options['json'] == '-' else sys.stdout)
+    if options['json']:
+        results.write(options['json'])
+
+
+if __name__ == '__main__':
+    main()
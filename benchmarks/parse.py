@@ -0,0 +1,127 @@
+""" parser micro-benchmarks on a deterministic synthetic corpus
+
+every stage runs `repeat` times on the same inputs and is measured for items and bytes of input per second. one
+more run under tracemalloc records the peak memory and the memory blocks still allocated by its results:
+
+    tokenize         VOBJECT.parse_block of whole resources
+    vcalendar        VCALENDAR construction, eager
+    vcalendar_lazy   VCALENDAR construction, lazy
+    vevent           VEVENT construction from its own block
+    vtodo            VTODO construction from its own block
+    vtimezone        VTIMEZONE construction
+    parse_datetime   VOBJECT.parse_datetime of DATE, local and UTC DATE-TIME values, with a cold memo cache
+    get_duration     VEVENT.get_duration of DURATION values
+    localize         VTIMEZONE.localize, with the transition table already compiled
+
+    python -m benchmarks.parse --events 2000 --attendees 10 --json parse.json
+"""
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from datetime import timedelta
+from typing import Callable, List, Tuple
+
+from benchmarks.Corpus import VTIMEZONE as VTIMEZONE_DATA, Corpus
+from benchmarks.Results import Results
+from calpy.ical.VCALENDAR import VCALENDAR
+from calpy.ical.VEVENT import VEVENT
+from calpy.ical.VOBJECT import VOBJECT
+from calpy.ical.VTIMEZONE import VTIMEZONE
+from calpy.ical.VTODO import VTODO
+
+
+def stages(options: dict) -> List[Tuple[str, Callable[[], list], int, int]]:
+    """ (name, function, items, bytes of input) of every stage, inputs are generated up front """
+    corpus = Corpus(options['seed'], options['recurring'], options['payload'], options['attendees'], timezone=True)
+    count = options['events']
+
+    calendars = [corpus.calendar('e%s' % i) for i in range(count)]
+    todos = [''.join(corpus.todo_lines('t%s' % i)) for i in range(count)]
+    events = [''.join(corpus.event_lines('e%s' % i)) for i in range(count)]
+    datetimes = corpus.datetimes(count * 10)
+    durations = [VEVENT('BEGIN:VEVENT\r\nUID:d\r\nDURATION:%s\r\nEND:VEVENT\r\n' % d) for d in corpus.durations(count)]
+    timezone = VTIMEZONE(VTIMEZONE_DATA)
+    timezone.localize(corpus.start)
+    utc = [corpus.start + timedelta(hours=7 * i) for i in range(count * 10)]
+
+    def size(texts: List[str]) -> int:
+        return sum(len(t.encode('utf-8')) for t in texts)
+
+    return [
+        ('tokenize', lambda: [VOBJECT.parse_block(d) for d in calendars], count, size(calendars)),
+        ('vcalendar', lambda: [VCALENDAR(None, None, d) for d in calendars], count, size(calendars)),
+        ('vcalendar_lazy', lambda: [VCALENDAR(None, None, d, lazy=True) for d in calendars], count, size(calendars)),
+        ('vevent', lambda: [VEVENT(d) for d in events], count, size(events)),
+        ('vtodo', lambda: [VTODO(d) for d in todos], count, size(todos)),
+        ('vtimezone', lambda: [VTIMEZONE(VTIMEZONE_DATA) for _ in range(count)], count,
+         count * len(VTIMEZONE_DATA)),
+        ('parse_datetime', lambda: [VOBJECT.parse_datetime(v) for v in datetimes], len(datetimes), size(datetimes)),
+        ('get_duration', lambda: [e.get_duration() for e in durations], len(durations), 0),
+        ('localize', lambda: [timezone.localize(dt) for dt in utc], len(utc), 0),
+    ]
+
+
+def _cold():
+    """ drop memoized parse results so every run starts from the same state """
+    VOBJECT.parse_datetime.cache_clear()
+    gc.collect()
+
+
+def allocations(func: Callable[[], list], items: int) -> dict:
+    """ peak traced memory of a run and the blocks its result still holds per item """
+    _cold()
+    tracemalloc.start()
+    try:
+        result = func()
+        _, peak = tracemalloc.get_traced_memory()
+        blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    finally:
+        tracemalloc.stop()
+    del result
+    return {'peak_kib': peak // 1024, 'blocks_per_item': blocks / max(1, items)}
+
+
+def run(options: dict) -> Results:
+    results = Results('parse', options)
+    for name, func, items, size in stages(options):
+        if options['stages'] and name not in options['stages']:
+            continue
+
+        allocated = allocations(func, items)
+        for _ in range(options['repeat']):
+            _cold()
+            start = time.perf_counter()
+            func()
+            wall = time.perf_counter() - start
+            rates = {'items_per_s': items / wall}
+            if size:
+                rates['bytes_per_s'] = size / wall
+            results.add(name, wall=wall, **rates, **allocated)
+    return results
+
+
+def parse_args(args=None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--events', type=int, default=2000, help='resources per stage')
+    parser.add_argument('--recurring', type=float, default=0.3, help='share of recurring events')
+    parser.add_argument('--payload', type=int, default=1000, help='characters of DESCRIPTION per event/todo')
+    parser.add_argument('--attendees', type=int, default=10, help='ATTENDEE lines per event')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--stages', nargs='*', help='run only these stages')
+    parser.add_argument('--json', metavar='PATH', help="write the results as JSON, '-' for stdout")
+    return vars(parser.parse_args(args))
+
+
+def main(args=None):
+    options = parse_args(args)
+    results = run(options)
+    print(results.table(), file=sys.stderr if options['json'] == '-' else sys.stdout)
+    if options['json']:
+        results.write(options['json'])
+
+
+if __name__ == '__main__':
+    main()
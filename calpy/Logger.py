@@ -3,7 +3,11 @@ import platform
 import os
 
 
-def setup_logging():
+def setup_logging(level=logging.INFO):
+    """ log to the user's calpy log file
+
+    :param level: log level, DEBUG is very verbose on the parsing hot paths and should not be used in production
+    """
     log_file = 'debug.log'
 
     if 'Windows' in platform.system():
@@ -15,5 +19,5 @@ def setup_logging():
         os.makedirs(log_path)
 
     # TODO: remove filemode='w' to stop it creating fresh log every time (debugging..)
-    logging.basicConfig(filename=os.path.join(log_path, log_file), level=logging.DEBUG, filemode='w',
+    logging.basicConfig(filename=os.path.join(log_path, log_file), level=level, filemode='w',
                         format="%(asctime)s|%(levelname)s|%(filename)s:%(lineno)s|%(funcName)20s()|%(message)s")
\ No newline at end of file
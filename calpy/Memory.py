@@ -0,0 +1,61 @@
+import sys
+from functools import lru_cache
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+from typing import Set, Tuple
+
+
+# objects not followed by deep_size: code and types are shared by everything and not part of any data
+_SKIP = (type, ModuleType, FunctionType, BuiltinFunctionType, MethodType)
+
+# leaves without references to other objects
+_ATOMIC = (str, bytes, int, float, complex, bool, type(None))
+
+
+@lru_cache(maxsize=None)
+def _slots(cls: type) -> Tuple[str, ...]:
+    """ names of all slots of a class and its bases """
+    names = []
+    for klass in cls.__mro__:
+        slots = klass.__dict__.get('__slots__', ())
+        for name in (slots,) if isinstance(slots, str) else slots:
+            if name not in ('__dict__', '__weakref__'):
+                names.append(name)
+    return tuple(names)
+
+
+def deep_size(obj, seen: Set[int]=None) -> int:
+    """ approximate bytes of obj and everything reachable from it through containers, instance dicts and slots
+
+    every object is counted once per `seen` set of object ids: pass the same set to several calls to count objects
+    shared between them (interned strings, VTIMEZONE definitions, memoized datetimes) at their first occurrence
+    only. classes, functions and modules are not followed.
+    """
+    if seen is None:
+        seen = set()
+
+    size = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, _SKIP):
+            continue
+        seen.add(id(o))
+        size += sys.getsizeof(o)
+
+        if isinstance(o, _ATOMIC):
+            continue
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset)):
+            stack.extend(o)
+        else:
+            attrs = getattr(o, '__dict__', None)
+            if attrs is not None:
+                stack.append(attrs)
+            for name in _slots(type(o)):
+                try:
+                    stack.append(getattr(o, name))
+                except AttributeError:
+                    pass
+    return size
@@ -0,0 +1,211 @@
+import abc
+import inspect
+import threading
+import time
+from functools import wraps
+from typing import Dict, List
+
+
+# upper bounds (in seconds) of the timing histogram buckets, the last bucket is +Inf
+BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+
+# instrumentation is only recorded while enabled, call sites check this flag before doing any work
+enabled = False
+
+_sink = None
+
+
+class Sink(abc.ABC):
+    """ receiver for instrumentation data, subclass to forward metrics elsewhere """
+
+    @abc.abstractmethod
+    def count(self, name: str, value: int=1):
+        pass
+
+    @abc.abstractmethod
+    def observe(self, name: str, seconds: float):
+        pass
+
+
+class Histogram(object):
+    """ timing histogram with fixed BUCKETS """
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.sum += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+        for idx, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[idx] += 1
+                return
+        self.buckets[-1] += 1
+
+    def as_dict(self) -> dict:
+        return {'count': self.count, 'sum': self.sum, 'min': self.min, 'max': self.max,
+                'buckets': dict(zip(BUCKETS + (float('inf'),), self.buckets))}
+
+
+class StatsSink(Sink):
+    """ in-process sink keeping counters and timing histograms in dicts """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}      # type: Dict[str, int]
+        self.timings = {}       # type: Dict[str, Histogram]
+
+    def count(self, name: str, value: int=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float):
+        with self._lock:
+            hist = self.timings.get(name)
+            if hist is None:
+                hist = self.timings[name] = Histogram()
+            hist.observe(seconds)
+
+    def stats(self) -> dict:
+        """ snapshot of all counters and timings as plain dicts """
+        with self._lock:
+            return {'counters': dict(self.counters),
+                    'timings': dict((k, v.as_dict()) for k, v in self.timings.items())}
+
+    def reset(self):
+        with self._lock:
+            self.counters = {}
+            self.timings = {}
+
+
+class PrometheusSink(StatsSink):
+    """ StatsSink rendering its data in the Prometheus text exposition format """
+
+    def __init__(self, prefix: str='calpy_'):
+        super(PrometheusSink, self).__init__()
+        self.prefix = prefix
+
+    def _name(self, name: str) -> str:
+        return self.prefix + ''.join(c if c.isalnum() else '_' for c in name)
+
+    def render(self) -> str:
+        lines = []  # type: List[str]
+        stats = self.stats()
+
+        for name, value in sorted(stats['counters'].items()):
+            metric = self._name(name) + '_total'
+            lines.append('# TYPE %s counter' % metric)
+            lines.append('%s %s' % (metric, value))
+
+        for name, hist in sorted(stats['timings'].items()):
+            metric = self._name(name) + '_seconds'
+            lines.append('# TYPE %s histogram' % metric)
+            cumulative = 0
+            for bound, value in hist['buckets'].items():
+                cumulative += value
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('%s_bucket{le="%s"} %s' % (metric, le, cumulative))
+            lines.append('%s_sum %s' % (metric, hist['sum']))
+            lines.append('%s_count %s' % (metric, hist['count']))
+
+        return '\n'.join(lines) + '\n'
+
+
+def enable(sink: Sink=None) -> Sink:
+    """ start recording instrumentation into `sink` (a new StatsSink by default) and return the sink """
+    global enabled, _sink
+    _sink = sink if sink is not None else StatsSink()
+    enabled = True
+    return _sink
+
+
+def disable():
+    """ stop recording instrumentation """
+    global enabled, _sink
+    enabled = False
+    _sink = None
+
+
+def sink() -> Sink:
+    """ the currently active sink or None """
+    return _sink
+
+
+def count(name: str, value: int=1):
+    """ increment counter `name` """
+    # read _sink once, a concurrent disable() may reset it at any time
+    sink = _sink
+    if sink is not None:
+        sink.count(name, value)
+
+
+def observe(name: str, seconds: float):
+    """ record a duration for timing `name` """
+    sink = _sink
+    if sink is not None:
+        sink.observe(name, seconds)
+
+
+class _Timer(object):
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NoopTimer(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NOOP = _NoopTimer()
+
+
+def timer(name: str):
+    """ context manager recording the duration of its block as timing `name`, a shared no-op when disabled """
+    return _Timer(name) if enabled else _NOOP
+
+
+def timed(name: str):
+    """ decorator recording the duration of every call as timing `name`, coroutine functions are timed until
+    their result is available """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not enabled:
+                    return await func(*args, **kwargs)
+                with _Timer(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            with _Timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,177 @@
+import asyncio
+import logging
+import xml.etree.ElementTree as Xml
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+import calpy.Metrics as Metrics
+from calpy.caldav.AsyncServer import AsyncServer, aiohttp
+from calpy.caldav.Calendar import Calendar, EntryParser, WriteResult
+from calpy.caldav.Server import OperationFailed
+from calpy.ical.VCALENDAR import VCALENDAR
+
+
+class AsyncCalendar(Calendar):
+    """ Calendar on an AsyncServer, load/query/sync/put_many/delete_many are coroutines
+
+    request bodies, response parsing, the entry index and the sync bookkeeping are Calendar's, only the network
+    calls are awaited. multiget batches run concurrently as tasks, at most multiget_workers of them per calendar.
+    """
+
+    server = None       # type: AsyncServer
+
+    @staticmethod
+    async def _finish(parser: EntryParser) -> List[VCALENDAR]:
+        """ parser.finish() without blocking the event loop on the parse pool """
+        if parser.futures:
+            await asyncio.wait([asyncio.wrap_future(f) for f in parser.futures])
+        return parser.finish()
+
+    async def _parse_stream(self, nodes, lazy: bool) -> List[VCALENDAR]:
+        """ entries of a streamed multistatus response """
+        parser = EntryParser(self, lazy)
+
+        async for node in nodes:
+            self._parse_resource(node, parser)
+
+        return await self._finish(parser)
+
+    @Metrics.timed('caldav.query')
+    async def query(self, start: datetime=None, end: datetime=None, lazy: bool=False) -> List[VCALENDAR]:
+        """ see Calendar.query """
+        headers = {'Depth': '1', 'Prefer': 'return-minimal'}
+        try:
+            return await self._parse_stream(self.server.report_stream(self.path, self._query_request(start, end),
+                                                                      headers), lazy)
+        except (OperationFailed, Xml.ParseError, aiohttp.ClientError, asyncio.TimeoutError):
+            logging.exception('calendar-query of %s failed', self.path)
+            return []
+
+    async def _multiget_batch(self, hrefs: List[str], lazy: bool) -> List[VCALENDAR]:
+        headers = {'Depth': '1', 'Prefer': 'return-minimal'}
+        req_data = self._multiget_request(hrefs)
+
+        for attempt in range(self.multiget_retries + 1):
+            if attempt:
+                Metrics.count('caldav.multiget.retries')
+            try:
+                return await self._parse_stream(self.server.report_stream(self.path, req_data, headers), lazy)
+            except (OperationFailed, Xml.ParseError, aiohttp.ClientError, asyncio.TimeoutError):
+                logging.exception('multiget of %d entries failed', len(hrefs))
+
+        logging.error('giving up multiget of %d entries from %s', len(hrefs), self.path)
+        return []
+
+    async def _multiget(self, hrefs: List[str], lazy: bool) -> List[VCALENDAR]:
+        semaphore = asyncio.Semaphore(max(1, self.multiget_workers))
+
+        async def batch(b):
+            async with semaphore:
+                return await self._multiget_batch(b, lazy)
+
+        entries = []
+        for result in await asyncio.gather(*[batch(b) for b in self._batches(hrefs)]):
+            entries.extend(result)
+        return entries
+
+    async def _fetch(self, etags: Dict[str, str], lazy: bool) -> List[VCALENDAR]:
+        parser, missing = self._cached(etags, lazy)
+        fetched = await self._multiget(missing, lazy)
+        return await self._finish(parser) + fetched
+
+    async def _get_etags(self) -> Dict[str, str]:
+        headers = {'Depth': '1', 'Prefer': 'return-minimal'}
+        return self._parse_etags(await self.server.propfind(self.path, self.ETAGS_REQUEST, headers))
+
+    async def _get_sync_state(self) -> Tuple[str, str]:
+        headers = {'Depth': '0', 'Prefer': 'return-minimal'}
+        return self._parse_sync_state(await self.server.propfind(self.path, self.SYNC_STATE_REQUEST, headers))
+
+    async def _sync_collection(self) -> Tuple[str, Dict[str, str], List[str]]:
+        headers = {'Prefer': 'return-minimal'}
+        return self._parse_sync_collection(await self.server.report(self.path, self._sync_collection_request(),
+                                                                    headers))
+
+    async def _put(self, href: str, data: str, headers: dict) -> WriteResult:
+        if href is None:
+            return self._unnamed()
+        try:
+            return WriteResult(href, await self.server.put(href, data.encode('utf-8'), headers), None)
+        except (OperationFailed, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.warning('PUT of %s failed: %s', href, getattr(e, 'reason', e))
+            return WriteResult(href, None, e)
+
+    async def _delete(self, href: str, headers: dict) -> WriteResult:
+        try:
+            await self.server.delete(href, headers)
+        except OperationFailed as e:
+            if e.actual_code != 404:
+                logging.warning('DELETE of %s failed: %s', href, e.reason)
+                return WriteResult(href, None, e)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.warning('DELETE of %s failed: %s', href, e)
+            return WriteResult(href, None, e)
+        return WriteResult(href, None, None)
+
+    async def _run_writes(self, method, args: List[tuple]) -> List[WriteResult]:
+        semaphore = asyncio.Semaphore(max(1, self.write_workers))
+
+        async def write(a):
+            async with semaphore:
+                return await method(*a)
+
+        return list(await asyncio.gather(*[write(a) for a in args]))
+
+    @Metrics.timed('caldav.put_many')
+    async def put_many(self, entries: Iterable[VCALENDAR]) -> List[WriteResult]:
+        """ see Calendar.put_many """
+        entries = list(entries)
+        prepared = [self._put_request(e) for e in entries]
+        results = await self._run_writes(self._put, [(self._href(e), data, headers)
+                                                     for e, (data, headers) in zip(entries, prepared)])
+        self._apply_puts(entries, [data for data, _ in prepared], results)
+        return results
+
+    @Metrics.timed('caldav.delete_many')
+    async def delete_many(self, hrefs: Iterable[str]) -> List[WriteResult]:
+        """ see Calendar.delete_many """
+        results = await self._run_writes(self._delete, [(href, self._delete_request(href)) for href in hrefs])
+        self._apply_deletes(results)
+        return results
+
+    @Metrics.timed('caldav.sync')
+    async def sync(self, lazy: bool=False) -> bool:
+        """ see Calendar.sync """
+        state = await self._get_sync_state()
+        if state is None:
+            return self._sync_failed()
+
+        ctag, token = state
+        if ctag is not None and ctag == self._synced_ctag:
+            Metrics.count('caldav.sync.unchanged')
+            return False
+
+        result = await self._sync_collection() if self._incremental() else None
+
+        if result is not None:
+            token, changed, deleted = result
+        else:
+            etags = await self._get_etags()
+            if etags is None:
+                return self._sync_failed()
+            changed, deleted = self._diff(etags)
+
+        self._remove_deleted(deleted)
+        self._apply_changes(ctag, token, changed, await self._fetch(changed, lazy))
+        return bool(changed or deleted)
+
+    @Metrics.timed('caldav.load')
+    async def load(self, lazy: bool=False, start: datetime=None, end: datetime=None):
+        """ see Calendar.load """
+        self._synced_ctag = None
+
+        if start is not None or end is not None:
+            self._set_entries(await self.query(start, end, lazy))
+            return
+
+        self._set_entries(await self._fetch(await self._get_etags() or {}, lazy))
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Tuple
+
+from calpy.caldav.AsyncCalendar import AsyncCalendar
+from calpy.caldav.AsyncServer import AsyncServer
+from calpy.caldav.Cache import Cache
+from calpy.caldav.Client import Client
+
+
+class AsyncClient(Client):
+    """ asyncio counterpart of Client, discovery is a coroutine and yields AsyncCalendars
+
+    all calendars share the client's AsyncServer, so `max_connections` bounds the requests in flight across any
+    number of concurrently loading calendars. use `async with AsyncClient(...)` or close() to release it.
+    """
+
+    server = None     # type: AsyncServer
+
+    calendar_class = AsyncCalendar
+
+    def __init__(self, host: str, port=0, auth=None, protocol='https', verify_ssl=True, cache: Cache=None,
+                 max_connections: int=100):
+        """
+        :param cache: on-disk cache shared by all calendars of this client, see Cache
+        :param max_connections: limit of concurrent connections to the server
+        """
+        self.server = AsyncServer(host, port=port, auth=auth, protocol=protocol, verify_ssl=verify_ssl,
+                                  max_connections=max_connections)
+        self.cache = cache
+        self.account = '%s %s' % (self.server.baseurl, auth[0] if isinstance(auth, tuple) else '')
+
+    async def close(self):
+        await self.server.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def get_current_user_principal(self) -> str:
+        headers = {'Depth': '0', 'Prefer': 'return-minimal'}
+        return await self.server.propfind_node_text('/', self.PRINCIPAL_XPATH, self.PRINCIPAL_REQUEST, headers)
+
+    async def get_calendar_home_set(self, current_user_principal: str) -> str:
+        headers = {'Depth': '0', 'Prefer': 'return-minimal'}
+        return await self.server.propfind_node_text(current_user_principal, self.HOME_SET_XPATH,
+                                                    self.HOME_SET_REQUEST, headers)
+
+    async def get_calendars(self, calendar_home_set: str) -> List[AsyncCalendar]:
+        """ see Client.get_calendars """
+        headers = {'Depth': '1', 'Prefer': 'return-minimal'}
+        xpath = ".//{DAV:}response"
+
+        nodes = await self.server.propfind_nodes(calendar_home_set, xpath, self.CALENDARS_REQUEST, headers)
+        return self._parse_calendars(nodes)
+
+    async def discover(self, refresh: bool=False) -> List[AsyncCalendar]:
+        """ see Client.discover """
+        calendars, calendar_home_set, principal = self._cached_discovery()
+        if calendars is not None and not refresh:
+            return calendars
+
+        if calendar_home_set is not None:
+            calendars = await self.get_calendars(calendar_home_set)
+            if calendars:
+                self._store_discovery(principal, calendar_home_set, calendars)
+                return calendars
+
+        current_user_principal = await self.get_current_user_principal()
+
+        if current_user_principal is None:
+            return []
+
+        calendar_home_set = await self.get_calendar_home_set(current_user_principal)
+
+        if calendar_home_set is None:
+            return []
+
+        calendars = await self.get_calendars(calendar_home_set)
+        self._store_discovery(current_user_principal, calendar_home_set, calendars)
+        return calendars
+
+    async def _each(self, calendars: List[AsyncCalendar], method: str, **kwargs) -> List[Tuple[AsyncCalendar, object]]:
+        async def call(calendar):
+            try:
+                return calendar, await getattr(calendar, method)(**kwargs)
+            except Exception:
+                logging.exception('%s of %s failed', method, calendar)
+                return None
+
+        results = []
+        for task in asyncio.as_completed([call(c) for c in calendars]):
+            result = await task
+            if result is not None:
+                results.append(result)
+        return results
+
+    async def load_all(self, calendars: List[AsyncCalendar]=None, lazy: bool=False, start: datetime=None,
+                       end: datetime=None) -> List[AsyncCalendar]:
+        """ load all calendars concurrently in the running event loop, see Client.load_all """
+        if calendars is None:
+            calendars = await self.discover()
+
+        return [c for c, _ in await self._each(calendars, 'load', lazy=lazy, start=start, end=end)]
+
+    async def sync_all(self, calendars: List[AsyncCalendar], lazy: bool=False) -> List[Tuple[AsyncCalendar, bool]]:
+        """ sync all calendars concurrently in the running event loop, see Client.sync_all """
+        return await self._each(calendars, 'sync', lazy=lazy)
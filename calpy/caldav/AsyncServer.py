@@ -0,0 +1,153 @@
+import logging
+import xml.etree.ElementTree as Xml
+from typing import AsyncIterator, List
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+import calpy.Metrics as Metrics
+from calpy.caldav.Server import MultistatusParser, OperationFailed, ServerBase
+from calpy.caldav.Throttle import THROTTLE_CODES
+
+
+class AsyncServer(ServerBase):
+    """ asyncio counterpart of Server on an aiohttp session
+
+    the request methods have the signatures of Server's but are coroutines. at most `max_connections` requests
+    are in flight at once, further ones wait for a free connection. the session is created on first use inside
+    the running event loop, close() (or `async with`) releases it. responses are requested gzip/deflate
+    compressed, throttling is handled like in Server.
+    """
+
+    # bytes read from the socket per step of a streamed response
+    chunk_size = 64 * 1024
+
+    def __init__(self, host, port=0, auth=None,
+                 protocol='https', verify_ssl=True, path=None, max_connections=100):
+        if aiohttp is None:
+            raise ImportError('AsyncServer requires aiohttp')
+
+        super(AsyncServer, self).__init__(host, port, protocol, path, max_connections)
+
+        self.verify_ssl = verify_ssl
+        self.max_connections = max_connections
+        self.auth = aiohttp.BasicAuth(*auth) if isinstance(auth, tuple) else auth
+        self.session = None     # type: aiohttp.ClientSession
+
+    def _get_session(self) -> 'aiohttp.ClientSession':
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, ssl=None if self.verify_ssl else False)
+            self.session = aiohttp.ClientSession(connector=connector, auth=self.auth,
+                                                 headers={'Accept-Encoding': 'gzip, deflate'})
+        return self.session
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def _request(self, method, path, expected_code, data=None, headers=None) -> 'aiohttp.ClientResponse':
+        """ send a request, retrying throttled ones, and return the response with its body still unread """
+        url = self._get_url(path)
+        if headers:
+            headers = dict((k, str(v)) for k, v in headers.items())
+
+        for attempt in range(self.max_retries + 1):
+            await self.throttle.acquire_async()
+            response = None
+            try:
+                with Metrics.timer('caldav.http.%s' % method.lower()):
+                    response = await self._get_session().request(method, url, data=data, headers=headers,
+                                                                 allow_redirects=False)
+            finally:
+                throttled = response is not None and response.status in THROTTLE_CODES
+                delay = self.throttle.delay(attempt, response.headers.get('Retry-After')) if throttled else 0
+                # a request failing without a response (reset, timeout) tells nothing about the server's limit
+                self.throttle.release(throttled, delay, adapt=response is not None)
+
+            if not throttled or attempt == self.max_retries:
+                break
+            logging.warning('%s %s throttled with %d, retrying in %.1fs', method, path, response.status, delay)
+            response.release()
+
+        try:
+            self._check_status(method, path, expected_code, response.status)
+        except OperationFailed:
+            response.release()
+            raise
+        return response
+
+    async def send(self, method, path, expected_code, data=None, headers=None) -> bytes:
+        """ send a request and return the response body, raises OperationFailed on an unexpected status """
+        response = await self._request(method, path, expected_code, data, headers)
+        try:
+            return await response.read()
+        finally:
+            response.release()
+
+    async def request_xml(self, method: str, url: str, req_data: str, headers=None) -> Xml.ElementTree:
+        try:
+            content = await self.send(method, url, 207, data=req_data, headers=headers)
+        except OperationFailed:
+            logging.exception('request failed')
+            return None
+
+        return self._parse_xml(content)
+
+    async def request_stream(self, method: str, url: str, req_data: str, headers=None,
+                             tag: str='{DAV:}response') -> AsyncIterator[Xml.Element]:
+        """ see Server.request_stream, failures are raised as OperationFailed, Xml.ParseError or aiohttp errors """
+        parser = MultistatusParser(tag)
+        response = await self._request(method, url, 207, req_data, headers)
+        try:
+            async for chunk in response.content.iter_chunked(self.chunk_size):
+                Metrics.count('caldav.http.bytes', len(chunk))
+                for elem in parser.feed(chunk):
+                    yield elem
+            for elem in parser.close():
+                yield elem
+        finally:
+            response.release()
+
+    async def put(self, url: str, data: bytes, headers=None) -> str:
+        """ see Server.put, network failures are raised as aiohttp errors """
+        response = await self._request('PUT', url, (201, 204), data, headers)
+        response.release()
+        return response.headers.get('ETag')
+
+    async def delete(self, url: str, headers=None):
+        (await self._request('DELETE', url, (200, 204), headers=headers)).release()
+
+    async def propfind(self, url: str, req_data: str, headers=None) -> Xml.ElementTree:
+        return await self.request_xml("PROPFIND", url, req_data, headers)
+
+    async def report(self, url: str, req_data: str, headers=None) -> Xml.ElementTree:
+        return await self.request_xml("REPORT", url, req_data, headers)
+
+    async def propfind_nodes(self, url: str, xpath: str, req_data: str, headers=None) -> List[Xml.ElementTree]:
+        tree = await self.propfind(url, req_data, headers)
+        if tree is None:
+            return []
+
+        return tree.findall(xpath)
+
+    async def report_nodes(self, url: str, xpath: str, req_data: str, headers=None) -> List[Xml.ElementTree]:
+        tree = await self.report(url, req_data, headers)
+        if tree is None:
+            return []
+
+        return tree.findall(xpath)
+
+    def report_stream(self, url: str, req_data: str, headers=None) -> AsyncIterator[Xml.Element]:
+        return self.request_stream("REPORT", url, req_data, headers)
+
+    async def propfind_node_text(self, url: str, xpath: str, req_data: str, headers=None) -> str:
+        return self._node_text(await self.propfind(url, req_data, headers), xpath)
@@ -0,0 +1,171 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Tuple
+
+import calpy.Metrics as Metrics
+
+
+class Cache(object):
+    """ persistent on-disk cache of calendar resources keyed by (calendar path, href, etag)
+
+    the iCalendar text of every resource is kept in a SQLite database, a warm start parses entries from disk and
+    only downloads those whose etag changed. parsing is cheap compared to the round trips, and the text (unlike a
+    pickled object) stays valid across versions of the parser.
+
+    the database runs in WAL mode so any number of processes can read while one writes. every thread uses its own
+    connection. when the stored data exceeds `max_size` bytes the least recently used resources are evicted. reads
+    only refresh the use time of resources not used for `touch_interval` seconds, so concurrent readers rarely
+    contend for the write lock.
+
+    it also keeps the discovery result (principal, calendar-home-set and calendar list) of every account, see
+    Client.discover.
+    """
+
+    _SCHEMA = """CREATE TABLE IF NOT EXISTS resources (
+                     path TEXT NOT NULL, href TEXT NOT NULL, etag TEXT NOT NULL, data TEXT NOT NULL,
+                     size INTEGER NOT NULL, used REAL NOT NULL, PRIMARY KEY (path, href));
+                 CREATE INDEX IF NOT EXISTS resources_used ON resources (used);
+                 CREATE TABLE IF NOT EXISTS discovery (
+                     account TEXT NOT NULL PRIMARY KEY, data TEXT NOT NULL, stored REAL NOT NULL);"""
+
+    def __init__(self, filename: str, max_size: int=256 * 1024 * 1024, timeout: float=30.0,
+                 touch_interval: float=60.0):
+        """
+        :param filename: path of the SQLite database, created if missing
+        :param max_size: limit of the stored calendar data in bytes (UTF-8 encoded), None for no limit
+        :param timeout: seconds to wait for a lock held by another writer
+        :param touch_interval: seconds the use time of a resource may lag behind its last read, the resolution of
+                               the LRU eviction
+        """
+        self.filename = filename
+        self.max_size = max_size
+        self.timeout = timeout
+        self.touch_interval = touch_interval
+        self._local = threading.local()
+
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.executescript(self._SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.filename, timeout=self.timeout)
+        return conn
+
+    def close(self):
+        """ close the connection of the calling thread """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM resources').fetchone()[0]
+
+    def size(self) -> int:
+        """ bytes of calendar data stored """
+        return self._connection().execute('SELECT COALESCE(SUM(size), 0) FROM resources').fetchone()[0]
+
+    def get(self, path: str, href: str, etag: str) -> str:
+        """ calendar data of href if cached with the given etag, else None """
+        return self.get_many(path, {href: etag}).get(href)
+
+    def get_many(self, path: str, etags: Dict[str, str]) -> Dict[str, str]:
+        """ href -> calendar data of all hrefs (of the given href -> etag dict) cached with a matching etag """
+        result = {}
+        if not etags:
+            return result
+
+        conn = self._connection()
+        hrefs = list(etags)
+        now = time.time()
+        stale = []
+        for i in range(0, len(hrefs), 500):
+            chunk = hrefs[i:i + 500]
+            rows = conn.execute('SELECT href, etag, data, used FROM resources WHERE path = ? AND href IN (%s)'
+                                % ','.join('?' * len(chunk)), [path] + chunk)
+            for href, etag, data, used in rows:
+                if etag == etags[href]:
+                    result[href] = data
+                    if used < now - self.touch_interval:
+                        stale.append((now, path, href))
+
+        if stale:
+            with conn:
+                conn.executemany('UPDATE resources SET used = ? WHERE path = ? AND href = ?', stale)
+
+        Metrics.count('caldav.cache.hit', len(result))
+        Metrics.count('caldav.cache.miss', len(etags) - len(result))
+        return result
+
+    def put(self, path: str, href: str, etag: str, data: str):
+        self.put_many(path, [(href, etag, data)])
+
+    def put_many(self, path: str, resources: Iterable[Tuple[str, str, str]]):
+        """ store (href, etag, data) tuples, replacing older versions, and evict if over the size limit """
+        now = time.time()
+        rows = [(path, href, etag, data, len(data.encode('utf-8')), now)
+                for href, etag, data in resources if etag is not None]
+        if not rows:
+            return
+
+        conn = self._connection()
+        with conn:
+            conn.executemany('INSERT OR REPLACE INTO resources (path, href, etag, data, size, used) '
+                             'VALUES (?, ?, ?, ?, ?, ?)', rows)
+        self._evict()
+
+    def remove(self, path: str, hrefs: Iterable[str]):
+        conn = self._connection()
+        with conn:
+            conn.executemany('DELETE FROM resources WHERE path = ? AND href = ?', ((path, h) for h in hrefs))
+
+    def clear(self, path: str=None):
+        """ drop all resources (of one calendar) """
+        conn = self._connection()
+        with conn:
+            if path is None:
+                conn.execute('DELETE FROM resources')
+            else:
+                conn.execute('DELETE FROM resources WHERE path = ?', (path,))
+
+    def get_discovery(self, account: str) -> Tuple[dict, float]:
+        """ (discovery data, unix time it was stored) of an account, (None, None) if unknown """
+        row = self._connection().execute('SELECT data, stored FROM discovery WHERE account = ?',
+                                         (account,)).fetchone()
+        if row is None:
+            return None, None
+        return json.loads(row[0]), row[1]
+
+    def put_discovery(self, account: str, data: dict):
+        """ store the discovery data (JSON serializable) of an account """
+        conn = self._connection()
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO discovery (account, data, stored) VALUES (?, ?, ?)',
+                         (account, json.dumps(data), time.time()))
+
+    def _evict(self):
+        if self.max_size is None:
+            return
+
+        conn = self._connection()
+        with conn:
+            excess = conn.execute('SELECT COALESCE(SUM(size), 0) FROM resources').fetchone()[0] - self.max_size
+            if excess <= 0:
+                return
+
+            evict = []
+            for rowid, size in conn.execute('SELECT rowid, size FROM resources ORDER BY used'):
+                evict.append((rowid,))
+                excess -= size
+                if excess <= 0:
+                    break
+
+            conn.executemany('DELETE FROM resources WHERE rowid = ?', evict)
+
+        logging.debug('evicted %d resources from %s', len(evict), self.filename)
+        Metrics.count('caldav.cache.evicted', len(evict))
@@ -1,9 +1,93 @@
 import logging
-from datetime import datetime, timedelta
-from typing import List
+from collections import namedtuple
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, as_completed
+from datetime import datetime, time, timedelta, timezone
+from typing import Dict, Iterable, List, Set, Tuple
+from urllib.parse import quote
+from xml.sax.saxutils import escape
+import xml.etree.ElementTree as Xml
 
-from calpy.caldav.Server import Server
+import requests
+
+import calpy.Memory as Memory
+import calpy.Metrics as Metrics
+from calpy.caldav.Cache import Cache
+from calpy.caldav.IntervalIndex import IntervalIndex, timestamp
+from calpy.caldav.Server import OperationFailed, Server
 from calpy.ical.VCALENDAR import VCALENDAR
+from calpy.ical.VOBJECT import MalformedVObjectException
+from calpy.ical.Writer import serialize
+
+
+# outcome of writing one resource with Calendar.put_many/delete_many. error is None on success, else the
+# OperationFailed (e.g. 412 if the resource changed on the server) or network error. etag is the new etag of a
+# PUT, None if the server did not send one
+WriteResult = namedtuple('WriteResult', ['href', 'etag', 'error'])
+
+
+def parse_resources(resources: List[Tuple[str, str, str]], lazy: bool) -> List[VCALENDAR]:
+    """ VCALENDAR of every (href, etag, data) tuple, the unit of work shipped to Calendar.parse_pool """
+    return [VCALENDAR(href, etag, data, lazy) for href, etag, data in resources]
+
+
+class EntryParser(object):
+    """ builds the entries of a calendar from (href, etag, data) tuples as they arrive
+
+    without a parse pool every entry is parsed right away. with one, data is collected into chunks of
+    parse_chunk_size bytes which are submitted to the pool once more than parse_threshold bytes arrived, so
+    worker processes parse while the response is still being received. below the threshold everything is parsed
+    in-process, avoiding the cost of shipping the results back.
+    """
+
+    def __init__(self, calendar: 'Calendar', lazy: bool, store: bool=True):
+        """
+        :param store: put the added resources into the calendar's cache
+        """
+        self.calendar = calendar
+        self.lazy = lazy
+        self.store = store and calendar.cache is not None
+        self.pool = calendar.parse_pool       # type: Executor
+        self.futures = []                     # type: List[Future]
+        self._entries = []                    # type: List[VCALENDAR]
+        self._resources = []                  # type: List[Tuple[str, str, str]]
+        self._pending = []                    # type: List[Tuple[str, str, str]]
+        self._pending_size = 0
+        self._size = 0
+
+    def add(self, href: str, etag: str, data: str):
+        if self.store:
+            self._resources.append((href, etag, data))
+
+        if self.pool is None:
+            self._entries.append(VCALENDAR(href, etag, data, self.lazy))
+            return
+
+        self._pending.append((href, etag, data))
+        self._pending_size += len(data)
+        self._size += len(data)
+        if self._size > self.calendar.parse_threshold and self._pending_size >= self.calendar.parse_chunk_size:
+            self._submit()
+
+    def _submit(self):
+        self.futures.append(self.pool.submit(parse_resources, self._pending, self.lazy))
+        Metrics.count('caldav.parse.chunks')
+        self._pending = []
+        self._pending_size = 0
+
+    def finish(self) -> List[VCALENDAR]:
+        """ all entries in the order they were added, waits for the pool """
+        if self._pending and self.futures:
+            self._submit()
+
+        entries = self._entries
+        for future in self.futures:
+            entries.extend(future.result())
+        if self._pending:
+            entries.extend(parse_resources(self._pending, self.lazy))
+
+        if self.store:
+            self.calendar.cache.put_many(self.calendar.path, self._resources)
+        return entries
 
 
 class Calendar:
@@ -11,71 +95,572 @@ class Calendar:
 
     an instance of this class is defined by the CalDAV-Server, the path to this calendar on the server and
     its etag.
+
+    time-range queries are answered from an IntervalIndex over the instances of all entries, built on the first
+    query and kept up to date by add_entry/remove_entry. recurring series are expanded into the index within
+    `index_horizon` (relative to the time the index is built), queries reaching beyond it expand them on the fly.
+
+    sync() keeps the entries up to date incrementally: nothing is fetched while the ctag is unchanged, otherwise
+    the changes are taken from a sync-collection REPORT (RFC 6578) or, if the server does not support it, from
+    comparing the etags of a PROPFIND with the loaded entries. only added or changed entries are downloaded.
+
+    with a Cache, fetched entries are stored on disk and entries whose etag is cached are read from there instead
+    of the server, so after a restart only what changed in the meantime is downloaded.
     """
 
+    # (past, future) span around the index build time recurring series are expanded for
+    index_horizon = (timedelta(days=366), timedelta(days=2 * 366))  # type: Tuple[timedelta, timedelta]
+
+    # hrefs per calendar-multiget REPORT, concurrent REPORTs and retries of a failed one
+    multiget_batch_size = 500
+    multiget_workers = 4
+    multiget_retries = 2
+
+    # concurrent PUT/DELETE requests of put_many/delete_many
+    write_workers = 8
+
+    # opt-in process pool (e.g. a concurrent.futures.ProcessPoolExecutor) parsing the calendar data of large
+    # responses in parallel, see EntryParser. thresholds are in bytes of calendar data
+    parse_pool = None           # type: Executor
+    parse_threshold = 1024 * 1024
+    parse_chunk_size = 256 * 1024
+
     server = None       # type: Server
+    cache = None        # type: Cache
     etag = None         # type: str
     path = None         # type: str
     ctag = None         # type: str
+    sync_token = None   # type: str
     displayname = None  # type: str
-    entries = []        # type: List[VCALENDAR]
-    type = []           # type: str
+    entries = None      # type: List[VCALENDAR]
+    type = None         # type: str
 
-    def __init__(self, component: str, server: Server):
+    def __init__(self, component: str, server: Server, cache: Cache=None):
         self.server = server
+        self.cache = cache
         self.type = component
+        self.entries = []
+        self._by_href = {}      # type: Dict[str, VCALENDAR]
+        self._position = {}     # type: Dict[str, int]
+        self._index = None      # type: IntervalIndex
+        self._horizon = None    # type: Tuple[datetime, datetime]
+        self._recurring = set() # type: Set[str]
+        self._synced_ctag = None  # type: str
 
     def __str__(self):
         return "<Calendar(%s:%s)>" % (self.displayname, self.ctag)
 
+    def _index_entry(self, entry: VCALENDAR):
+        recurring = any(e.recurring() for e in entry.events)
+        start, end = self._horizon if recurring else (datetime.min, datetime.max)
+
+        for start, end, _ in entry.instances(start, end):
+            self._index.add(entry.href, timestamp(start), timestamp(end))
+
+        if recurring:
+            self._recurring.add(entry.href)
+
+    def _get_index(self) -> IntervalIndex:
+        if self._index is None:
+            now = datetime.now()
+            self._horizon = (now - self.index_horizon[0], now + self.index_horizon[1])
+            self._index = IntervalIndex()
+            self._recurring = set()
+            self._by_href = dict((e.href, e) for e in self.entries)
+            self._position = dict((e.href, i) for i, e in enumerate(self.entries))
+            for e in self.entries:
+                self._index_entry(e)
+        return self._index
+
+    def _set_entries(self, entries: List[VCALENDAR]):
+        """ replace all entries, the index is rebuilt on the next query """
+        self.entries = entries
+        self._by_href = dict((e.href, e) for e in entries)
+        self._position = dict((e.href, i) for i, e in enumerate(entries))
+        self._index = None
+
+    def add_entry(self, entry: VCALENDAR):
+        """ add an entry or replace the entry with the same href, updating the index in place """
+        position = self._position.get(entry.href)
+        if position is not None:
+            self.entries[position] = entry
+        else:
+            self._position[entry.href] = len(self.entries)
+            self.entries.append(entry)
+        self._by_href[entry.href] = entry
+
+        if self._index is not None:
+            self._index.remove(entry.href)
+            self._recurring.discard(entry.href)
+            self._index_entry(entry)
+
+    def remove_entry(self, href: str) -> VCALENDAR:
+        """ remove the entry with the given href and return it (None if unknown), the last entry takes its place """
+        entry = self._by_href.pop(href, None)
+        if entry is not None:
+            position = self._position.pop(href)
+            last = self.entries.pop()
+            if last is not entry:
+                self.entries[position] = last
+                self._position[last.href] = position
+            if self._index is not None:
+                self._index.remove(href)
+                self._recurring.discard(href)
+        return entry
+
+    def get_entry(self, href: str) -> VCALENDAR:
+        return self._by_href.get(href)
+
+    @Metrics.timed('caldav.query.get_events')
     def get_events(self, start: datetime, end: datetime=None, duration: timedelta=None):
+        """ entries with an instance on any day from start to end (or start + duration), ordered by start """
         if self.entries is None:
             return []
 
-        results = []
+        if start is None:
+            return list(self.entries)
 
-        for e in self.entries:
-            if start is None or e.is_on(start, end, duration):
-                results.append(e)
+        if end is None:
+            end = start if duration is None else start + duration
 
-        return results
+        start = datetime.combine(start.date(), time.min)
+        end = datetime.combine(end.date(), time.max)
+
+        index = self._get_index()
+        if self._horizon[0] <= start and end <= self._horizon[1]:
+            return [self._by_href[h] for h in index.query(timestamp(start), timestamp(end))]
 
-    def load(self):
-        """ load all available calendar data from the server (full load) """
-        headers = {'Depth': 1, 'Prefer': 'return-minimal'}
-        req_data = """<D:propfind xmlns:D="DAV:"><D:prop><D:getcontenttype/>
+        # the index only knows the instances of series within the horizon, series are expanded (once) for the
+        # rest. an indexed first match is exact unless earlier instances precede the horizon.
+        matches = []
+        found = set()
+        for first, href in index.query_first(timestamp(start), timestamp(end)):
+            if href not in self._recurring or start >= self._horizon[0]:
+                matches.append((first, href))
+                found.add(href)
+        for href in self._recurring:
+            if href not in found:
+                instances = self._by_href[href].instances(start, end)
+                if instances:
+                    matches.append((min(timestamp(i[0]) for i in instances), href))
+
+        matches.sort(key=lambda m: m[0])
+        return [self._by_href[h] for _, h in matches]
+
+    def memory_report(self, seen: Set[int]=None) -> dict:
+        """ approximate memory held by the loaded entries and the lookup structures of this calendar
+
+        :param seen: ids of objects accounted for already, shared objects are counted only once, see
+                     Memory.deep_size
+        :return: dict of entries, entry_bytes, index_bytes (href lookup and time-range index), bytes (their sum)
+                 and bytes_per_entry
+        """
+        seen = set() if seen is None else seen
+        entry_bytes = Memory.deep_size(self.entries, seen)
+        index_bytes = Memory.deep_size((self._by_href, self._position, self._index, self._recurring), seen)
+        count = len(self.entries or ())
+        return {'entries': count, 'entry_bytes': entry_bytes, 'index_bytes': index_bytes,
+                'bytes': entry_bytes + index_bytes,
+                'bytes_per_entry': (entry_bytes + index_bytes) / count if count else 0.0}
+
+    # request bodies, shared with AsyncCalendar
+    ETAGS_REQUEST = """<D:propfind xmlns:D="DAV:"><D:prop><D:getcontenttype/>
                 <D:resourcetype/><D:getetag/></D:prop></D:propfind>"""
-        xpath = ".//{DAV:}response"
+    SYNC_STATE_REQUEST = """<d:propfind xmlns:d="DAV:" xmlns:cs="http://calendarserver.org/ns/"><d:prop><cs:getctag />
+                      <d:sync-token /></d:prop></d:propfind>"""
+
+    @staticmethod
+    def _utc(dt: datetime) -> str:
+        """ CalDAV time-range value, naive datetimes are taken as local time """
+        return dt.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+    @staticmethod
+    def _parse_resource(node, parser: EntryParser):
+        """ pass the (href, etag, data) of one multistatus response to parser """
+        try:
+            href = node.find(".//{DAV:}href").text
+            etag = node.find(".//{DAV:}getetag").text
+            data = node.find(".//{urn:ietf:params:xml:ns:caldav}calendar-data").text
+
+            parser.add(href, etag, data)
+
+        except AttributeError:
+            logging.exception('malformed response tag or missing sub-tag')
+
+    def _parse_entries(self, nodes, lazy: bool) -> List[VCALENDAR]:
+        """ entries of the given (possibly streamed) multistatus responses """
+        parser = EntryParser(self, lazy)
+
+        for node in nodes:
+            self._parse_resource(node, parser)
+
+        return parser.finish()
+
+    def _query_request(self, start: datetime, end: datetime) -> str:
+        time_range = ''
+        if start is not None or end is not None:
+            time_range = '<c:time-range%s%s/>' % (' start="%s"' % self._utc(start) if start is not None else '',
+                                                  ' end="%s"' % self._utc(end) if end is not None else '')
+
+        return """<c:calendar-query xmlns:d="DAV:" xmlns:c="urn:ietf:params:xml:ns:caldav"><d:prop><d:getetag />
+                 <c:calendar-data /></d:prop><c:filter><c:comp-filter name="VCALENDAR">
+                 <c:comp-filter name="%s">%s</c:comp-filter></c:comp-filter></c:filter></c:calendar-query>""" \
+               % (self.type or 'VEVENT', time_range)
+
+    @Metrics.timed('caldav.query')
+    def query(self, start: datetime=None, end: datetime=None, lazy: bool=False) -> List[VCALENDAR]:
+        """ fetch the entries with an instance overlapping [start, end] in a single calendar-query REPORT
+
+        the server filters by component type and time-range (expanding recurring series itself), so only the
+        matching calendar data is transferred and parsed. the response is parsed while it is being received.
+        the calendar's own entries are left untouched.
+
+        :param start: begin of the time range, open if None
+        :param end: end of the time range, open if None
+        :param lazy: decode event/todo properties on first access only
+        """
+        headers = {'Depth': '1', 'Prefer': 'return-minimal'}
+        try:
+            return self._parse_entries(self.server.report_stream(self.path, self._query_request(start, end), headers),
+                                       lazy)
+        except (OperationFailed, Xml.ParseError, requests.RequestException):
+            logging.exception('calendar-query of %s failed', self.path)
+            return []
+
+    @staticmethod
+    def _multiget_request(hrefs: List[str]) -> str:
+        return """<c:calendar-multiget xmlns:d="DAV:" xmlns:c="urn:ietf:params:xml:ns:caldav"><d:prop><d:getetag />
+                 <c:calendar-data /></d:prop>\n%s</c:calendar-multiget>""" \
+               % ''.join("<d:href>%s</d:href>\n" % escape(i) for i in hrefs)
+
+    def _batches(self, hrefs: List[str]) -> List[List[str]]:
+        size = self.multiget_batch_size
+        return [hrefs[i:i + size] for i in range(0, len(hrefs), size)]
+
+    def _multiget_batch(self, hrefs: List[str], lazy: bool) -> List[VCALENDAR]:
+        """ fetch one batch of entries with a calendar-multiget REPORT, retrying it on failure
 
-        hrefs = []
-        nodes = self.server.propfind_nodes(self.path, xpath, req_data, headers)
+        entries are built while the response is being received, each response element is released right after.
+        """
+        headers = {'Depth': '1', 'Prefer': 'return-minimal'}
+        req_data = self._multiget_request(hrefs)
 
-        for response in nodes:
+        for attempt in range(self.multiget_retries + 1):
+            if attempt:
+                Metrics.count('caldav.multiget.retries')
+            try:
+                return self._parse_entries(self.server.report_stream(self.path, req_data, headers), lazy)
+            except (OperationFailed, Xml.ParseError, requests.RequestException):
+                logging.exception('multiget of %d entries failed', len(hrefs))
+
+        logging.error('giving up multiget of %d entries from %s', len(hrefs), self.path)
+        return []
+
+    def _multiget(self, hrefs: List[str], lazy: bool) -> List[VCALENDAR]:
+        """ fetch the given entries in batches of multiget_batch_size, issued concurrently by up to
+        multiget_workers threads sharing the server's session. entries of batches failing even after
+        multiget_retries retries are missing from the result.
+        """
+        batches = self._batches(hrefs)
+        if len(batches) <= 1 or self.multiget_workers <= 1:
+            return [e for batch in batches for e in self._multiget_batch(batch, lazy)]
+
+        entries = []
+        with ThreadPoolExecutor(max_workers=min(self.multiget_workers, len(batches))) as pool:
+            futures = [pool.submit(self._multiget_batch, batch, lazy) for batch in batches]
+            for future in as_completed(futures):
+                entries.extend(future.result())
+        return entries
+
+    def _cached(self, etags: Dict[str, str], lazy: bool) -> Tuple[EntryParser, List[str]]:
+        """ (parser of the entries read from the cache, hrefs to fetch from the server) for the given href -> etag
+        dict """
+        parser = EntryParser(self, lazy, store=False)
+        if self.cache is None:
+            return parser, list(etags)
+
+        cached = self.cache.get_many(self.path, etags)
+        for href, data in cached.items():
+            parser.add(href, etags[href], data)
+        return parser, [href for href in etags if href not in cached]
+
+    def _fetch(self, etags: Dict[str, str], lazy: bool) -> List[VCALENDAR]:
+        """ entries for the given href -> etag dict, from the cache where possible, else from the server """
+        parser, missing = self._cached(etags, lazy)
+        fetched = self._multiget(missing, lazy)
+        return parser.finish() + fetched
+
+    @staticmethod
+    def _parse_etags(tree) -> Dict[str, str]:
+        if tree is None:
+            return None
+
+        etags = {}
+        for response in tree.findall(".//{DAV:}response"):
             if response.find(".//{DAV:}resourcetype/{DAV:}collection") is None:
                 try:
-                    hrefs.append(response.find(".//{DAV:}href").text)
+                    etag = response.find(".//{DAV:}getetag")
+                    etags[response.find(".//{DAV:}href").text] = etag.text if etag is not None else None
                 except AttributeError:
                     logging.exception('malformed calendar event response')
 
-        req_data = """<c:calendar-multiget xmlns:d="DAV:" xmlns:c="urn:ietf:params:xml:ns:caldav"><d:prop><d:getetag />
-                 <c:calendar-data /></d:prop>\n"""
+        return etags
 
-        for i in hrefs:
-            req_data += "<d:href>%s</d:href>\n" % i
+    def _get_etags(self) -> Dict[str, str]:
+        """ href -> etag of all entries on the server, None if the PROPFIND failed """
+        headers = {'Depth': '1', 'Prefer': 'return-minimal'}
+        return self._parse_etags(self.server.propfind(self.path, self.ETAGS_REQUEST, headers))
 
-        req_data += "</c:calendar-multiget>"
+    @staticmethod
+    def _parse_sync_state(tree) -> Tuple[str, str]:
+        if tree is None:
+            return None
 
-        nodes = self.server.report_nodes(self.path, xpath, req_data, headers)
+        ctag = tree.find(".//{http://calendarserver.org/ns/}getctag")
+        token = tree.find(".//{DAV:}sync-token")
+        return ctag.text if ctag is not None else None, token.text if token is not None else None
 
-        self.entries = []
+    def _get_sync_state(self) -> Tuple[str, str]:
+        """ current (ctag, sync-token) of the collection, either may be None, None if the PROPFIND failed """
+        headers = {'Depth': '0', 'Prefer': 'return-minimal'}
+        return self._parse_sync_state(self.server.propfind(self.path, self.SYNC_STATE_REQUEST, headers))
 
-        for node in nodes:
-            try:
-                href = node.find(".//{DAV:}href").text
-                etag = node.find(".//{DAV:}getetag").text
-                data = node.find(".//{urn:ietf:params:xml:ns:caldav}calendar-data").text
+    def _sync_collection_request(self) -> str:
+        return """<d:sync-collection xmlns:d="DAV:"><d:sync-token>%s</d:sync-token><d:sync-level>1</d:sync-level>
+                      <d:prop><d:getetag /></d:prop></d:sync-collection>""" % escape(self.sync_token)
 
-                self.entries.append(VCALENDAR(href, etag, data))
+    def _parse_sync_collection(self, tree) -> Tuple[str, Dict[str, str], List[str]]:
+        if tree is None:
+            return None
 
+        changed = {}
+        deleted = []
+        for response in tree.findall(".//{DAV:}response"):
+            try:
+                href = response.find("{DAV:}href").text
             except AttributeError:
-                logging.exception('malformed response tag or missing sub-tag')
\ No newline at end of file
+                logging.exception('malformed sync-collection response')
+                continue
+
+            status = response.find("{DAV:}status")
+            if status is not None and ' 404 ' in status.text:
+                deleted.append(href)
+                continue
+
+            etag = response.find(".//{DAV:}getetag")
+            entry = self._by_href.get(href)
+            if entry is None or etag is None or entry.etag != etag.text:
+                changed[href] = etag.text if etag is not None else None
+
+        token = tree.find("{DAV:}sync-token")
+        return token.text if token is not None else None, changed, deleted
+
+    def _sync_collection(self) -> Tuple[str, Dict[str, str], List[str]]:
+        """ (new sync-token, changed href -> etag, deleted hrefs) since self.sync_token, None if the REPORT failed """
+        headers = {'Prefer': 'return-minimal'}
+        return self._parse_sync_collection(self.server.report(self.path, self._sync_collection_request(), headers))
+
+    def _incremental(self) -> bool:
+        """ whether changes can be asked for with a sync-collection REPORT """
+        return bool(self.sync_token) and self._synced_ctag is not None
+
+    def _diff(self, etags: Dict[str, str]) -> Tuple[Dict[str, str], List[str]]:
+        """ (changed href -> etag, deleted hrefs) comparing the etags on the server with the loaded entries """
+        deleted = [href for href in self._by_href if href not in etags]
+        changed = dict((href, etag) for href, etag in etags.items()
+                       if href not in self._by_href or self._by_href[href].etag != etag)
+        return changed, deleted
+
+    def _sync_failed(self) -> bool:
+        logging.error('%s: sync failed, keeping the loaded entries', self)
+        Metrics.count('caldav.sync.failed')
+        return False
+
+    def _remove_deleted(self, deleted: List[str]):
+        logging.debug('%s: %d deleted', self, len(deleted))
+        Metrics.count('caldav.sync.deleted', len(deleted))
+
+        for href in deleted:
+            self.remove_entry(href)
+        if deleted and self.cache is not None:
+            self.cache.remove(self.path, deleted)
+
+    def _apply_changes(self, ctag: str, token: str, changed: Dict[str, str], fetched: List[VCALENDAR]):
+        logging.debug('%s: %d changed', self, len(changed))
+        Metrics.count('caldav.sync.changed', len(changed))
+
+        for entry in fetched:
+            self.add_entry(entry)
+
+        self.ctag = ctag if ctag is not None else self.ctag
+        self.sync_token = token
+        # entries missing after a failed multiget are picked up by the next sync comparing etags
+        self._synced_ctag = ctag if len(fetched) == len(changed) else None
+
+    def _href(self, entry: VCALENDAR) -> str:
+        """ href of an entry, new entries are stored as <uid>.ics in the collection, None for new ones without UID """
+        if entry.href is not None:
+            return entry.href
+        component = entry.event if entry.event is not None else entry.todo
+        if component is None or component.uid is None:
+            return None
+        return '%s/%s.ics' % (self.path.rstrip('/'), quote(component.uid, safe='@'))
+
+    @staticmethod
+    def _unnamed() -> WriteResult:
+        """ failed result of a new entry _href found no name for, it is not uploaded """
+        logging.warning('PUT of a new entry without UID skipped')
+        return WriteResult(None, None, MalformedVObjectException('new entry without href or UID'))
+
+    @staticmethod
+    def _put_request(entry: VCALENDAR) -> Tuple[str, dict]:
+        """ (body, headers) of the PUT of an entry, conditional on its etag or on not existing yet """
+        headers = {'Content-Type': 'text/calendar; charset=utf-8'}
+        if entry.etag is not None:
+            headers['If-Match'] = entry.etag
+        else:
+            headers['If-None-Match'] = '*'
+        return serialize(entry), headers
+
+    def _delete_request(self, href: str) -> dict:
+        entry = self._by_href.get(href)
+        return {'If-Match': entry.etag} if entry is not None and entry.etag is not None else {}
+
+    def _put(self, href: str, data: str, headers: dict) -> WriteResult:
+        if href is None:
+            return self._unnamed()
+        try:
+            return WriteResult(href, self.server.put(href, data.encode('utf-8'), headers), None)
+        except (OperationFailed, requests.RequestException) as e:
+            logging.warning('PUT of %s failed: %s', href, getattr(e, 'reason', e))
+            return WriteResult(href, None, e)
+
+    def _delete(self, href: str, headers: dict) -> WriteResult:
+        try:
+            self.server.delete(href, headers)
+        except OperationFailed as e:
+            if e.actual_code != 404:
+                logging.warning('DELETE of %s failed: %s', href, e.reason)
+                return WriteResult(href, None, e)
+        except requests.RequestException as e:
+            logging.warning('DELETE of %s failed: %s', href, e)
+            return WriteResult(href, None, e)
+        return WriteResult(href, None, None)
+
+    def _run_writes(self, method, args: List[tuple]) -> List[WriteResult]:
+        """ call `method` with every args tuple on up to write_workers threads, results in order """
+        if len(args) <= 1 or self.write_workers <= 1:
+            return [method(*a) for a in args]
+
+        with ThreadPoolExecutor(max_workers=min(self.write_workers, len(args))) as pool:
+            return list(pool.map(lambda a: method(*a), args))
+
+    def _apply_puts(self, entries: List[VCALENDAR], bodies: List[str], results: List[WriteResult]):
+        stored = []
+        for entry, data, result in zip(entries, bodies, results):
+            if result.error is not None:
+                continue
+            entry.href = result.href
+            # without an etag the entry is fetched again by the next sync
+            entry.etag = result.etag
+            self.add_entry(entry)
+            stored.append((result.href, result.etag, data))
+
+        failed = sum(1 for r in results if r.error is not None)
+        Metrics.count('caldav.write.put', len(results) - failed)
+        Metrics.count('caldav.write.failed', failed)
+        if self.cache is not None:
+            self.cache.put_many(self.path, stored)
+
+    def _apply_deletes(self, results: List[WriteResult]):
+        deleted = [r.href for r in results if r.error is None]
+        for href in deleted:
+            self.remove_entry(href)
+
+        Metrics.count('caldav.write.deleted', len(deleted))
+        Metrics.count('caldav.write.failed', len(results) - len(deleted))
+        if deleted and self.cache is not None:
+            self.cache.remove(self.path, deleted)
+
+    @Metrics.timed('caldav.put_many')
+    def put_many(self, entries: Iterable[VCALENDAR]) -> List[WriteResult]:
+        """ upload entries concurrently, by up to write_workers requests sharing the server's connection pool
+
+        entries with an etag (e.g. loaded and modified ones) replace the resource only if it is unchanged on the
+        server (If-Match), entries without one are created only if their href is still free (If-None-Match).
+        new entries without an href are stored as <uid>.ics, those without a UID fail without a request. every
+        uploaded entry gets its href and new etag and is added to (or replaces its old version in) the entries,
+        failures leave the calendar untouched.
+
+        :return: a WriteResult per entry, in order
+        """
+        entries = list(entries)
+        prepared = [self._put_request(e) for e in entries]
+        results = self._run_writes(self._put, [(self._href(e), data, headers)
+                                               for e, (data, headers) in zip(entries, prepared)])
+        self._apply_puts(entries, [data for data, _ in prepared], results)
+        return results
+
+    @Metrics.timed('caldav.delete_many')
+    def delete_many(self, hrefs: Iterable[str]) -> List[WriteResult]:
+        """ delete resources concurrently like put_many, loaded entries only if unchanged on the server (If-Match)
+
+        resources already gone count as deleted. deleted entries are removed from the entries.
+
+        :return: a WriteResult per href, in order
+        """
+        results = self._run_writes(self._delete, [(href, self._delete_request(href)) for href in hrefs])
+        self._apply_deletes(results)
+        return results
+
+    @Metrics.timed('caldav.sync')
+    def sync(self, lazy: bool=False) -> bool:
+        """ bring the entries up to date with the server, fetching only what was added or changed
+
+        the first sync of a calendar loads all entries. returns False if the calendar was unchanged, or if the
+        server could not tell what changed: a sync failing that way keeps the entries (and the cache) as they are
+        and is repeated in full by the next one.
+
+        :param lazy: decode event/todo properties on first access only
+        """
+        state = self._get_sync_state()
+        if state is None:
+            return self._sync_failed()
+
+        ctag, token = state
+        if ctag is not None and ctag == self._synced_ctag:
+            Metrics.count('caldav.sync.unchanged')
+            return False
+
+        result = self._sync_collection() if self._incremental() else None
+
+        if result is not None:
+            token, changed, deleted = result
+        else:
+            etags = self._get_etags()
+            if etags is None:
+                return self._sync_failed()
+            changed, deleted = self._diff(etags)
+
+        self._remove_deleted(deleted)
+        self._apply_changes(ctag, token, changed, self._fetch(changed, lazy))
+        return bool(changed or deleted)
+
+    @Metrics.timed('caldav.load')
+    def load(self, lazy: bool=False, start: datetime=None, end: datetime=None):
+        """ load calendar data from the server
+
+        without a time range all entries are fetched (full load), with `start` and/or `end` only the entries
+        overlapping that range are fetched through a calendar-query REPORT (see query)
+
+        :param lazy: decode event/todo properties on first access only, cheaper if just a few fields are used
+        :param start: begin of the time range to load
+        :param end: end of the time range to load
+        """
+        self._synced_ctag = None
+
+        if start is not None or end is not None:
+            self._set_entries(self.query(start, end, lazy))
+            return
+
+        self._set_entries(self._fetch(self._get_etags() or {}, lazy))
@@ -1,27 +1,64 @@
 import logging
-from typing import List
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
 
+import calpy.Metrics as Metrics
+from calpy.caldav.Cache import Cache
 from calpy.caldav.Server import Server
 from calpy.caldav.Calendar import Calendar
 
 
 class Client(object):
     server = None     # type: Server
+    cache = None      # type: Cache
+
+    # type of the calendars created by get_calendars
+    calendar_class = Calendar
+
+    # seconds a cached discovery result is used without asking the server, see discover
+    discovery_ttl = 3600.0
+
+    # request bodies and xpaths, shared with AsyncClient
+    PRINCIPAL_REQUEST = """<d:propfind xmlns:d="DAV:"><d:prop><d:current-user-principal /></d:prop></d:propfind>"""
+    PRINCIPAL_XPATH = ".//{DAV:}current-user-principal/{DAV:}href"
+    HOME_SET_REQUEST = """<d:propfind xmlns:d="DAV:" xmlns:c="urn:ietf:params:xml:ns:caldav"><d:prop>
+                      <c:calendar-home-set /></d:prop></d:propfind>"""
+    HOME_SET_XPATH = ".//{urn:ietf:params:xml:ns:caldav}calendar-home-set/{DAV:}href"
+    CALENDARS_REQUEST = """<d:propfind xmlns:cs="http://calendarserver.org/ns/" xmlns:c="urn:ietf:params:xml:ns:caldav"
+                      xmlns:d="DAV:" ><d:prop><d:resourcetype /><d:displayname /><cs:getctag />
+                      <c:supported-calendar-component-set /></d:prop></d:propfind>"""
 
     def get_current_user_principal(self) -> str:
         headers = {'Depth': '0', 'Prefer': 'return-minimal'}
-        req_data = """<d:propfind xmlns:d="DAV:"><d:prop><d:current-user-principal /></d:prop></d:propfind>"""
-        xpath = ".//{DAV:}current-user-principal/{DAV:}href"
-
-        return self.server.propfind_node_text('/', xpath, req_data, headers)
+        return self.server.propfind_node_text('/', self.PRINCIPAL_XPATH, self.PRINCIPAL_REQUEST, headers)
 
     def get_calendar_home_set(self, current_user_principal: str) -> str:
         headers = {'Depth': '0', 'Prefer': 'return-minimal'}
-        req_data = """<d:propfind xmlns:d="DAV:" xmlns:c="urn:ietf:params:xml:ns:caldav"><d:prop>
-                      <c:calendar-home-set /></d:prop></d:propfind>"""
-        xpath = ".//{urn:ietf:params:xml:ns:caldav}calendar-home-set/{DAV:}href"
+        return self.server.propfind_node_text(current_user_principal, self.HOME_SET_XPATH, self.HOME_SET_REQUEST,
+                                              headers)
+
+    def _calendar(self, component: str, path: str, displayname: str, ctag: str) -> Calendar:
+        cal = self.calendar_class(component, self.server, self.cache)
+        cal.path = path
+        cal.displayname = displayname
+        cal.ctag = ctag
+        return cal
+
+    def _parse_calendars(self, nodes) -> List[Calendar]:
+        calendars = []
 
-        return self.server.propfind_node_text(current_user_principal, xpath, req_data, headers)
+        for response in nodes:
+            for supported in response.findall(".//{urn:ietf:params:xml:ns:caldav}supported-calendar-component-set/*"):
+                component = supported.attrib.get('name', 'VUNKNOWN')
+
+                if component == 'VTODO' or component == 'VEVENT':
+                    calendars.append(self._calendar(component, response.find(".//{DAV:}href").text,
+                                                    response.find(".//{DAV:}displayname").text,
+                                                    response.find(".//{http://calendarserver.org/ns/}getctag").text))
+
+        return calendars
 
     def get_calendars(self, calendar_home_set: str) -> List[Calendar]:
         """ fetch all Calendar collections for given calendar-home-set from the server
@@ -32,34 +69,63 @@ class Client(object):
         :return: List of Calendar-collections
         """
         headers = {'Depth': '1', 'Prefer': 'return-minimal'}
-        req_data = """<d:propfind xmlns:cs="http://calendarserver.org/ns/" xmlns:c="urn:ietf:params:xml:ns:caldav"
-                      xmlns:d="DAV:" ><d:prop><d:resourcetype /><d:displayname /><cs:getctag />
-                      <c:supported-calendar-component-set /></d:prop></d:propfind>"""
         xpath = ".//{DAV:}response"
 
-        nodes = self.server.propfind_nodes(calendar_home_set, xpath, req_data, headers)
-
-        calendars = []
-        tasks = []
-
-        for response in nodes:
-            for supported in response.findall(".//{urn:ietf:params:xml:ns:caldav}supported-calendar-component-set/*"):
-                component = supported.attrib.get('name', 'VUNKNOWN')
-
-                if component == 'VTODO' or component == 'VEVENT':
-                    cal = Calendar(component, self.server)
-                    cal.ctag = response.find(".//{http://calendarserver.org/ns/}getctag").text
-                    cal.path = response.find(".//{DAV:}href").text
-                    cal.displayname = response.find(".//{DAV:}displayname").text
+        nodes = self.server.propfind_nodes(calendar_home_set, xpath, self.CALENDARS_REQUEST, headers)
+        return self._parse_calendars(nodes)
 
-                    calendars.append(cal)
-
-        return calendars
+    def __init__(self, host:str, port=0, auth=None, protocol='https', verify_ssl=True, cache: Cache=None,
+                 max_connections: int=10):
+        """
+        :param cache: on-disk cache shared by all calendars of this client, see Cache
+        :param max_connections: limit of concurrent connections to the server, shared by all threads
+        """
+        self.server = Server(host, port=port, auth=auth, protocol=protocol, verify_ssl=verify_ssl,
+                             max_connections=max_connections)
+        self.cache = cache
+        self.max_workers = max_connections
+        self.account = '%s %s' % (self.server.baseurl, auth[0] if isinstance(auth, tuple) else '')
+
+    def _cached_discovery(self) -> Tuple[Optional[List[Calendar]], Optional[str], Optional[str]]:
+        """ (calendars if the cached discovery is fresh, cached calendar-home-set, cached principal) """
+        if self.cache is None:
+            return None, None, None
+
+        data, stored = self.cache.get_discovery(self.account)
+        if data is None:
+            return None, None, None
+
+        calendars = None
+        if time.time() - stored < self.discovery_ttl:
+            Metrics.count('caldav.discovery.cached')
+            calendars = [self._calendar(*c) for c in data['calendars']]
+        return calendars, data['home_set'], data['principal']
+
+    def _store_discovery(self, principal: str, home_set: str, calendars: List[Calendar]):
+        if self.cache is not None and calendars:
+            self.cache.put_discovery(self.account, {
+                'principal': principal, 'home_set': home_set,
+                'calendars': [(c.type, c.path, c.displayname, c.ctag) for c in calendars]})
+
+    def discover(self, refresh: bool=False) -> List[Calendar]:
+        """ find all calendars of the account
+
+        with a cache, the result is reused for discovery_ttl seconds without any request. after that it is
+        revalidated by a single PROPFIND on the cached calendar-home-set, the principal lookups only run for
+        accounts not cached yet or if the home set stopped working.
+
+        :param refresh: ignore a fresh cached result
+        """
+        calendars, calendar_home_set, principal = self._cached_discovery()
+        if calendars is not None and not refresh:
+            return calendars
 
-    def __init__(self, host:str, port=0, auth=None, protocol='https', verify_ssl=True):
-        self.server = Server(host, port=port, auth=auth, protocol=protocol, verify_ssl=verify_ssl)
+        if calendar_home_set is not None:
+            calendars = self.get_calendars(calendar_home_set)
+            if calendars:
+                self._store_discovery(principal, calendar_home_set, calendars)
+                return calendars
 
-    def discover(self) -> List[Calendar]:
         current_user_principal = self.get_current_user_principal()
 
         if current_user_principal is None:
@@ -70,4 +136,58 @@ class Client(object):
         if calendar_home_set is None:
             return []
 
-        return self.get_calendars(calendar_home_set)
\ No newline at end of file
+        calendars = self.get_calendars(calendar_home_set)
+        self._store_discovery(current_user_principal, calendar_home_set, calendars)
+        return calendars
+
+    def _each(self, calendars: List[Calendar], method: str, **kwargs) -> Iterable[Tuple[Calendar, object]]:
+        """ call `method` of every calendar on a pool of max_workers threads, yield (calendar, result) as they
+        finish. calendars raising an exception are logged and skipped.
+        """
+        if not calendars:
+            return
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(calendars)))) as pool:
+            futures = dict((pool.submit(getattr(c, method), **kwargs), c) for c in calendars)
+            for future in as_completed(futures):
+                calendar = futures[future]
+                try:
+                    yield calendar, future.result()
+                except Exception:
+                    logging.exception('%s of %s failed', method, calendar)
+
+    def load_all(self, calendars: List[Calendar]=None, lazy: bool=False, start: datetime=None, end: datetime=None,
+                 stream: bool=False):
+        """ load all calendars concurrently, see Calendar.load
+
+        the loads share the server's connection pool, so at most `max_connections` requests run at once however
+        many calendars there are.
+
+        :param calendars: calendars to load, discovered if None
+        :param stream: return an iterator yielding every calendar as soon as it is loaded instead of a list
+        :return: the loaded calendars, in the order they finished
+        """
+        if calendars is None:
+            calendars = self.discover()
+
+        loaded = (c for c, _ in self._each(calendars, 'load', lazy=lazy, start=start, end=end))
+        return loaded if stream else list(loaded)
+
+    def sync_all(self, calendars: List[Calendar], lazy: bool=False, stream: bool=False):
+        """ sync all calendars concurrently, see Calendar.sync
+
+        :param stream: return an iterator yielding (calendar, changed) as every sync finishes instead of a list
+        :return: (calendar, changed) tuples, in the order they finished
+        """
+        synced = self._each(calendars, 'sync', lazy=lazy)
+        return synced if stream else list(synced)
+
+    @staticmethod
+    def memory_report(calendars: List[Calendar]) -> Dict[str, dict]:
+        """ Calendar.memory_report of every calendar by path
+
+        objects shared between calendars (interned strings, timezone definitions) are counted for the first
+        calendar holding them only, so the reports add up to the memory held by all of them.
+        """
+        seen = set()
+        return dict((c.path, c.memory_report(seen)) for c in calendars)
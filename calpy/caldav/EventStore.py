@@ -0,0 +1,134 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+import calpy.Metrics as Metrics
+from calpy.caldav.Calendar import Calendar
+from calpy.caldav.IntervalIndex import timestamp
+from calpy.ical.VCALENDAR import VCALENDAR
+from calpy.ical.VEVENT import VEVENT
+
+
+TYPE_VEVENT = 0
+TYPE_VTODO = 1
+
+FLAG_RECURRING = 1      # instance of a recurring series
+FLAG_OVERRIDE = 2       # instance overridden by a RECURRENCE-ID component
+FLAG_ALL_DAY = 4        # DTSTART is a DATE value
+
+
+class EventStore(object):
+    """ columnar store of the instances of several loaded Calendars
+
+    every event/todo instance within the store's time span becomes one row of contiguous numpy arrays: start and
+    end (epoch seconds, wall-clock time as in Calendar's index), calendar id, component type, flags and the id of
+    the entry it belongs to. rows are sorted by start, so a time-range query across all calendars is a
+    searchsorted plus one vectorized mask instead of a Python call per entry.
+
+    entries are referenced by (calendar, href) and resolved through Calendar.get_entry, the store itself holds no
+    parsed objects.
+    """
+
+    def __init__(self, calendars: Iterable[Calendar], start: datetime=None, end: datetime=None):
+        """
+        :param calendars: loaded calendars to compile
+        :param start: begin of the time span recurring series are expanded for, defaults to one year ago
+        :param end: end of that span, defaults to two years from now
+        """
+        if numpy is None:
+            raise ImportError('EventStore requires numpy')
+
+        now = datetime.now()
+        self.start = start if start is not None else now - Calendar.index_horizon[0]
+        self.end = end if end is not None else now + Calendar.index_horizon[1]
+
+        self.calendars = list(calendars)    # type: List[Calendar]
+        self._calendar_ids = dict((c, i) for i, c in enumerate(self.calendars))  # type: Dict[Calendar, int]
+        self.hrefs = []                     # type: List[str]
+        self._compile()
+
+    def _compile(self):
+        with Metrics.timer('caldav.store.compile'):
+            starts, ends, cal_ids, types, flags, entry_ids = [], [], [], [], [], []
+
+            for cal_id, calendar in enumerate(self.calendars):
+                for entry in calendar.entries:
+                    entry_id = len(self.hrefs)
+                    self.hrefs.append(entry.href)
+
+                    for start, end, component in entry.instances(self.start, self.end):
+                        flag = 0
+                        if isinstance(component, VEVENT) and component.recurring():
+                            flag |= FLAG_RECURRING
+                        if component.recurrence_id is not None:
+                            flag |= FLAG_OVERRIDE
+                        if component.all_day():
+                            flag |= FLAG_ALL_DAY
+
+                        starts.append(timestamp(start))
+                        ends.append(timestamp(end))
+                        cal_ids.append(cal_id)
+                        types.append(TYPE_VEVENT if isinstance(component, VEVENT) else TYPE_VTODO)
+                        flags.append(flag)
+                        entry_ids.append(entry_id)
+
+            order = numpy.argsort(numpy.asarray(starts, dtype=numpy.int64), kind='stable')
+            self.starts = numpy.asarray(starts, dtype=numpy.int64)[order]
+            self.ends = numpy.asarray(ends, dtype=numpy.int64)[order]
+            self.calendar_ids = numpy.asarray(cal_ids, dtype=numpy.int32)[order]
+            self.types = numpy.asarray(types, dtype=numpy.int8)[order]
+            self.flags = numpy.asarray(flags, dtype=numpy.uint8)[order]
+            self.entry_ids = numpy.asarray(entry_ids, dtype=numpy.int32)[order]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def nbytes(self) -> int:
+        """ memory used by the column arrays """
+        return sum(a.nbytes for a in (self.starts, self.ends, self.calendar_ids, self.types, self.flags,
+                                      self.entry_ids))
+
+    def query_rows(self, start: datetime, end: datetime, calendars: Iterable[Calendar]=None,
+                   component: int=None) -> 'numpy.ndarray':
+        """ indices of the rows (instances) overlapping [start, end], in start order
+
+        :param calendars: restrict the query to these calendars, all of them compiled into the store (ValueError
+                          otherwise)
+        :param component: restrict the query to TYPE_VEVENT or TYPE_VTODO rows
+        """
+        hi = numpy.searchsorted(self.starts, int(timestamp(end)), side='right')
+        mask = self.ends[:hi] >= int(timestamp(start))
+
+        if calendars is not None:
+            ids = []
+            for c in calendars:
+                cal_id = self._calendar_ids.get(c)
+                if cal_id is None:
+                    raise ValueError('%s is not part of this EventStore' % c)
+                ids.append(cal_id)
+            mask &= numpy.isin(self.calendar_ids[:hi], ids)
+        if component is not None:
+            mask &= self.types[:hi] == component
+
+        return numpy.flatnonzero(mask)
+
+    def query(self, start: datetime, end: datetime, calendars: Iterable[Calendar]=None,
+              component: int=None) -> List[Tuple[Calendar, VCALENDAR]]:
+        """ (calendar, entry) pairs with an instance overlapping [start, end], each entry once, in start order """
+        with Metrics.timer('caldav.store.query'):
+            rows = self.query_rows(start, end, calendars, component)
+            entry_ids, first = numpy.unique(self.entry_ids[rows], return_index=True)
+            entry_ids = entry_ids[numpy.argsort(first, kind='stable')]
+            cal_ids = self.calendar_ids[rows][numpy.sort(first)]
+
+            result = []
+            for entry_id, cal_id in zip(entry_ids.tolist(), cal_ids.tolist()):
+                calendar = self.calendars[cal_id]
+                entry = calendar.get_entry(self.hrefs[entry_id])
+                if entry is not None:
+                    result.append((calendar, entry))
+            return result
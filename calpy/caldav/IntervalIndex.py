@@ -0,0 +1,80 @@
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timezone
+from typing import Dict, Hashable, List, Tuple
+
+
+_EPOCH = datetime(1970, 1, 1)
+_INF = float('inf')
+
+
+def timestamp(dt: datetime) -> float:
+    """ seconds since the epoch; naive datetimes are taken as they are (wall-clock), aware ones are converted to UTC """
+    if dt.tzinfo is None:
+        return (dt - _EPOCH).total_seconds()
+    return (dt.astimezone(timezone.utc).replace(tzinfo=None) - _EPOCH).total_seconds()
+
+
+class IntervalIndex(object):
+    """ index of closed [start, end] intervals (as timestamps) supporting overlap queries
+
+    intervals are partitioned into duration classes (class c holds durations below 2**c seconds), every class is
+    a list sorted by start. an interval of class c overlapping [qs, qe] must start within [qs - 2**c, qe], which is
+    located by bisection, so a query costs O(classes * log n + k) with only few false positives to skip. adding
+    and removing intervals keeps the lists sorted in place, no rebuilds are needed.
+    """
+
+    def __init__(self):
+        self._classes = {}  # type: Dict[int, List[Tuple[float, float, Hashable]]]
+        self._keys = {}     # type: Dict[Hashable, List[Tuple[int, Tuple[float, float, Hashable]]]]
+
+    def __len__(self):
+        return sum(len(c) for c in self._classes.values())
+
+    def __contains__(self, key: Hashable):
+        return key in self._keys
+
+    def add(self, key: Hashable, start: float, end: float):
+        """ add an interval for key (a key may own any number of intervals, keys must be orderable, e.g. hrefs) """
+        if end < start:
+            end = start
+        cls = int(end - start).bit_length()
+        item = (start, end, key)
+
+        lst = self._classes.get(cls)
+        if lst is None:
+            lst = self._classes[cls] = []
+        insort(lst, item)
+        self._keys.setdefault(key, []).append((cls, item))
+
+    def remove(self, key: Hashable):
+        """ remove all intervals of key """
+        for cls, item in self._keys.pop(key, ()):
+            lst = self._classes[cls]
+            idx = bisect_left(lst, item)
+            if idx < len(lst) and lst[idx] == item:
+                del lst[idx]
+
+    def query(self, start: float, end: float) -> List[Hashable]:
+        """ keys owning an interval overlapping [start, end], each key once, ordered by their earliest match """
+        return [key for _, key in self.query_first(start, end)]
+
+    def query_first(self, start: float, end: float) -> List[Tuple[float, Hashable]]:
+        """ (start of the earliest match, key) of the keys owning an interval overlapping [start, end], see query """
+        matches = []
+        for cls, lst in self._classes.items():
+            lo = bisect_left(lst, (start - (1 << cls),))
+            hi = bisect_right(lst, (end, _INF))
+            for item in lst[lo:hi]:
+                if item[1] >= start:
+                    matches.append(item)
+
+        if len(self._classes) > 1:
+            matches.sort(key=lambda i: i[0])
+
+        seen = set()
+        result = []
+        for first, _, key in matches:
+            if key not in seen:
+                seen.add(key)
+                result.append((first, key))
+        return result
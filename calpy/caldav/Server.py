@@ -1,11 +1,15 @@
 import requests
 import logging
+import threading
 import xml.etree.ElementTree as Xml
-from typing import List
+from typing import Dict, Iterator, List, Tuple
 
 from http.client import responses as http_codes
 from numbers import Number
 
+import calpy.Metrics as Metrics
+from calpy.caldav.Throttle import THROTTLE_CODES, Throttle
+
 
 class OperationFailed(Exception):
     @staticmethod
@@ -39,9 +43,63 @@ class OperationFailed(Exception):
         super(OperationFailed, self).__init__(msg)
 
 
-class Server(object):
-    def __init__(self, host, port=0, auth=None,
-                 protocol='https', verify_ssl=True, path=None):
+class MultistatusParser(object):
+    """ incremental parser of a multistatus body, returns every response element as soon as it is complete
+
+    elements returned by one feed() are cleared and detached when the next chunk is fed, so only the responses
+    currently being processed are held in memory, however large the body.
+    """
+
+    def __init__(self, tag: str='{DAV:}response'):
+        self.tag = tag
+        self._parser = Xml.XMLPullParser(events=('start', 'end'))
+        self._root = None       # type: Xml.Element
+        self._depth = 0
+        self._returned = []     # type: List[Xml.Element]
+
+    def feed(self, data: bytes) -> List[Xml.Element]:
+        self._release()
+        self._parser.feed(data)
+        return self._read_events()
+
+    def close(self) -> List[Xml.Element]:
+        self._release()
+        self._parser.close()
+        return self._read_events()
+
+    def _release(self):
+        for elem in self._returned:
+            elem.clear()
+            self._root.remove(elem)
+        self._returned = []
+
+    def _read_events(self) -> List[Xml.Element]:
+        for event, elem in self._parser.read_events():
+            if event == 'start':
+                if self._root is None:
+                    self._root = elem
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 1 and elem.tag == self.tag:
+                    self._returned.append(elem)
+        return self._returned
+
+
+class ServerBase(object):
+    """ url handling, status checks and XML parsing shared by the blocking Server and the asyncio AsyncServer
+
+    all servers pointing at the same host with the same `max_connections` share one Throttle, throttled (429/503)
+    requests are retried up to `max_retries` times. a request holds its throttle slot until the response headers
+    arrived, see Throttle.
+    """
+
+    max_retries = 5
+
+    _shared_lock = threading.Lock()
+    _throttles = {}     # type: Dict[Tuple[str, int, int], Throttle]
+
+    def __init__(self, host, port=0, protocol='https', path=None, max_connections=10):
         if not port:
             port = 443 if protocol == 'https' else 80
 
@@ -50,26 +108,114 @@ class Server(object):
         if path:
             self.baseurl = '{0}/{1}'.format(self.baseurl, path)
 
+        self.host = (host, port)
+        # servers configured with different limits must not cap each other
+        self._shared_key = self.host + (max_connections,)
+        with self._shared_lock:
+            throttle = self._throttles.get(self._shared_key)
+            if throttle is None:
+                throttle = self._throttles[self._shared_key] = Throttle(max_connections)
+        self.throttle = throttle
+
+    def _get_url(self, path) -> str:
+        path = str(path).strip()
+        if path.startswith('/'):
+            return self.baseurl + path
+        return "".join((self.baseurl, '/', path))
+
+    @staticmethod
+    def _check_status(method, path, expected_code, status_code):
+        Metrics.count('caldav.http.requests')
+        if isinstance(expected_code, Number) and status_code != expected_code \
+            or not isinstance(expected_code, Number) and status_code not in expected_code:
+            Metrics.count('caldav.http.failed')
+            raise OperationFailed(method, path, expected_code, status_code)
+
+    @staticmethod
+    def _parse_xml(content: bytes) -> Xml.Element:
+        try:
+            Metrics.count('caldav.http.bytes', len(content))
+            with Metrics.timer('caldav.xml.parse'):
+                return Xml.fromstring(content)
+        except (Xml.ParseError, TypeError):
+            logging.exception('Response malformed')
+            return None
+
+    @staticmethod
+    def _node_text(tree: Xml.Element, xpath: str) -> str:
+        if tree is None:
+            return None
+
+        res = tree.find(xpath)
+        if res is None:
+            # TODO: add detection for errors like unauthorized?
+            logging.error('server respondeded with status 207 but target node %s not found in response XML', xpath)
+            return None
+
+        logging.debug('target node found with value: %s', res.text)
+        return res.text
+
+
+class Server(ServerBase):
+    """ blocking CalDAV transport on a requests session
+
+    the session may be shared by any number of threads. servers pointing at the same host with the same
+    `max_connections` share one keep-alive connection pool of that size, requests beyond it block until a
+    connection is free. responses are requested gzip/deflate compressed.
+    """
+
+    # bytes read from the socket per step of a streamed response
+    chunk_size = 64 * 1024
+
+    _adapters = {}      # type: Dict[Tuple[str, int, int], requests.adapters.HTTPAdapter]
+
+    def __init__(self, host, port=0, auth=None,
+                 protocol='https', verify_ssl=True, path=None, max_connections=10):
+        super(Server, self).__init__(host, port, protocol, path, max_connections)
+
         self.session = requests.session()
         self.session.verify = verify_ssl
         self.session.stream = True
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+
+        with self._shared_lock:
+            adapter = self._adapters.get(self._shared_key)
+            if adapter is None:
+                adapter = self._adapters[self._shared_key] = requests.adapters.HTTPAdapter(
+                    pool_maxsize=max_connections, pool_block=True)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
 
         if auth:
             self.session.auth = auth
 
     def send(self, method, path, expected_code, **kwargs) -> requests.Response:
         url = self._get_url(path)
-        response = self.session.request(method, url, allow_redirects=False, **kwargs)
-        if isinstance(expected_code, Number) and response.status_code != expected_code \
-            or not isinstance(expected_code, Number) and response.status_code not in expected_code:
-            raise OperationFailed(method, path, expected_code, response.status_code)
-        return response
 
-    def _get_url(self, path) -> str:
-        path = str(path).strip()
-        if path.startswith('/'):
-            return self.baseurl + path
-        return "".join((self.baseurl, '/', path))
+        for attempt in range(self.max_retries + 1):
+            self.throttle.acquire()
+            response = None
+            try:
+                with Metrics.timer('caldav.http.%s' % method.lower()):
+                    response = self.session.request(method, url, allow_redirects=False, **kwargs)
+            finally:
+                throttled = response is not None and response.status_code in THROTTLE_CODES
+                delay = self.throttle.delay(attempt, response.headers.get('Retry-After')) if throttled else 0
+                # a request failing without a response (reset, timeout) tells nothing about the server's limit
+                self.throttle.release(throttled, delay, adapt=response is not None)
+
+            if not throttled or attempt == self.max_retries:
+                break
+            logging.warning('%s %s throttled with %d, retrying in %.1fs', method, path, response.status_code, delay)
+            response.close()
+
+        # with stream set, the connection only returns to the pool once the response is closed
+        try:
+            self._check_status(method, path, expected_code, response.status_code)
+        except OperationFailed:
+            response.close()
+            raise
+        return response
 
     def request_xml(self, method: str, url: str, req_data:str, headers=None) -> Xml.ElementTree:
         try:
@@ -77,13 +223,36 @@ class Server(object):
         except OperationFailed:
             logging.exception('request failed')
             return None
-        try:
-            tree = Xml.fromstring(response.content)
-        except (Xml.ParseError, TypeError):
-            logging.exception('Response malformed')
-            return None
 
-        return tree
+        return self._parse_xml(response.content)
+
+    def request_stream(self, method: str, url: str, req_data: str, headers=None,
+                       tag: str='{DAV:}response') -> Iterator[Xml.Element]:
+        """ send a request and yield the `tag` children of the multistatus response while it is being received
+
+        every element is only valid until the next one is requested. unlike request_xml failures are raised,
+        as OperationFailed, Xml.ParseError or requests.RequestException, possibly after some elements.
+        """
+        response = self.send(method, url, 207, data=req_data, headers=headers)
+        parser = MultistatusParser(tag)
+        with response:
+            for chunk in response.iter_content(self.chunk_size):
+                Metrics.count('caldav.http.bytes', len(chunk))
+                yield from parser.feed(chunk)
+            yield from parser.close()
+
+    def put(self, url: str, data: bytes, headers=None) -> str:
+        """ create or replace a resource, returns its new etag (None if the server did not send one)
+
+        raises OperationFailed (e.g. 412 if an If-Match/If-None-Match precondition failed) or
+        requests.RequestException
+        """
+        with self.send('PUT', url, (201, 204), data=data, headers=headers) as response:
+            return response.headers.get('ETag')
+
+    def delete(self, url: str, headers=None):
+        """ delete a resource, raises like put """
+        self.send('DELETE', url, (200, 204), headers=headers).close()
 
     def propfind(self, url: str, req_data: str, headers=None) -> Xml.ElementTree:
         return self.request_xml("PROPFIND", url, req_data, headers)
@@ -105,17 +274,8 @@ class Server(object):
 
         return tree.findall(xpath)
 
-    def propfind_node_text(self, url: str, xpath: str, req_data: str, headers=None) -> str:
-        node = self.propfind(url, req_data, headers)
-
-        if node is None:
-            return None
+    def report_stream(self, url: str, req_data: str, headers=None) -> Iterator[Xml.Element]:
+        return self.request_stream("REPORT", url, req_data, headers)
 
-        res = node.find(xpath)
-        if res is None:
-            # TODO: add detection for errors like unauthorized?
-            logging.error('server respondeded with status 207 but target node %s not found in response XML' % xpath)
-            return None
-
-        logging.debug('target node found with value: %s' % res.text)
-        return res.text
+    def propfind_node_text(self, url: str, xpath: str, req_data: str, headers=None) -> str:
+        return self._node_text(self.propfind(url, req_data, headers), xpath)
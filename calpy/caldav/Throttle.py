@@ -0,0 +1,128 @@
+import asyncio
+import threading
+import time
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+from typing import List, Tuple
+
+import calpy.Metrics as Metrics
+
+
+# status codes a server uses to ask for fewer requests
+THROTTLE_CODES = (429, 503)
+
+
+def retry_after(value: str, now: float=None) -> float:
+    """ seconds to wait according to a Retry-After header (delta-seconds or HTTP-date), None if unparsable """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    now = time.time() if now is None else now
+    return max(0.0, date.timestamp() - now)
+
+
+def _wake(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class Throttle(object):
+    """ adaptive concurrency limit of the requests to one host (AIMD)
+
+    every successful response raises the limit by 1/limit (about one per round of requests) up to `max_limit`,
+    every throttled one (429/503) halves it and pauses all requests for the Retry-After period or, without
+    one, an exponential backoff. bulk transfers thus settle just below the rate the server accepts.
+
+    slots are taken with acquire() (blocking), acquire_async() (waiting on the running event loop) or try_acquire()
+    and returned with release(). servers hold a slot until the response headers arrived, so the limit paces the
+    starts of requests; how many response bodies are transferred at once is bounded by the connection pool.
+    """
+
+    def __init__(self, max_limit: int, backoff: float=0.5, max_backoff: float=120.0):
+        """
+        :param max_limit: upper bound of concurrent requests, e.g. the connection pool size
+        :param backoff: pause after the first throttled response without Retry-After, doubled for each retry
+        :param max_backoff: upper bound of any pause, also caps Retry-After
+        """
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.limit = float(max_limit)
+        self.active = 0
+        self.paused_until = 0.0
+        self._cond = threading.Condition()
+        self._waiters = []      # type: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]]
+
+    def try_acquire(self) -> float:
+        """ take a slot and return 0, else the seconds until the pause ends or None if all slots are taken """
+        with self._cond:
+            return self._try_acquire()
+
+    def _try_acquire(self) -> float:
+        pause = self.paused_until - time.monotonic()
+        if pause > 0:
+            return pause
+        if self.active < int(self.limit):
+            self.active += 1
+            return 0
+        return None
+
+    def acquire(self):
+        """ take a slot, blocking while the limit is reached or requests are paused """
+        with self._cond:
+            while True:
+                wait = self._try_acquire()
+                if wait == 0:
+                    return
+                self._cond.wait(wait)
+
+    async def acquire_async(self):
+        """ take a slot like acquire, but wait on the running event loop until a slot is released """
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                wait = self._try_acquire()
+                if wait == 0:
+                    return
+                waiter = loop.create_future()
+                self._waiters.append((loop, waiter))
+            try:
+                await asyncio.wait([waiter], timeout=wait)
+            finally:
+                with self._cond:
+                    if (loop, waiter) in self._waiters:
+                        self._waiters.remove((loop, waiter))
+
+    def delay(self, attempt: int, header: str=None) -> float:
+        """ pause after the `attempt`th (0-based) throttled response of a request """
+        seconds = retry_after(header)
+        if seconds is None:
+            seconds = self.backoff * (2 ** attempt)
+        return min(seconds, self.max_backoff)
+
+    def release(self, throttled: bool=False, delay: float=0, adapt: bool=True):
+        """ return a slot, adapting the limit to whether the response was throttled
+
+        :param delay: seconds to pause all requests for after a throttled response
+        :param adapt: False to keep the limit after a request that failed without any response
+        """
+        with self._cond:
+            self.active -= 1
+            if throttled:
+                self.limit = max(1.0, self.limit / 2)
+                self.paused_until = max(self.paused_until, time.monotonic() + delay)
+                Metrics.count('caldav.http.throttled')
+            elif adapt:
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self._cond.notify_all()
+            for loop, waiter in self._waiters:
+                loop.call_soon_threadsafe(_wake, waiter)
+            self._waiters = []
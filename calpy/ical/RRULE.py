@@ -0,0 +1,305 @@
+import calendar
+import logging
+from bisect import bisect_left, bisect_right
+from datetime import datetime, date, timedelta
+from functools import lru_cache
+from typing import List, Tuple
+
+from .VOBJECT import VOBJECT, MalformedVObjectException
+
+
+# number of (rule, dtstart, window) expansions kept by expand()
+CACHE_SIZE = 1024
+
+# give up on a rule after this many consecutive periods without any occurrence (e.g. BYMONTHDAY=30;BYMONTH=2)
+MAX_EMPTY_PERIODS = 1000
+
+_WEEKDAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+_SUBDAILY = {'SECONDLY': 1, 'MINUTELY': 60, 'HOURLY': 3600}
+_SUPPORTED = {'FREQ', 'INTERVAL', 'COUNT', 'UNTIL', 'BYMONTH', 'BYMONTHDAY', 'BYDAY', 'BYHOUR', 'BYMINUTE',
+              'BYSECOND', 'BYSETPOS', 'WKST'}
+
+
+class RRULE(object):
+    """ rfc5545 recurrence rule
+
+    occurrences are generated period by period (one day, week, month, ... as given by FREQ): every period
+    produces its whole batch of instances at once, BYxxx rule parts expand or limit that batch, BYSETPOS picks
+    from it. queries for a time window skip straight to the first period that can intersect the window unless the
+    rule is limited by COUNT, in which case the (finite) occurrence list is computed once and cached.
+
+    supported rule parts: FREQ, INTERVAL, COUNT, UNTIL, BYMONTH, BYMONTHDAY, BYDAY, BYHOUR, BYMINUTE, BYSECOND,
+    BYSETPOS, WKST. rules with other parts (BYWEEKNO, BYYEARDAY, ...) raise MalformedVObjectException.
+    """
+
+    def __init__(self, rule: str):
+        self.rule = rule
+
+        parts = {}
+        for item in rule.split(';'):
+            key, _, value = item.partition('=')
+            if key:
+                parts[key.strip().upper()] = value.strip().upper()
+
+        self.freq = parts.get('FREQ')
+        if self.freq not in _SUBDAILY and self.freq not in ('DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY'):
+            raise MalformedVObjectException('unsupported or missing FREQ in RRULE %s' % rule)
+
+        # ignoring a part would expand the rule to wrong instances, callers fall back on the exception instead
+        unsupported = set(parts) - _SUPPORTED
+        if unsupported:
+            raise MalformedVObjectException('unsupported RRULE parts %s in %s' % (', '.join(sorted(unsupported)), rule))
+
+        try:
+            self.interval = max(int(parts.get('INTERVAL', 1)), 1)
+            self.count = int(parts['COUNT']) if 'COUNT' in parts else None
+            self.until = VOBJECT.parse_datetime(parts['UNTIL']) if 'UNTIL' in parts else None
+            self.bymonth = self._int_list(parts.get('BYMONTH'))
+            self.bymonthday = self._int_list(parts.get('BYMONTHDAY'))
+            self.byhour = self._int_list(parts.get('BYHOUR'))
+            self.byminute = self._int_list(parts.get('BYMINUTE'))
+            self.bysecond = self._int_list(parts.get('BYSECOND'))
+            self.bysetpos = self._int_list(parts.get('BYSETPOS'))
+            self.wkst = _WEEKDAYS.index(parts.get('WKST', 'MO'))
+
+            self.byday = None   # type: List[Tuple[int, int]]
+            if parts.get('BYDAY'):
+                self.byday = [(int(d[:-2]) if d[:-2] else 0, _WEEKDAYS.index(d[-2:]))
+                              for d in parts['BYDAY'].split(',')]
+        except ValueError:
+            raise MalformedVObjectException('malformed RRULE %s' % rule)
+
+    def __str__(self):
+        return '<RRULE(%s)>' % self.rule
+
+    @staticmethod
+    @lru_cache(maxsize=256)
+    def parse(rule: str) -> 'RRULE':
+        """ parse a rule string, parsed rules are cached and shared """
+        return RRULE(rule)
+
+    @staticmethod
+    def _int_list(value: str) -> List[int]:
+        return [int(v) for v in value.split(',')] if value else None
+
+    # -- period generation ----------------------------------------------------------------------------------------
+
+    @staticmethod
+    def _nth_weekdays(first: date, ndays: int, byday: List[Tuple[int, int]]) -> List[int]:
+        """ day offsets (from `first`) within a span of `ndays` days matching the BYDAY list, honouring ordinals """
+        offsets = set()
+        first_wd = first.weekday()
+        for n, wd in byday:
+            candidates = range((wd - first_wd) % 7, ndays, 7)
+            if n == 0:
+                offsets.update(candidates)
+            elif 0 < n <= len(candidates):
+                offsets.add(candidates[n - 1])
+            elif 0 < -n <= len(candidates):
+                offsets.add(candidates[n])
+        return sorted(offsets)
+
+    def _month_days(self, year: int, month: int, dtstart: datetime) -> List[date]:
+        """ days of the given month selected by BYMONTHDAY/BYDAY, dtstart's day of month if neither is given """
+        ndays = calendar.monthrange(year, month)[1]
+
+        if self.bymonthday is None and self.byday is None:
+            return [date(year, month, dtstart.day)] if dtstart.day <= ndays else []
+
+        days = None
+        if self.bymonthday is not None:
+            days = set()
+            for md in self.bymonthday:
+                d = md if md > 0 else ndays + md + 1
+                if 1 <= d <= ndays:
+                    days.add(d)
+
+        if self.byday is not None:
+            weekdays = set(o + 1 for o in self._nth_weekdays(date(year, month, 1), ndays, self.byday))
+            days = weekdays if days is None else days & weekdays
+
+        return [date(year, month, d) for d in sorted(days)]
+
+    def _year_days(self, year: int, dtstart: datetime) -> List[date]:
+        if self.bymonth is not None:
+            days = []
+            for month in sorted(self.bymonth):
+                days.extend(self._month_days(year, month, dtstart))
+            return days
+
+        if self.byday is not None:
+            first = date(year, 1, 1)
+            ndays = 366 if calendar.isleap(year) else 365
+            days = [first + timedelta(days=o) for o in self._nth_weekdays(first, ndays, self.byday)]
+            if self.bymonthday is not None:
+                days = [d for d in days if self._match_monthday(d)]
+            return days
+
+        if self.bymonthday is not None:
+            days = []
+            for month in range(1, 13):
+                days.extend(self._month_days(year, month, dtstart))
+            return days
+
+        try:
+            return [date(year, dtstart.month, dtstart.day)]
+        except ValueError:
+            return []   # february 29th in a non leap year
+
+    def _match_monthday(self, d: date) -> bool:
+        ndays = calendar.monthrange(d.year, d.month)[1]
+        return d.day in self.bymonthday or d.day - ndays - 1 in self.bymonthday
+
+    def _match(self, d: date) -> bool:
+        """ BYxxx parts limiting (instead of expanding) the day candidates of DAILY and shorter periods """
+        if self.bymonth is not None and d.month not in self.bymonth:
+            return False
+        if self.bymonthday is not None and not self._match_monthday(d):
+            return False
+        if self.byday is not None and d.weekday() not in [wd for _, wd in self.byday]:
+            return False
+        return True
+
+    def _times(self, dtstart: datetime) -> List[Tuple[int, int, int]]:
+        hours = self.byhour or [dtstart.hour]
+        minutes = self.byminute or [dtstart.minute]
+        seconds = self.bysecond or [dtstart.second]
+        return sorted((h, m, s) for h in hours for m in minutes for s in seconds)
+
+    def _period_start(self, dtstart: datetime, k: int) -> datetime:
+        """ lower bound for all occurrences of period k """
+        if self.freq in _SUBDAILY:
+            return dtstart + timedelta(seconds=_SUBDAILY[self.freq] * self.interval * k)
+
+        if self.freq == 'DAILY':
+            d = dtstart.date() + timedelta(days=self.interval * k)
+        elif self.freq == 'WEEKLY':
+            d = dtstart.date() - timedelta(days=(dtstart.weekday() - self.wkst) % 7) + \
+                timedelta(weeks=self.interval * k)
+        elif self.freq == 'MONTHLY':
+            month = dtstart.month - 1 + self.interval * k
+            d = date(dtstart.year + month // 12, month % 12 + 1, 1)
+        else:
+            d = date(dtstart.year + self.interval * k, 1, 1)
+
+        return datetime(d.year, d.month, d.day, tzinfo=dtstart.tzinfo)
+
+    def _period(self, dtstart: datetime, k: int) -> List[datetime]:
+        """ all occurrences of period k (not yet limited by dtstart, COUNT and UNTIL) """
+        begin = self._period_start(dtstart, k)
+
+        if self.freq in _SUBDAILY:
+            if not self._match(begin.date()) or \
+                    (self.byhour is not None and begin.hour not in self.byhour) or \
+                    (self.byminute is not None and begin.minute not in self.byminute) or \
+                    (self.bysecond is not None and begin.second not in self.bysecond):
+                return []
+            return [begin]
+
+        if self.freq == 'DAILY':
+            days = [begin.date()] if self._match(begin.date()) else []
+        elif self.freq == 'WEEKLY':
+            weekdays = sorted(set((wd - self.wkst) % 7 for _, wd in self.byday)) if self.byday is not None \
+                else [(dtstart.weekday() - self.wkst) % 7]
+            days = [begin.date() + timedelta(days=o) for o in weekdays]
+            if self.bymonth is not None:
+                days = [d for d in days if d.month in self.bymonth]
+        elif self.freq == 'MONTHLY':
+            days = [] if self.bymonth is not None and begin.month not in self.bymonth \
+                else self._month_days(begin.year, begin.month, dtstart)
+        else:
+            days = self._year_days(begin.year, dtstart)
+
+        tz = dtstart.tzinfo
+        times = self._times(dtstart)
+        occurrences = [datetime(d.year, d.month, d.day, h, m, s, tzinfo=tz) for d in days for h, m, s in times]
+
+        if self.bysetpos is not None and occurrences:
+            n = len(occurrences)
+            occurrences = sorted(set(occurrences[p - 1 if p > 0 else p] for p in self.bysetpos if 0 < abs(p) <= n))
+
+        return occurrences
+
+    def _first_period(self, dtstart: datetime, start: datetime) -> int:
+        """ index of a period at or before the first period that may contain occurrences >= start """
+        if start <= dtstart:
+            return 0
+
+        if self.freq in _SUBDAILY:
+            k = int((start - dtstart).total_seconds()) // (_SUBDAILY[self.freq] * self.interval)
+        elif self.freq == 'DAILY':
+            k = (start.date() - dtstart.date()).days // self.interval
+        elif self.freq == 'WEEKLY':
+            k = (start.date() - dtstart.date()).days // (7 * self.interval)
+        elif self.freq == 'MONTHLY':
+            k = ((start.year - dtstart.year) * 12 + start.month - dtstart.month) // self.interval
+        else:
+            k = (start.year - dtstart.year) // self.interval
+
+        return max(k - 1, 0)
+
+    # -- queries --------------------------------------------------------------------------------------------------
+
+    def _iterate(self, dtstart: datetime, first: int=0, end: datetime=None):
+        """ yield batches of occurrences period by period starting with period `first` """
+        k = first
+        empty = 0
+        while True:
+            if end is not None and self._period_start(dtstart, k) > end:
+                return
+            if self.until is not None and self._period_start(dtstart, k) > self.until:
+                return
+
+            batch = [o for o in self._period(dtstart, k) if o >= dtstart and
+                     (self.until is None or o <= self.until)]
+            if batch:
+                empty = 0
+                yield batch
+            else:
+                empty += 1
+                if empty > MAX_EMPTY_PERIODS:
+                    logging.warning('RRULE %s stopped producing occurrences, giving up', self.rule)
+                    return
+            k += 1
+
+    def between(self, dtstart: datetime, start: datetime, end: datetime) -> List[datetime]:
+        """ all occurrences o with start <= o <= end """
+        if self.count is not None:
+            occurrences = _counted(self.rule, dtstart)
+            return list(occurrences[bisect_left(occurrences, start):bisect_right(occurrences, end)])
+
+        result = []
+        for batch in self._iterate(dtstart, self._first_period(dtstart, start), end):
+            result.extend(o for o in batch if start <= o <= end)
+        return result
+
+    def after(self, dtstart: datetime, dt: datetime) -> datetime:
+        """ first occurrence strictly after dt or None """
+        if self.count is not None:
+            occurrences = _counted(self.rule, dtstart)
+            idx = bisect_right(occurrences, dt)
+            return occurrences[idx] if idx < len(occurrences) else None
+
+        for batch in self._iterate(dtstart, self._first_period(dtstart, dt)):
+            for o in batch:
+                if o > dt:
+                    return o
+        return None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _counted(rule: str, dtstart: datetime) -> Tuple[datetime, ...]:
+    """ complete occurrence list of a COUNT limited rule, computed once per (rule, dtstart) """
+    rrule = RRULE.parse(rule)
+    result = []
+    for batch in rrule._iterate(dtstart):
+        result.extend(batch)
+        if len(result) >= rrule.count:
+            break
+    return tuple(result[:rrule.count])
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def expand(rule: str, dtstart: datetime, start: datetime, end: datetime) -> Tuple[datetime, ...]:
+    """ occurrences of `rule` anchored at `dtstart` within [start, end], memoized per (rule, dtstart, window) """
+    return tuple(RRULE.parse(rule).between(dtstart, start, end))
@@ -0,0 +1,97 @@
+import logging
+import mmap
+from typing import Iterator, Iterable
+
+from .VOBJECT import VOBJECT, MalformedVObjectException
+from .VEVENT import VEVENT
+from .VTODO import VTODO
+from .VTIMEZONE import VTIMEZONE
+from .VFREEBUSY import VFREEBUSY
+
+
+COMPONENTS = {
+    'VEVENT': VEVENT,
+    'VTODO': VTODO,
+    'VTIMEZONE': VTIMEZONE,
+    'VFREEBUSY': VFREEBUSY,
+}
+
+
+def _lines(stream, encoding: str) -> Iterator[str]:
+    """ iterate the lines of a text/binary file object or mmap, decoding bytes on the fly """
+    if isinstance(stream, mmap.mmap):
+        stream = iter(stream.readline, b'')
+
+    for line in stream:
+        if isinstance(line, bytes):
+            line = line.decode(encoding, errors='replace')
+        yield line
+
+
+def read_components(stream: Iterable, components=('VEVENT', 'VTODO', 'VTIMEZONE'), lazy: bool=False,
+                    encoding: str='utf-8') -> Iterator[VOBJECT]:
+    """ incrementally parse an iCalendar stream and yield its components one at a time
+
+    only the lines of the component currently being read are buffered, so memory stays bounded by the largest
+    single component regardless of the size of the stream. components are built with the regular component
+    classes (VEVENT, VTODO, VTIMEZONE, VFREEBUSY), malformed ones are logged and skipped.
+
+    :param stream: text or binary file object, mmap or any iterable of lines
+    :param components: names of the components to yield
+    :param lazy: create VEVENT/VTODO objects in lazy mode
+    :param encoding: encoding used to decode binary input
+    """
+    wanted = frozenset(components)
+    buffer = None
+    name = None
+    depth = 0
+
+    for line in _lines(stream, encoding):
+        if line[:1] in (' ', '\t'):
+            if buffer is not None:
+                buffer.append(line)
+            continue
+
+        keyword = line[:4].upper()
+        if keyword == 'BEGI' and line[:6].upper() == 'BEGIN:':
+            block_name = line[6:].strip().upper()
+            if buffer is None:
+                if block_name in wanted:
+                    buffer = [line]
+                    name = block_name
+                    depth = 1
+                continue
+            depth += 1
+        elif keyword == 'END:' and buffer is not None:
+            depth -= 1
+            if depth == 0:
+                buffer.append(line)
+                data = ''.join(buffer)
+                buffer = None
+
+                try:
+                    if name in ('VEVENT', 'VTODO'):
+                        yield COMPONENTS[name](data, lazy)
+                    else:
+                        yield COMPONENTS[name](data)
+                except MalformedVObjectException:
+                    logging.exception('skipping malformed %s component', name)
+                continue
+
+        if buffer is not None:
+            buffer.append(line)
+
+    if buffer is not None:
+        logging.warning('stream ended inside a %s component, %s lines dropped', name, len(buffer))
+
+
+def read_file(path: str, **kwargs) -> Iterator[VOBJECT]:
+    """ memory-map the .ics file at `path` and yield its components, see read_components for parameters """
+    with open(path, 'rb') as f:
+        try:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return  # empty files cannot be mapped
+
+        with mm:
+            yield from read_components(mm, **kwargs)
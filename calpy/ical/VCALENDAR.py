@@ -1,8 +1,10 @@
-import re
-from datetime import datetime, timedelta
+from datetime import datetime, time, timedelta
 from tzlocal import get_localzone
 import logging
+import sys
+from typing import Dict, List, Tuple
 
+import calpy.Metrics as Metrics
 from .VOBJECT import VOBJECT, MalformedVObjectException
 from calpy.ical.VTODO import VTODO
 from .VEVENT import VEVENT
@@ -11,88 +13,141 @@ from .VFREEBUSY import VFREEBUSY
 
 
 class VCALENDAR (VOBJECT):
-    href = None     # type: str
-    etag = None     # type: str
-    event = None    # type: VEVENT
-    todo = None     # type: VTODO
-    timezone = None # type: VTIMEZONE
+    __slots__ = ('href', 'etag', 'version', 'prodid', 'calscale', 'method', 'header', 'events', 'todos',
+                 'timezones', 'overrides', 'event', 'todo', 'timezone', 'freebusy')
 
-    def __init__(self, href, etag, data: str):
+    @Metrics.timed('ical.parse.vcalendar')
+    def __init__(self, href, etag, data: str, lazy: bool=False):
         """
         create a VCALENDAR object from a caldav data block
 
         :param data: the full VCALENDAR block as returned from the CalDAV-server (as string)
+        :param lazy: create VEVENT/VTODO components in lazy mode, decoding their properties on first access
 
         parser notes:
             required fields: VERSION, PRODID
             optional fields: CALSCALE, METHOD
-            optional blocks: VEVENT, VTIMEZONE, VFREEBUSY
+            optional blocks: VEVENT, VTODO, VTIMEZONE, VFREEBUSY
+
+        every VEVENT/VTODO in the resource is kept (`events`/`todos`), recurrence overrides are additionally
+        indexed by (UID, RECURRENCE-ID) in `overrides`. `event`/`todo` refer to the recurrence master. identical
+        VTIMEZONE definitions are shared between resources, see VTIMEZONE.shared
         """
 
         self.href = href
         self.etag = etag
 
-        logging.debug('creating VCALENDAR with href="%s", etag="%s" and %s bytes of data' % (href, etag, len(data)))
+        logging.debug('creating VCALENDAR with href="%s", etag="%s" and %s bytes of data', href, etag, len(data))
 
-        data = VOBJECT.clean_vobject_block(data)
+        block = VOBJECT.parse_block(data).unwrap('VCALENDAR')
 
-        try:
-            self.version = re.search(r'^VERSION:(.*?)$', data, re.MULTILINE).group(1)
-        except AttributeError:
+        self.version = block.value('VERSION')
+        if self.version is None:
             raise MalformedVObjectException("Required property VERSION not found")
 
-        try:
-            self.prodid = re.search(r'^PRODID:(.*?)$', data, re.MULTILINE).group(1)
-        except AttributeError:
+        self.prodid = block.value('PRODID')
+        if self.prodid is None:
             raise MalformedVObjectException("Required property PRODID not found")
 
-        try:
-            self.calscale = re.search(r'^CALSCALE:(.*?)$', data, re.MULTILINE).group(1)
-        except AttributeError:
-            self.calscale = None
-
-        try:
-            self.method = re.search(r'^METHOD:(.*?)$', data, re.MULTILINE).group(1)
-        except AttributeError:
-            self.method = None
-
-        try:
-            m = re.search(r'^BEGIN:VEVENT\n(.*?)END:VEVENT$', data, re.MULTILINE+re.DOTALL)
-            if m is not None:
-                self.event = VEVENT(m.group(1))
-                logging.debug('Event added')
-        except MalformedVObjectException:
-            pass
-
-        try:
-            m = re.search(r'BEGIN:VTIMEZONE\n(.*?)END:VTIMEZONE$', data, re.MULTILINE+re.DOTALL)
-            if m is not None:
-                self.timezone = VTIMEZONE(m.group(1))
+        self.calscale = block.value('CALSCALE')
+        self.method = block.value('METHOD')
+
+        # source lines of the calendar's own properties, copied verbatim when serializing. they are usually the
+        # same for all resources of a server
+        lines = sorted((l for ls in block.properties.values() for l in ls), key=lambda l: l.start)
+        self.header = sys.intern(''.join(block.source[l.start:l.end] for l in lines))
+
+        self.events = []        # type: List[VEVENT]
+        self.todos = []         # type: List[VTODO]
+        self.timezones = {}     # type: Dict[str, VTIMEZONE]
+        self.overrides = {}     # type: Dict[Tuple[str, datetime], VOBJECT]
+        self.timezone = None    # type: VTIMEZONE
+        self.freebusy = None    # type: VFREEBUSY
+
+        # timezone definitions first, components resolve their TZIDs against them
+        for sub in block.children:
+            if sub.name == 'VTIMEZONE':
+                try:
+                    tz = VTIMEZONE.shared(sub)
+                except MalformedVObjectException:
+                    continue
+                self.timezones[tz.tzid] = tz
+                if self.timezone is None:
+                    self.timezone = tz
                 logging.debug('Timezone added')
-        except MalformedVObjectException:
-            pass
-
-        try:
-            m = re.search(r'BEGIN:VFREEBUSY\n(.*?)END:VFREEBUSY$', data, re.MULTILINE+re.DOTALL)
-            if m is not None:
-                self.freebusy = VFREEBUSY(m.group(1))
-                logging.debug('FreeBusy added')
-        except MalformedVObjectException:
-            pass
-
-        try:
-            m = re.search(r'BEGIN:VTODO\n(.*?)END:VTODO$', data, re.MULTILINE+re.DOTALL)
-            if m is not None:
-                self.todo = VTODO(m.group(1))
-                logging.debug('Todo added')
-        except MalformedVObjectException:
-            pass
+
+        for sub in block.children:
+            try:
+                if sub.name == 'VEVENT':
+                    self._add_component(self.events, VEVENT(sub, lazy, self.timezones))
+                    logging.debug('Event added')
+                elif sub.name == 'VTODO':
+                    self._add_component(self.todos, VTODO(sub, lazy, self.timezones))
+                    logging.debug('Todo added')
+                elif sub.name == 'VFREEBUSY' and self.freebusy is None:
+                    self.freebusy = VFREEBUSY(sub)
+                    logging.debug('FreeBusy added')
+            except MalformedVObjectException:
+                pass
+
+        self.event = self._master(self.events)    # type: VEVENT
+        self.todo = self._master(self.todos)      # type: VTODO
+
+        if Metrics.enabled:
+            Metrics.count('ical.parse.bytes', len(data))
+            Metrics.count('ical.components.vevent', len(self.events))
+            Metrics.count('ical.components.vtodo', len(self.todos))
+
+    def _add_component(self, components: list, component):
+        """ append a VEVENT/VTODO and index it by (UID, RECURRENCE-ID) if it overrides a recurrence instance """
+        components.append(component)
+        if component.recurrence_id is not None:
+            self.overrides[(component.uid, component.recurrence_id)] = component
+
+    @staticmethod
+    def _master(components: list):
+        """ the first component that is not a recurrence override, or the first component if there are only
+        overrides (a resource may contain just the exceptions of a series the user was invited to) """
+        for c in components:
+            if c.recurrence_id is None:
+                return c
+        return components[0] if components else None
+
+    def get_override(self, uid: str, recurrence_id: datetime):
+        """ return the VEVENT/VTODO overriding the recurrence instance `recurrence_id` of series `uid` or None """
+        return self.overrides.get((uid, recurrence_id))
 
     def __str__(self):
         return '<VCALENDAR(%s;%s)>' % (self.etag, self.href)
 
+    @Metrics.timed('ical.query.instances')
+    def instances(self, start: datetime, end: datetime) -> List[Tuple[datetime, datetime, VOBJECT]]:
+        """ (start, end, component) of every event/todo instance overlapping the period start to end
+
+        recurring events are expanded, instances replaced by a RECURRENCE-ID override are skipped in favour of
+        the override component.
+        """
+        result = []
+
+        for c in self.events + self.todos:
+            c_start = c.start()
+            if c_start is None:
+                continue
+
+            if isinstance(c, VEVENT) and c.recurrence_id is None and c.recurring():
+                duration = timedelta(seconds=c.get_duration())
+                for o in c.occurrences(start - duration, end):
+                    if (c.uid, o) not in self.overrides and o + duration >= start:
+                        result.append((o, o + duration, c))
+            else:
+                c_end = c.end()
+                if c_start <= end and c_end >= start:
+                    result.append((c_start, c_end, c))
+
+        return result
+
     def is_on(self, start: datetime, end: datetime=None, duration: timedelta=None):
-        logging.debug('testing etag %s for %s/%s/%s' % (self.etag, start, end, duration))
+        logging.debug('testing etag %s for %s/%s/%s', self.etag, start, end, duration)
         if end is None:
             if duration is None:
                 end = start
@@ -107,34 +162,39 @@ class VCALENDAR (VOBJECT):
         #               aStart      aEnd
         #
         #  a timeperiod 'a' overlaps a time period 'b' if (aStart <= bEnd) and (aEnd >= bStart) as seen above.
+        #  the test is done on day granularity, i.e. from the start of the first to the end of the last day.
         #
-        res_event = (self.event is not None) and (self.event.start().date() <= end.date()) and \
-                    (self.event.end().date() >= start.date())
-        res_todo = (self.todo is not None) and (self.todo.start().date() <= end.date()) and \
-                    (self.todo.end().date() >= start.date())
+        return len(self.instances(datetime.combine(start.date(), time.min),
+                                  datetime.combine(end.date(), time.max))) > 0
 
-        return res_event or res_todo
+    def _localize(self, dt: datetime) -> datetime:
+        if self.timezone is None:
+            tz = get_localzone()
+            return tz.fromutc(dt.replace(tzinfo=tz))
+        return self.timezone.localize(dt)
 
     def next_date(self):
-        # TODO: make this do something useful
+        """ localized start of the next instance of the event starting today or later, None if there is none """
 
         if self.event is None:
             return None
 
-        if not self.event.recurring():
-            dt = None
-            if self.timezone is None:
-                dt = get_localzone().fromutc(self.event.dtstart)
-            else:
-                dt = self.timezone.localize(self.event.dtstart)
+        today = datetime.combine(datetime.today().date(), time.min)
 
-            if dt.date() >= datetime.today().date():
-                return dt
-            else:
-                return None
+        if self.event.recurring():
+            dt = self.event.next_occurrence(today - timedelta(microseconds=1))
+            while dt is not None and (self.event.uid, dt) in self.overrides:
+                dt = self.event.next_occurrence(dt)
+            return None if dt is None else self._localize(dt)
+
+        dt = self._localize(self.event.dtstart)
+        if dt.date() >= today.date():
+            return dt
+        else:
+            return None
 
     def pretty_print(self):
-        if self.event is not None:
-            self.event.pretty_print()
-        if self.todo is not None:
-            self.todo.pretty_print()
\ No newline at end of file
+        for e in self.events:
+            e.pretty_print()
+        for t in self.todos:
+            t.pretty_print()
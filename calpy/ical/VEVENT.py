@@ -1,21 +1,43 @@
 import re
 import logging
 from datetime import timedelta, datetime
+from typing import Dict, List
 
-from .VOBJECT import VOBJECT
+from .VOBJECT import VOBJECT, ContentBlock, LazyProperty, MalformedVObjectException
+from .RRULE import RRULE, expand
+from .VTIMEZONE import VTIMEZONE
 
 
 class VEVENT (VOBJECT):
-    dtstart = None      # type: datetime
-    dtend = None        # type: datetime
-    duration = None     # type: int
-    rawdata = None      # type: str
+    uid = LazyProperty('UID')                                               # type: str
+    recurrence_id = LazyProperty('RECURRENCE-ID', VOBJECT.parse_datetime,
+                                 encode=VOBJECT.encode_datetime)            # type: datetime
+    description = LazyProperty('DESCRIPTION')                               # type: str
+    summary = LazyProperty('SUMMARY')                                       # type: str
+    dtstart = LazyProperty('DTSTART', VOBJECT.floating_datetime, encode=VOBJECT.encode_datetime,
+                           derive='dtstart_tz')                             # type: datetime
+    dtend = LazyProperty('DTEND', VOBJECT.floating_datetime, encode=VOBJECT.encode_datetime,
+                         derive='dtend_tz')                                 # type: datetime
+    dtstart_tz = LazyProperty('DTSTART', VOBJECT.decode_property_datetime, params=True,
+                              encode=VOBJECT.encode_datetime)               # type: datetime
+    dtend_tz = LazyProperty('DTEND', VOBJECT.decode_property_datetime, params=True,
+                            encode=VOBJECT.encode_datetime)                 # type: datetime
+    duration = LazyProperty('DURATION')                                     # type: str
+    rrules = LazyProperty('RRULE', multi=True)                              # type: List[str]
+    rdates = LazyProperty('RDATE', multi=True)                              # type: List[str]
+    exdates = LazyProperty('EXDATE', multi=True)                            # type: List[str]
+    rdates_tz = LazyProperty('RDATE', VOBJECT.decode_property_datetime_list, multi=True, params=True,
+                             encode=VOBJECT.encode_datetime_list)           # type: List[list]
+    exdates_tz = LazyProperty('EXDATE', VOBJECT.decode_property_datetime_list, multi=True, params=True,
+                              encode=VOBJECT.encode_datetime_list)          # type: List[list]
+
+    __slots__ = ('timezones',) + LazyProperty.slots(vars())
 
     def start(self):
         """ event start timestamp """
 
         if self.dtstart is None:
-            logging.warning('DTSTART is None, dumping raw data: %s' % self.rawdata)
+            logging.warning('DTSTART is None for event %s', self.uid)
         return self.dtstart
 
     def end(self):
@@ -26,9 +48,13 @@ class VEVENT (VOBJECT):
         elif self.duration is not None:
             return self.dtstart + timedelta(seconds=self.get_duration())
         else:
-            logging.warning('no DTEND or DURATION present, returning DTSTART instead. raw dump: %s ' % self.rawdata)
+            logging.debug('no DTEND or DURATION present for event %s, returning DTSTART instead', self.uid)
             return self.dtstart
 
+    def all_day(self):
+        """ whether DTSTART is a DATE value (as opposed to DATE-TIME) """
+        return self.dtstart_tz is not None and not isinstance(self.dtstart_tz, datetime)
+
     def get_duration(self):
         """
         returns event duration in seconds
@@ -61,40 +87,23 @@ class VEVENT (VOBJECT):
             except TypeError:
                 return 0
 
-    def __init__(self, data: str):
-        logging.debug('creating event from %s bytes of data' % len(data))
-
-        self.rawdata = data
-        data = VOBJECT.clean_vobject_block(data)
-
-        try:
-            self.description = re.search(r'^DESCRIPTION:(.*?)$', data, re.MULTILINE).group(1)
-        except AttributeError:
-            self.description = None
-
-        try:
-            self.summary = re.search(r'^SUMMARY:(.*?)$', data, re.MULTILINE).group(1)
-        except AttributeError:
-            self.summary = None
-
-        try:
-            self.dtstart = self.parse_datetime(re.search(r'^DTSTART.*:(.*?)$', data, re.MULTILINE).group(1))
-        except AttributeError:
-            self.dtstart = None
+    def __init__(self, data, lazy: bool=False, timezones: Dict[str, VTIMEZONE]=None):
+        """
+        create a VEVENT object from a caldav data block
 
-        try:
-            self.dtend = self.parse_datetime(re.search(r'^DTEND.*:(.*?)$', data, re.MULTILINE).group(1))
-        except AttributeError:
-            self.dtend = None
+        :param data: the VEVENT block (as string) or an already tokenized ContentBlock
+        :param lazy: keep the tokenized block and decode properties on first access instead of up front
+        :param timezones: VTIMEZONE definitions (by TZID) of the enclosing VCALENDAR, used by dtstart_tz/dtend_tz
+        """
+        self.timezones = timezones
+        if isinstance(data, ContentBlock):
+            block = data
+        else:
+            block = VOBJECT.parse_block(data).unwrap('VEVENT')
 
-        try:
-            self.duration = re.search(r'^DURATION:(.*?)$', data, re.MULTILINE).group(1)
-        except AttributeError:
-            self.duration = None
+        logging.debug('creating event from %s bytes of data', block.end - block.start)
 
-        self.rrules = []
-        for i in re.finditer(r'^RRULE:(.*?)$', data, re.MULTILINE):
-            self.rrules.append(i.group(1))
+        self._init_block(block, lazy)
 
         """
             ; the following are optional,
@@ -120,7 +129,75 @@ class VEVENT (VOBJECT):
         """
 
     def recurring(self):
-        return len(self.rrules) > 0
+        return len(self.rrules) > 0 or len(self.rdates) > 0
+
+    def _wall_clock(self, values: List[list]) -> List[datetime]:
+        """ decoded RDATE/EXDATE values as wall-clock times in the zone of DTSTART, comparable to dtstart """
+        tz = getattr(self.dtstart_tz, 'tzinfo', None)
+        result = []
+        for line in values:
+            for v in line:
+                if not isinstance(v, datetime):
+                    result.append(datetime(v.year, v.month, v.day))
+                elif v.tzinfo is not None and tz is not None:
+                    result.append(v.astimezone(tz).replace(tzinfo=None))
+                else:
+                    result.append(v.replace(tzinfo=None))
+        return result
+
+    def occurrences(self, start: datetime, end: datetime) -> List[datetime]:
+        """ start timestamps of all instances of this event starting between start and end (inclusive)
+
+        the recurrence set is DTSTART plus all RRULE and RDATE instances minus EXDATE instances. RRULE expansions
+        are memoized per (rule, dtstart, window), see RRULE.expand
+        """
+        if self.dtstart is None:
+            return []
+
+        result = set()
+        if start <= self.dtstart <= end:
+            result.add(self.dtstart)
+
+        for rule in self.rrules:
+            try:
+                result.update(expand(rule, self.dtstart, start, end))
+            except MalformedVObjectException:
+                logging.exception('skipping malformed RRULE of event %s', self.uid)
+
+        result.update(d for d in self._wall_clock(self.rdates_tz) if start <= d <= end)
+        result.difference_update(self._wall_clock(self.exdates_tz))
+
+        return sorted(result)
+
+    def next_occurrence(self, after: datetime) -> datetime:
+        """ start timestamp of the first instance strictly after `after` or None """
+        if self.dtstart is None:
+            return None
+
+        exdates = set(self._wall_clock(self.exdates_tz))
+        rdates = self._wall_clock(self.rdates_tz)
+        rules = []
+        for rule in self.rrules:
+            try:
+                rules.append(RRULE.parse(rule))
+            except MalformedVObjectException:
+                logging.exception('skipping malformed RRULE of event %s', self.uid)
+
+        while True:
+            candidates = [d for d in rdates if d > after]
+            if self.dtstart > after:
+                candidates.append(self.dtstart)
+            for rule in rules:
+                o = rule.after(self.dtstart, after)
+                if o is not None:
+                    candidates.append(o)
+
+            if not candidates:
+                return None
+
+            after = min(candidates)
+            if after not in exdates:
+                return after
 
     def __str__(self):
         return '<VEVENT(%s;%s)>' % (self.dtstart, self.summary)
@@ -1,11 +1,17 @@
 import re
-from .VOBJECT import VOBJECT, MalformedVObjectException
+from .VOBJECT import VOBJECT, ContentBlock, MalformedVObjectException
 
 
 class VFREEBUSY (VOBJECT):
     properties = {'CONTACT': False, 'DTSTART': False, 'DTEND': False, 'DURATION': False, 'DTSTAMP': False,
                   'ORGANIZER': False, 'UID': False, 'URL': False, 'ATTENDEE': False, 'COMMENT': False, 'RSTATUS': False,
                   'FREEBUSY': False, 'X-PROP': False}
+    __slots__ = ()
 
-    def __init__(self, obj : str):
-        pass
\ No newline at end of file
+    # not parsed yet, the source is the only serialization and kept as is (see VOBJECT.source_retention)
+    source_retention = 'text'
+
+    def __init__(self, obj):
+        self._block = None
+        self._source = self._retain(obj.raw() if isinstance(obj, ContentBlock) else obj)
+        self._dirty = None
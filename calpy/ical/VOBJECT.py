@@ -1,13 +1,284 @@
-from datetime import datetime
+from collections import namedtuple
+from datetime import datetime, timezone, tzinfo
+from functools import lru_cache
+from typing import Dict, Iterator, List, Tuple
 import re
 import logging
+import sys
+import zlib
+
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:
+    ZoneInfo = None
+
+
+# number of distinct date/time literals memoized by VOBJECT.parse_datetime
+DATETIME_CACHE_SIZE = 4096
+
+# parameters and properties whose values come from a small vocabulary repeating across all components of an
+# account. the tokenizer interns them (like all property and parameter names), so every loaded component refers
+# to the same string objects instead of holding copies of its own
+INTERNED_PARAMETERS = frozenset(('TZID', 'VALUE', 'CUTYPE', 'ROLE', 'PARTSTAT', 'RSVP', 'RELATED', 'RANGE',
+                                 'RELTYPE', 'FBTYPE', 'ENCODING', 'LANGUAGE'))
+INTERNED_PROPERTIES = frozenset(('VERSION', 'PRODID', 'CALSCALE', 'METHOD', 'STATUS', 'CLASS', 'TRANSP',
+                                 'CATEGORIES', 'PRIORITY', 'DURATION', 'RRULE', 'ACTION', 'TZID', 'TZOFFSETFROM',
+                                 'TZOFFSETTO', 'TZNAME'))
+
+_intern = sys.intern
 
 
 class MalformedVObjectException(Exception):
     pass
 
 
+@lru_cache(maxsize=256)
+def _zoneinfo(key: str) -> tzinfo:
+    if ZoneInfo is None:
+        return None
+    try:
+        return ZoneInfo(key)
+    except (ValueError, LookupError, OSError):
+        logging.warning('unknown TZID %s, treating values as floating time', key)
+        return None
+
+
+# a single unfolded rfc5545 content line
+#   name    upper-cased property name
+#   params  dict of upper-cased parameter names to (unquoted) parameter values
+#   value   raw property value (no unescaping applied)
+#   start   offset of the first character of the (folded) line in the source text
+#   end     offset right behind the line terminator of the last folded line in the source text
+ContentLine = namedtuple('ContentLine', ['name', 'params', 'value', 'start', 'end'])
+
+
+class ContentBlock(object):
+    """ a tokenized BEGIN/END block: its properties and nested sub-blocks
+
+    properties are stored in a dict mapping the property name to the list of content lines carrying that name
+    (in source order), so looking up a property is a single dict access instead of a scan over the block.
+    """
+
+    def __init__(self, name: str=None, source: str='', start: int=0):
+        self.name = name
+        self.source = source
+        self.start = start
+        self.end = len(source)
+        self.properties = {}    # type: Dict[str, List[ContentLine]]
+        self.children = []      # type: List[ContentBlock]
+
+    def __str__(self):
+        return '<ContentBlock(%s)>' % self.name
+
+    def line(self, name: str) -> ContentLine:
+        """ first content line for the given property name or None """
+        lines = self.properties.get(name)
+        return lines[0] if lines else None
+
+    def value(self, name: str, default=None) -> str:
+        """ value of the first occurrence of the given property or default if not present """
+        lines = self.properties.get(name)
+        return lines[0].value if lines else default
+
+    def values(self, name: str) -> List[str]:
+        """ values of all occurrences of the given property """
+        return [l.value for l in self.properties.get(name, ())]
+
+    def blocks(self, name: str) -> List['ContentBlock']:
+        """ all direct sub-blocks with the given component name """
+        return [c for c in self.children if c.name == name]
+
+    def unwrap(self, name: str) -> 'ContentBlock':
+        """ return the single `name` sub-block if this is an anonymous wrapper around it, self otherwise
+
+        allows component constructors to accept both the inner property lines of a component and the full
+        BEGIN:<name> ... END:<name> block
+        """
+        if self.name is None and not self.properties and len(self.children) == 1 \
+                and self.children[0].name == name:
+            return self.children[0]
+        return self
+
+    def raw(self) -> str:
+        """ source text of this block """
+        return self.source[self.start:self.end]
+
+
+class LazyProperty(object):
+    """ descriptor decoding a component property from its ContentBlock on first access
+
+    the component keeps its tokenized block in `_block`, the decoded value is memoized in a slot of the component
+    named like the attribute with a leading underscore (see slots) and thereby lives exactly as long as the
+    component. assigning to the attribute overrides the decoded value and marks the attribute as modified
+    (`_dirty`), so serializers know which lines to re-encode.
+
+    :param name: property name to decode
+    :param decode: callable converting the raw property value, applied only if the property is present
+    :param multi: decode all occurrences of the property into a list instead of only the first one
+    :param params: call decode as decode(component, value, params) to give it access to the property parameters
+    :param encode: callable(value, params) returning the (params, raw value) to serialize a decoded value with,
+                   values are written unchanged if not given
+    :param derive: attribute of another LazyProperty of the same property, decode is applied to its (non-None)
+                   value instead of decoding the property a second time
+    """
+
+    def __init__(self, name: str, decode=None, multi: bool=False, params: bool=False, encode=None,
+                 derive: str=None):
+        self.name = name
+        self.decode = decode
+        self.multi = multi
+        self.params = params
+        self.encode = encode
+        self.derive = derive
+        self.attr = None
+        self.slot = None
+
+    def __set_name__(self, owner, attr):
+        self.attr = attr
+        self.slot = '_' + attr
+
+    @staticmethod
+    def slots(namespace: dict) -> Tuple[str, ...]:
+        """ memo slots of the LazyProperty attributes in a class body, declare them as
+        `__slots__ = (...) + LazyProperty.slots(vars())` """
+        return tuple('_' + attr for attr, value in namespace.items() if isinstance(value, LazyProperty))
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+
+        try:
+            return getattr(obj, self.slot)
+        except AttributeError:
+            pass
+
+        value = self.load(getattr(obj, '_block', None), obj)
+        setattr(obj, self.slot, value)
+        return value
+
+    def __set__(self, obj, value):
+        setattr(obj, self.slot, value)
+        dirty = getattr(obj, '_dirty', None)
+        if dirty is None:
+            obj._dirty = {self.attr}
+        else:
+            dirty.add(self.attr)
+
+    def load(self, block: ContentBlock, obj=None):
+        """ decode the property value from the given block """
+        if self.derive is not None:
+            value = getattr(obj, self.derive)
+            return None if value is None else self.decode(value)
+
+        if self.multi:
+            if block is None:
+                return []
+            if self.decode is None:
+                return block.values(self.name)
+            if self.params:
+                return [self.decode(obj, l.value, l.params) for l in block.properties.get(self.name, ())]
+            return [self.decode(v) for v in block.values(self.name)]
+
+        if block is None:
+            return None
+
+        line = block.line(self.name)
+        if line is None or self.decode is None:
+            return None if line is None else line.value
+        if self.params:
+            return self.decode(obj, line.value, line.params)
+        return self.decode(line.value)
+
+
+# LazyProperty attributes by component class, see VOBJECT.lazy_properties
+_LAZY_PROPERTIES = {}   # type: Dict[type, List[Tuple[str, LazyProperty]]]
+
+
 class VOBJECT:
+    """ base of all components
+
+    components are slotted, an instance holds its decoded property values and the following state only:
+
+        _block    the tokenized source, retained by lazy components only
+        _source   the source text of an eagerly decoded component as kept by source_retention
+        _dirty    names of the attributes assigned to since parsing, None if there are none
+    """
+    __slots__ = ('_block', '_source', '_dirty')
+
+    # what eagerly decoded components keep of their source text to serialize it (see Writer.write_component):
+    #   'compressed'  zlib compressed, decompressed whenever the source is needed
+    #   'text'        a plain copy, the fastest to serialize but the largest to keep around
+    #   None          nothing, serializing writes the decoded properties only and drops all others
+    # lazy components always keep their block
+    source_retention = 'compressed'
+
+    def _init_block(self, block: ContentBlock, lazy: bool):
+        """ attach the tokenized block and decode all LazyProperty attributes unless lazy is set
+
+        eagerly materialized components drop the block afterwards, keeping only the decoded values and their
+        source text as given by source_retention
+        """
+        self._dirty = None
+
+        if lazy:
+            self._block = block
+            self._source = None
+            return
+
+        # derived properties last, their source values are memoized by then
+        props = self.lazy_properties()
+        for _, prop in props:
+            if prop.derive is None:
+                setattr(self, prop.slot, prop.load(block, self))
+        for _, prop in props:
+            if prop.derive is not None:
+                setattr(self, prop.slot, prop.load(block, self))
+        self._block = None
+        self._source = self._retain(block.raw())
+
+    def _retain(self, text: str):
+        retention = self.source_retention
+        if not text or retention is None:
+            return None
+        if retention == 'compressed':
+            # the fastest level, higher ones hardly shrink component sized texts any further
+            return zlib.compress(text.encode('utf-8'), 1)
+        return text
+
+    @property
+    def rawdata(self) -> str:
+        """ source text of this component, None if it was not retained """
+        block = self._block
+        if block is not None:
+            return block.raw()
+        source = self._source
+        if isinstance(source, bytes):
+            return zlib.decompress(source).decode('utf-8')
+        return source
+
+    @classmethod
+    def lazy_properties(cls) -> List[Tuple[str, LazyProperty]]:
+        """ (attribute name, descriptor) of all LazyProperty attributes of the component class """
+        result = _LAZY_PROPERTIES.get(cls)
+        if result is None:
+            result = []
+            for klass in cls.__mro__:
+                for attr, prop in klass.__dict__.items():
+                    if isinstance(prop, LazyProperty):
+                        result.append((attr, prop))
+            _LAZY_PROPERTIES[cls] = result
+        return result
+
+    def source_block(self) -> ContentBlock:
+        """ tokenized source of this component: the retained block in lazy mode, re-tokenized rawdata otherwise """
+        block = getattr(self, '_block', None)
+        if block is None:
+            rawdata = self.rawdata
+            if rawdata:
+                block = VOBJECT.parse_block(rawdata).unwrap(type(self).__name__)
+        return block
+
     @staticmethod
     def clean_vobject_block(value: str):
         """ remove CRs and capitalize keywords """
@@ -26,18 +297,300 @@ class VOBJECT:
                     lines.append(i[:idx].upper()+i[idx:])  # FIXME this is probably bad because multiline text fields
             except ValueError:
                 pass    # lines without colon are ignored
-        logging.debug('parsed %s lines' % len(lines))
+        logging.debug('parsed %s lines', len(lines))
         return '\n'.join(lines)
 
     @staticmethod
+    def split_content_line(line: str, start: int=0, end: int=0) -> ContentLine:
+        """ split an unfolded content line into name, parameters and value
+
+        returns None for lines without a name/value separator. names and the values listed in
+        INTERNED_PARAMETERS/INTERNED_PROPERTIES are interned.
+        """
+        colon = line.find(':')
+        if colon == -1:
+            return None
+
+        semi = line.find(';', 0, colon)
+        if semi == -1:
+            name = _intern(line[:colon].upper())
+            value = line[colon + 1:]
+            return ContentLine(name, {}, _intern(value) if name in INTERNED_PROPERTIES else value, start, end)
+
+        name = _intern(line[:semi].upper())
+        params = {}
+
+        if '"' not in line[semi:colon]:
+            for param in line[semi + 1:colon].split(';'):
+                key, _, val = param.partition('=')
+                key = _intern(key.upper())
+                params[key] = _intern(val) if key in INTERNED_PARAMETERS else val
+            value = line[colon + 1:]
+            return ContentLine(name, params, _intern(value) if name in INTERNED_PROPERTIES else value, start, end)
+
+        # quoted parameter values may contain ';' and ':', walk the parameter section char by char
+        pos = semi + 1
+        length = len(line)
+        while pos < length:
+            eq = line.find('=', pos)
+            if eq == -1:
+                return None
+            key = _intern(line[pos:eq].upper())
+            pos = eq + 1
+            parts = []
+            while pos < length:
+                if line[pos] == '"':
+                    close = line.find('"', pos + 1)
+                    if close == -1:
+                        return None
+                    parts.append(line[pos + 1:close])
+                    pos = close + 1
+                else:
+                    stop = pos
+                    while stop < length and line[stop] not in ';:,"':
+                        stop += 1
+                    parts.append(line[pos:stop])
+                    pos = stop
+                if pos < length and line[pos] == ',':
+                    parts.append(',')
+                    pos += 1
+                    continue
+                break
+            val = ''.join(parts)
+            params[key] = _intern(val) if key in INTERNED_PARAMETERS else val
+            if pos >= length:
+                return None
+            if line[pos] == ':':
+                value = line[pos + 1:]
+                return ContentLine(name, params, _intern(value) if name in INTERNED_PROPERTIES else value, start,
+                                   end)
+            pos += 1    # skip ';'
+
+        return None
+
+    @staticmethod
+    def tokenize(value: str) -> Iterator[ContentLine]:
+        """ walk an rfc5545 text block once and yield its content lines
+
+        continuation lines (starting with a space or tab) are unfolded into the preceding line, CRs (either literal
+        or as XML entity) are dropped, names are upper-cased. lines without a colon are ignored.
+        """
+        pos = 0
+        length = len(value)
+        parts = None
+        start = 0
+
+        while pos < length:
+            nl = value.find('\n', pos)
+            if nl == -1:
+                nl = length
+            line = value[pos:nl]
+            if line.endswith('\r'):
+                line = line[:-1]
+            elif line.endswith('&#13;'):
+                line = line[:-5]
+
+            if line[:1] in (' ', '\t') and parts is not None:
+                parts.append(line[1:])
+            else:
+                if parts is not None:
+                    cl = VOBJECT.split_content_line(parts[0] if len(parts) == 1 else ''.join(parts), start, pos)
+                    if cl is not None:
+                        yield cl
+                if line:
+                    parts = [line]
+                    start = pos
+                else:
+                    parts = None
+
+            pos = nl + 1
+
+        if parts is not None:
+            cl = VOBJECT.split_content_line(parts[0] if len(parts) == 1 else ''.join(parts), start, length)
+            if cl is not None:
+                yield cl
+
+    @staticmethod
+    def parse_block(value: str) -> ContentBlock:
+        """ tokenize a text block in a single pass and return its tree of ContentBlocks
+
+        the returned root block is anonymous (name None), top-level BEGIN/END blocks become its children
+        """
+        root = ContentBlock(None, value, 0)
+        stack = [root]
+        current = root
+
+        for cl in VOBJECT.tokenize(value):
+            name = cl.name
+            if name == 'BEGIN':
+                block = ContentBlock(cl.value.strip().upper(), value, cl.start)
+                current.children.append(block)
+                stack.append(block)
+                current = block
+            elif name == 'END':
+                if len(stack) > 1:
+                    if current.name != cl.value.strip().upper():
+                        logging.warning('END:%s does not match BEGIN:%s', cl.value, current.name)
+                    current.end = cl.end
+                    stack.pop()
+                    current = stack[-1]
+            else:
+                lines = current.properties.get(name)
+                if lines is None:
+                    current.properties[name] = [cl]
+                else:
+                    lines.append(cl)
+
+        return root
+
+    @staticmethod
+    @lru_cache(maxsize=DATETIME_CACHE_SIZE)
     def parse_datetime(value: str):
-        """ parse rfc2445 date/time value and return datetime.datetime """
-        logging.debug('input value: %s' % value)
+        """ parse rfc2445 date/time value and return datetime.datetime
 
-        if 'T' in value:
-            try:
-                return datetime.strptime(value, "%Y%m%dT%H%M%S")
-            except ValueError:
-                return datetime.strptime(value, "%Y%m%dT%H%M%SZ")
-        else:
-            return datetime.strptime(value, "%Y%m%d")
\ No newline at end of file
+        the fixed width DATE (YYYYMMDD) and DATE-TIME (YYYYMMDDTHHMMSS[Z]) forms are sliced directly instead of
+        going through strptime. results are memoized in a bounded cache since the same literals (e.g. all-day
+        dates, DTSTAMPs) tend to repeat a lot.
+        """
+        length = len(value)
+        try:
+            if length == 8 and value.isdigit():
+                return datetime(int(value[0:4]), int(value[4:6]), int(value[6:8]))
+
+            if (length == 15 or length == 16 and value[15] == 'Z') and value[8] == 'T' and \
+                    value[0:8].isdigit() and value[9:15].isdigit():
+                return datetime(int(value[0:4]), int(value[4:6]), int(value[6:8]),
+                                int(value[9:11]), int(value[11:13]), int(value[13:15]))
+        except ValueError:
+            pass    # out of range values, e.g. month 13
+
+        raise ValueError('invalid rfc2445 date/time value "%s"' % value)
+
+    @staticmethod
+    def decode_datetime(value: str, params: dict=None, timezones: dict=None):
+        """ decode a DATE or DATE-TIME property value honouring its VALUE and TZID parameters
+
+        :param value: raw property value
+        :param params: property parameters as returned by the tokenizer
+        :param timezones: dict of TZID to VTIMEZONE definitions of the enclosing VCALENDAR
+        :return: datetime.date for DATE values, a datetime in UTC for UTC values, a datetime aware of the TZID's
+                 timezone (defined by `timezones` or, as fallback, the system's tz database) for TZID values and a
+                 naive (floating) datetime otherwise
+        """
+        if params and params.get('VALUE') == 'DATE' or len(value) == 8:
+            return VOBJECT.parse_datetime(value).date()
+
+        dt = VOBJECT.parse_datetime(value)
+        if value[-1] == 'Z':
+            return dt.replace(tzinfo=timezone.utc)
+
+        tzid = params.get('TZID') if params else None
+        if tzid is not None:
+            tz = VOBJECT.resolve_tzid(tzid, timezones)
+            if tz is not None:
+                return dt.replace(tzinfo=tz)
+
+        return dt
+
+    @staticmethod
+    def decode_datetimes(values: List[str], params: dict=None, timezones: dict=None) -> list:
+        """ decode a batch of DATE/DATE-TIME values sharing the same parameters, see decode_datetime """
+        if params and params.get('VALUE') == 'DATE':
+            return [VOBJECT.parse_datetime(v).date() for v in values]
+
+        tz = None
+        tzid = params.get('TZID') if params else None
+        if tzid is not None:
+            tz = VOBJECT.resolve_tzid(tzid, timezones)
+
+        parse = VOBJECT.parse_datetime
+        result = []
+        for v in values:
+            if len(v) == 8:
+                result.append(parse(v).date())
+            elif v[-1] == 'Z':
+                result.append(parse(v).replace(tzinfo=timezone.utc))
+            elif tz is not None:
+                result.append(parse(v).replace(tzinfo=tz))
+            else:
+                result.append(parse(v))
+        return result
+
+    @staticmethod
+    def resolve_tzid(tzid: str, timezones: dict=None) -> tzinfo:
+        """ tzinfo for a TZID parameter: the VTIMEZONE definition if given, else the system tz database or None """
+        if timezones:
+            vtimezone = timezones.get(tzid)
+            if vtimezone is not None:
+                return vtimezone.tzinfo()
+        return _zoneinfo(tzid.lstrip('/'))
+
+    @staticmethod
+    def floating_datetime(value) -> datetime:
+        """ wall-clock datetime of a decoded DATE/DATE-TIME value, as parse_datetime returns it for the raw value """
+        if isinstance(value, datetime):
+            return value.replace(tzinfo=None)
+        return datetime(value.year, value.month, value.day)
+
+    def decode_property_datetime(self, value: str, params: dict):
+        """ LazyProperty decoder resolving TZIDs against the timezones of the component's VCALENDAR """
+        return VOBJECT.decode_datetime(value, params, getattr(self, 'timezones', None))
+
+    def decode_property_datetime_list(self, value: str, params: dict) -> list:
+        """ LazyProperty decoder of a comma separated RDATE/EXDATE value honouring its parameters like
+        decode_property_datetime, PERIOD values are reduced to their start timestamp """
+        values = [item.partition('/')[0].strip() for item in value.split(',')]
+        return VOBJECT.decode_datetimes([v for v in values if v], params, getattr(self, 'timezones', None))
+
+    @staticmethod
+    def encode_datetime_list(values: list, params: dict=None) -> Tuple[dict, str]:
+        """ encode dates/datetimes as one comma separated value (inverse of decode_property_datetime_list) """
+        params = dict(params) if params else {}
+        if params.get('VALUE') == 'PERIOD':
+            del params['VALUE']
+        encoded = [VOBJECT.encode_datetime(v, params) for v in values]
+        return encoded[0][0] if encoded else params, ','.join(raw for _, raw in encoded)
+
+    @staticmethod
+    def parse_datetime_list(values: List[str]) -> List[datetime]:
+        """ parse the comma separated date/time lists of one or more RDATE/EXDATE values
+
+        PERIOD values are reduced to their start timestamp
+        """
+        result = []
+        for value in values:
+            for item in value.split(','):
+                item = item.partition('/')[0].strip()
+                if item:
+                    result.append(VOBJECT.parse_datetime(item))
+        return result
+
+    @staticmethod
+    def encode_datetime(value, params: dict=None) -> Tuple[dict, str]:
+        """ encode a date/datetime as rfc5545 value, adjusting VALUE/TZID parameters (inverse of decode_datetime)
+
+        naive datetimes are written as wall-clock time keeping an existing TZID, aware datetimes carry their zone's
+        TZID if it has one (zoneinfo keys, VTIMEZONE definitions) and are converted to UTC otherwise
+        """
+        params = dict(params) if params else {}
+
+        if not isinstance(value, datetime):
+            params['VALUE'] = 'DATE'
+            params.pop('TZID', None)
+            return params, '%04d%02d%02d' % (value.year, value.month, value.day)
+
+        if params.get('VALUE') == 'DATE':
+            return params, '%04d%02d%02d' % (value.year, value.month, value.day)
+
+        suffix = ''
+        if value.tzinfo is not None:
+            tzid = getattr(value.tzinfo, 'key', None)
+            if tzid is not None:
+                params['TZID'] = tzid
+            else:
+                params.pop('TZID', None)
+                value = value.astimezone(timezone.utc)
+                suffix = 'Z'
+
+        return params, '%04d%02d%02dT%02d%02d%02d%s' % (value.year, value.month, value.day, value.hour,
+                                                         value.minute, value.second, suffix)
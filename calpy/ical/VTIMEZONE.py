@@ -1,24 +1,79 @@
 import logging
 import re
-from datetime import datetime, timedelta
-from typing import List
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta, tzinfo
+from functools import lru_cache
+from typing import Dict, List, Tuple
 
-from .VOBJECT import VOBJECT, MalformedVObjectException
+from .VOBJECT import VOBJECT, ContentBlock, MalformedVObjectException
+from .RRULE import RRULE
+
+
+# distinct definitions kept by VTIMEZONE.shared, the least recently used one is dropped beyond that
+SHARED_TIMEZONES = 256
+
+_shared = OrderedDict()     # type: Dict[Tuple[type, str, Tuple[int, int]], VTIMEZONE]
+
+
+class VTIMEZONEInfo(tzinfo):
+    """ datetime.tzinfo backed by the transition table of a VTIMEZONE """
+
+    def __init__(self, vtimezone: 'VTIMEZONE'):
+        self.vtimezone = vtimezone
+
+    def __repr__(self):
+        return '<VTIMEZONEInfo(%s)>' % self.vtimezone.tzid
+
+    def __getinitargs__(self):
+        # used by tzinfo.__reduce__, keeps instances (and aware datetimes) picklable
+        return self.vtimezone,
+
+    @property
+    def key(self):
+        """ TZID, named like zoneinfo.ZoneInfo.key """
+        return self.vtimezone.tzid
+
+    def utcoffset(self, dt):
+        if dt is None:
+            return None
+        local = dt.replace(tzinfo=None)
+        return self.vtimezone.utcoffset(local - self.vtimezone.utcoffset(local))
+
+    def dst(self, dt):
+        return None
+
+    def tzname(self, dt):
+        return self.vtimezone.tzid
+
+    def fromutc(self, dt):
+        utc = dt.replace(tzinfo=None)
+        return (utc + self.vtimezone.utcoffset(utc)).replace(tzinfo=self)
 
 
 class VTIMEZONE (VOBJECT):
     """ wrapper class for rfc2445 VTIMEZONE data
 
     provides parsing, pythonic data accessors and a few helper functions regarding VTIMEZONE data
+
+    the STANDARD/DAYLIGHT observances are compiled into a sorted table of UTC transition instants and the UTC
+    offsets taking effect at them, covering the years given by `years`. localizing a timestamp is a bisect
+    lookup in that table. tables are shared between all VTIMEZONE objects with identical observances.
     """
+    __slots__ = ('tzid', '_years', '_times', '_transitions', '_offsets', '_tzinfo')
 
-    _times = []  # type: List[dict]
-    _weekdays = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+    # the source is the only serialization of a VTIMEZONE, it is kept as is (see VOBJECT.source_retention)
+    source_retention = 'text'
 
-    def __init__(self, data: str):
+    # first and last year covered by the compiled transition table
+    years = (1970, 2037)    # type: Tuple[int, int]
+
+    def __init__(self, data, years: Tuple[int, int]=None):
         """ create a VTIMEZONE object from a caldav data block
 
-        :param data: the full VTIMEZONE block in string format as returned from the CalDAV-server
+        :param data: the full VTIMEZONE block in string format as returned from the CalDAV-server or a
+                     tokenized ContentBlock
+        :param years: (first, last) year covered by the transition table, defaults to VTIMEZONE.years
         """
 
         # parsing notes:
@@ -28,119 +83,152 @@ class VTIMEZONE (VOBJECT):
         #    required blocks: standard or daylight (at least once)
         #    required fields in block standard/daylight: dtstart, tzoffsetto, tzoffsetfrom
         #    optional fields in block standard/daylight: comment, rrule, rdate, tzname, x-prop
-        logging.debug('creating VTIMEZONE from %s bytes of data' % len(data))
+        if isinstance(data, ContentBlock):
+            block = data
+            data = block.raw()
+        else:
+            block = VOBJECT.parse_block(data).unwrap('VTIMEZONE')
+        self._block = None
+        self._source = self._retain(data)
+        self._dirty = None
 
-        data = VOBJECT.clean_vobject_block(data)
+        logging.debug('creating VTIMEZONE from %s bytes of data', block.end - block.start)
 
-        try:
-            self.tzid = re.search(r'^TZID:(.*?)$', data, re.MULTILINE).group(1)
-        except AttributeError:
+        self._years = years
+        self._times = []            # type: List[dict]
+        self._transitions = None    # type: List[datetime]
+        self._offsets = None        # type: List[timedelta]
+        self._tzinfo = None         # type: VTIMEZONEInfo
+
+        self.tzid = block.value('TZID')
+        if self.tzid is None:
             raise MalformedVObjectException("Required property TZID not found")
 
-        for m in re.finditer(r'^BEGIN:(STANDARD|DAYLIGHT)\n(.*?)END:(STANDARD|DAYLIGHT)$', data,
-                             re.MULTILINE+re.DOTALL):
-            try:
-                dtstart = re.search(r'^DTSTART:(.*?)$', m.group(2), re.MULTILINE).group(1)
-                tzoffsetfrom = re.search(r'TZOFFSETFROM:(.*?)$', m.group(2), re.MULTILINE).group(1)
-                tzoffsetto = re.search(r'TZOFFSETTO:(.*?)$', m.group(2), re.MULTILINE).group(1)
-                rrule = re.search(r'RRULE:(.*?)$', m.group(2), re.MULTILINE)
+        for sub in block.children:
+            if sub.name not in ('STANDARD', 'DAYLIGHT'):
+                continue
 
-                values = {
-                    'TYPE': m.group(1),
-                    'DTSTART': dtstart,
-                    'TZOFFSETFROM': tzoffsetfrom,
-                    'TZOFFSETTO': tzoffsetto,
-                }
+            dtstart = sub.value('DTSTART')
+            tzoffsetfrom = sub.value('TZOFFSETFROM')
+            tzoffsetto = sub.value('TZOFFSETTO')
+            if dtstart is None or tzoffsetfrom is None or tzoffsetto is None:
+                raise MalformedVObjectException('Required Properties not found for %s block' % sub.name)
 
-                if rrule is not None:
-                    values['RRULE'] = rrule.group(1)
+            values = {
+                'TYPE': sub.name,
+                'DTSTART': dtstart,
+                'TZOFFSETFROM': tzoffsetfrom,
+                'TZOFFSETTO': tzoffsetto,
+            }
 
-                self._times.append(values)
+            rrule = sub.value('RRULE')
+            if rrule is not None:
+                values['RRULE'] = rrule
 
-            except AttributeError:
-                raise MalformedVObjectException('Required Properties not found for %s block' % m.group(1))
+            rdates = sub.values('RDATE')
+            if rdates:
+                values['RDATE'] = rdates
 
-    def localize(self, dt):
-        """ localizes and returns a utc-timestamp according to the currently active timezone in this VTIMEZONE block """
+            self._times.append(values)
 
-        #
-        #   TODO:   implement various RRULE styles (at least common ones..)
-        #           possibly move rrule parsing into own classes because it's used by VEVENT as well
-        #   TODO:   move get x-th day of month, first sunday, etc in separate functions
-
-        logging.debug('localizing %s for timezone %s', (dt, self.tzid))
-
-        cur_timezone = None
-        cur_timestamp = None
-
-        for t in self._times:
-            dtstart = t['DTSTART']
-
-            if 'RRULE' in t.keys():
-                target_date = None
-                vals = {}
-                for k in t['RRULE'].split(';'):
-                    (key, value) = k.split('=')
-                    vals[key] = value
-
-                if 'FREQ' in vals.keys():
-                    if vals['FREQ'] == 'YEARLY':
-                        month = int(vals['BYMONTH'])
-                        day = vals['BYDAY']
-
-                        if not day.isnumeric():
-                            wd = day[-2:]
-                            if day[:1] == "-":
-                                cnt = int(day[1:2])
-                                year = datetime.today().year
-                                month = (month + 1) % 12
-                                if month == 1:
-                                    year += 1
-
-                                start_date = datetime(year, int(month), 1)
-
-                                day_num = start_date.weekday()
-                                day_num_target = VTIMEZONE._weekdays.index(wd)
-                                days_ago = (7 + day_num - day_num_target) % 7
-                                if days_ago == 0:
-                                    days_ago = 7
-                                target_date = start_date - timedelta(days=days_ago + ((cnt-1)*7))
-
-                            else:
-                                cnt = int(day[:1])
-
-                                start_date = datetime(datetime.today().year, int(month), 1)
-
-                                day_num = start_date.weekday()
-                                day_num_target = VTIMEZONE._weekdays.index(wd)
-                                days_ago = (7 + day_num_target - day_num) % 7
-                                if days_ago == 0:
-                                    days_ago = 7
-                                target_date = start_date + timedelta(days=days_ago + ((cnt-1)*7))
-
-                if target_date is not None:
-                    if cur_timestamp is None:
-                        cur_timestamp = target_date
-                        cur_timezone = t
-                    else:
-                        if target_date.date() < dt.date():
-                            if cur_timestamp.date() > dt.date() or target_date.date() > cur_timestamp.date():
-                                cur_timestamp = target_date
-                                cur_timezone = t
-                else:
-                    logging.error('RRULE not implemented yet, no localization possible (%s)' % t['RRULE'])
-
-        logging.debug('decided on timezone offset: %s' % cur_timezone['TZOFFSETTO'])
-
-        m = re.search(r'([+-])?(\d\d)(\d\d)', cur_timezone['TZOFFSETTO'])
-
-        if m.group(1) == "-":
-            dt -= timedelta(hours=int(m.group(2)), minutes=int(m.group(3)))
+    @classmethod
+    def shared(cls, data, years: Tuple[int, int]=None) -> 'VTIMEZONE':
+        """ VTIMEZONE for a block or text, the same instance for identical definitions
+
+        the resources of a calendar usually embed the same few VTIMEZONE blocks, sharing their parsed form keeps a
+        single copy of each instead of one per resource. shared instances must not be modified.
+        """
+        key = (cls, data.raw() if isinstance(data, ContentBlock) else data, years)
+        tz = _shared.get(key)
+        if tz is None:
+            tz = cls(data, years)
+            if len(_shared) >= SHARED_TIMEZONES:
+                _shared.popitem(last=False)
+            _shared[key] = tz
         else:
-            dt += timedelta(hours=int(m.group(2)), minutes=int(m.group(3)))
+            _shared.move_to_end(key)
+        return tz
+
+    def __reduce__(self):
+        # unpickled definitions (e.g. parsed by a Calendar.parse_pool worker) are shared again
+        return type(self).shared, (self.rawdata, self._years)
+
+    @staticmethod
+    def parse_offset(value: str) -> timedelta:
+        """ parse a rfc5545 UTC offset value (+HHMM, -HHMM or +HHMMSS) """
+        m = re.match(r'([+-])?(\d\d)(\d\d)(\d\d)?$', value.strip())
+        if m is None:
+            raise MalformedVObjectException('malformed UTC offset %s' % value)
 
-        logging.debug('localized to %s' % dt)
-        return dt
+        offset = timedelta(hours=int(m.group(2)), minutes=int(m.group(3)), seconds=int(m.group(4) or 0))
+        return -offset if m.group(1) == '-' else offset
+
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def _compile(observances: tuple, first_year: int, last_year: int) -> Tuple[List[datetime], List[timedelta]]:
+        """ build the sorted (utc transition instant, offset) table for the given observances and year range
+
+        the table starts with datetime.min mapped to the offset in effect before the earliest observance
+
+        :param observances: tuple of (DTSTART, TZOFFSETFROM, TZOFFSETTO, RRULE or None, tuple of RDATEs)
+        """
+        # the year before the range is included so the offset in effect at its very beginning is known
+        window_start = datetime(first_year - 1, 1, 1)
+        window_end = datetime(last_year, 12, 31, 23, 59, 59)
+
+        table = {}
+        earliest = None
+        for dtstart, offset_from, offset_to, rrule, rdates in observances:
+            start = VOBJECT.parse_datetime(dtstart)
+            offset_from = VTIMEZONE.parse_offset(offset_from)
+            offset_to = VTIMEZONE.parse_offset(offset_to)
+
+            onsets = {start}
+            if rrule is not None:
+                try:
+                    onsets.update(RRULE.parse(rrule).between(start, window_start, window_end))
+                except MalformedVObjectException:
+                    logging.error('RRULE not implemented yet, no localization possible (%s)', rrule)
+            onsets.update(VOBJECT.parse_datetime_list(rdates))
+
+            if earliest is None or start < earliest[0]:
+                earliest = (start, offset_from)
+
+            # onsets are given in local time as observed before the transition
+            for onset in onsets:
+                if onset <= window_end:
+                    table[onset - offset_from] = offset_to
+
+        if earliest is not None:
+            table[datetime.min] = earliest[1]
+
+        transitions = sorted(table)
+        return transitions, [table[t] for t in transitions]
+
+    def _compiled(self) -> Tuple[List[datetime], List[timedelta]]:
+        if self._transitions is None:
+            observances = tuple((t['DTSTART'], t['TZOFFSETFROM'], t['TZOFFSETTO'], t.get('RRULE'),
+                                 tuple(t.get('RDATE', ()))) for t in self._times)
+            first, last = self._years or self.years
+            self._transitions, self._offsets = VTIMEZONE._compile(observances, first, last)
+        return self._transitions, self._offsets
+
+    def utcoffset(self, dt: datetime) -> timedelta:
+        """ UTC offset in effect at the utc-timestamp dt """
+        transitions, offsets = self._compiled()
+
+        idx = bisect_right(transitions, dt) - 1
+        return offsets[idx] if idx >= 0 else timedelta(0)
+
+    def tzinfo(self) -> VTIMEZONEInfo:
+        """ datetime.tzinfo implementation for this timezone definition """
+        if self._tzinfo is None:
+            self._tzinfo = VTIMEZONEInfo(self)
+        return self._tzinfo
+
+    def localize(self, dt):
+        """ localizes and returns a utc-timestamp according to the currently active timezone in this VTIMEZONE block """
+        return dt + self.utcoffset(dt)
 
     def __str__(self):
         return '<VTIMEZONE(%s)>' % self.tzid
\ No newline at end of file
@@ -1,26 +1,35 @@
 import re
 import logging
 from datetime import datetime, timedelta
+from typing import Dict
 
-from .VOBJECT import VOBJECT
-from .VEVENT import VEVENT
+from .VOBJECT import VOBJECT, ContentBlock, LazyProperty
 from .VTIMEZONE import VTIMEZONE
 
 
 class VTODO (VOBJECT):
-    href = None         # type: str
-    etag = None         # type: str
-    event = None        # type: VEVENT
-    timezone = None     # type: VTIMEZONE
-    dtstart = None      # type: datetime
-    dtend = None        # type: datetime
-    duration = None     # type: str
+    uid = LazyProperty('UID')                                               # type: str
+    recurrence_id = LazyProperty('RECURRENCE-ID', VOBJECT.parse_datetime,
+                                 encode=VOBJECT.encode_datetime)            # type: datetime
+    summary = LazyProperty('SUMMARY')                                       # type: str
+    description = LazyProperty('DESCRIPTION')                               # type: str
+    dtstart = LazyProperty('DTSTART', VOBJECT.floating_datetime, encode=VOBJECT.encode_datetime,
+                           derive='dtstart_tz')                             # type: datetime
+    dtend = LazyProperty('DUE', VOBJECT.floating_datetime, encode=VOBJECT.encode_datetime,
+                         derive='dtend_tz')                                 # type: datetime
+    dtstart_tz = LazyProperty('DTSTART', VOBJECT.decode_property_datetime, params=True,
+                              encode=VOBJECT.encode_datetime)               # type: datetime
+    dtend_tz = LazyProperty('DUE', VOBJECT.decode_property_datetime, params=True,
+                            encode=VOBJECT.encode_datetime)                 # type: datetime
+    duration = LazyProperty('DURATION')                                     # type: str
+
+    __slots__ = ('timezones',) + LazyProperty.slots(vars())
 
     def start(self):
         """ event start timestamp """
 
         if self.dtstart is None:
-            logging.warning('DTSTART is None, dumping raw data: %s' % self.rawdata)
+            logging.warning('DTSTART is None for todo %s', self.uid)
         return self.dtstart
 
     def end(self):
@@ -31,9 +40,13 @@ class VTODO (VOBJECT):
         elif self.duration is not None:
             return self.dtstart + timedelta(seconds=self.get_duration())
         else:
-            logging.warning('no DUE or DURATION present, returning DTSTART instead. raw dump: %s ' % self.rawdata)
+            logging.debug('no DUE or DURATION present for todo %s, returning DTSTART instead', self.uid)
             return self.dtstart
 
+    def all_day(self):
+        """ whether DTSTART is a DATE value (as opposed to DATE-TIME) """
+        return self.dtstart_tz is not None and not isinstance(self.dtstart_tz, datetime)
+
     def get_duration(self):
         """
         returns event duration in seconds
@@ -66,44 +79,27 @@ class VTODO (VOBJECT):
             except TypeError:
                 return 0
 
-    def __init__(self, data: str):
+    def __init__(self, data, lazy: bool=False, timezones: Dict[str, VTIMEZONE]=None):
         """
         create a VTODO object from a caldav data block
 
-        :param data: the full VTODO block as returned from the CalDAV-server (as string)
+        :param data: the full VTODO block as returned from the CalDAV-server (as string) or a tokenized ContentBlock
+        :param lazy: keep the tokenized block and decode properties on first access instead of up front
+        :param timezones: VTIMEZONE definitions (by TZID) of the enclosing VCALENDAR, used by dtstart_tz/dtend_tz
         """
+        self.timezones = timezones
 
-        logging.debug('creating VTODO with %s bytes of data' % len(data))
-        self.rawdata = data
-        data = VOBJECT.clean_vobject_block(data)
-
-        try:
-            self.summary = re.search(r'^SUMMARY:(.*?)$', data, re.MULTILINE).group(1)
-        except AttributeError:
-            self.summary = None
-
-        try:
-            self.description = re.search(r'^DESCRIPTION:(.*?)$', data, re.MULTILINE).group(1)
-        except AttributeError:
-            self.description = None
-
-        try:
-            self.dtstart = self.parse_datetime(re.search(r'^DTSTART.*:(.*?)$', data, re.MULTILINE).group(1))
-        except AttributeError:
-            self.dtstart = None
+        if isinstance(data, ContentBlock):
+            block = data
+        else:
+            block = VOBJECT.parse_block(data).unwrap('VTODO')
 
-        try:
-            self.dtend = self.parse_datetime(re.search(r'^DUE.*:(.*?)$', data, re.MULTILINE).group(1))
-        except AttributeError:
-            self.dtend = None
+        logging.debug('creating VTODO with %s bytes of data', block.end - block.start)
 
-        try:
-            self.duration = re.search(r'^DURATION:(.*?)$', data, re.MULTILINE).group(1)
-        except AttributeError:
-            self.duration = None
+        self._init_block(block, lazy)
 
     def __str__(self):
-        return '<VTODO(%s)>' % self.etag
+        return '<VTODO(%s)>' % self.uid
 
     def pretty_print(self):
         print("--------------------------------------------------")
@@ -0,0 +1,182 @@
+import io
+from typing import Callable, Iterable
+
+from .VOBJECT import VOBJECT, ContentBlock
+from .VCALENDAR import VCALENDAR
+
+
+# maximum length of a content line in octets (excluding the CRLF) before it gets folded
+FOLD_LENGTH = 75
+
+
+def fold(line: str) -> str:
+    """ fold a content line at FOLD_LENGTH octets (never inside a multi-byte character) and terminate it with CRLF """
+    if len(line) * 4 <= FOLD_LENGTH or len(line.encode('utf-8')) <= FOLD_LENGTH:
+        return line + '\r\n'
+
+    parts = []
+    start = 0
+    size = 0
+    limit = FOLD_LENGTH
+    for idx, char in enumerate(line):
+        char_size = len(char.encode('utf-8'))
+        if size + char_size > limit:
+            parts.append(line[start:idx])
+            start = idx
+            size = 0
+            limit = FOLD_LENGTH - 1    # continuation lines start with a space
+        size += char_size
+    parts.append(line[start:])
+
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _param_value(value: str) -> str:
+    return '"%s"' % value if any(c in value for c in ';:,') else value
+
+
+def content_line(name: str, params: dict, value: str) -> str:
+    """ build a folded, CRLF terminated content line """
+    if params:
+        name += ''.join(';%s=%s' % (k, _param_value(v)) for k, v in params.items())
+    return fold('%s:%s' % (name, value))
+
+
+def _crlf(chunk: str) -> str:
+    """ normalize a verbatim source span to CRLF line endings, a no-op for well-formed input """
+    if '&#13;' in chunk:
+        chunk = chunk.replace('&#13;', '')
+    if chunk.count('\n') != chunk.count('\r\n'):
+        chunk = chunk.replace('\r\n', '\n').replace('\n', '\r\n')
+    if not chunk.endswith('\r\n'):
+        chunk += '\r\n'
+    return chunk
+
+
+def _encode_property(prop, value, original: ContentBlock, write: Callable[[str], None]):
+    """ write the content line(s) for a modified LazyProperty value """
+    if value is None:
+        return
+
+    line = original.line(prop.name) if original is not None else None
+    params = line.params if line is not None else {}
+
+    for v in (value if prop.multi else [value]):
+        if prop.encode is not None:
+            p, raw = prop.encode(v, params)
+        else:
+            p, raw = params, str(v)
+        write(content_line(prop.name, p, raw))
+
+
+def write_component(component: VOBJECT, write: Callable[[str], None]):
+    """ serialize a VEVENT/VTODO/VTIMEZONE/VFREEBUSY through the `write` callable
+
+    unmodified content lines and sub-components are copied verbatim from the source text, only properties that
+    were assigned to since parsing are re-encoded. an unmodified component is copied as a single slice. components
+    without a source (new ones, or if it was not retained, see VOBJECT.source_retention) are written from their
+    decoded properties.
+    """
+    name = type(component).__name__
+    block = component.source_block()
+    dirty = getattr(component, '_dirty', None)
+
+    modified = {}
+    if block is None:
+        # attributes decoding the same property (dtstart/dtstart_tz) are declared plain first, the later timezone
+        # aware one wins unless the plain one was assigned to
+        for attr, prop in component.lazy_properties():
+            if getattr(component, attr) not in (None, []):
+                modified[prop.name] = (prop, attr)
+    if dirty:
+        for attr, prop in component.lazy_properties():
+            if attr in dirty:
+                modified[prop.name] = (prop, attr)
+
+    if block is not None and not modified and block.name == name:
+        write(_crlf(block.raw()))
+        return
+
+    write('BEGIN:%s\r\n' % name)
+
+    written = set()
+    if block is not None:
+        source = block.source
+        items = [(l.start, l.end, l.name) for lines in block.properties.values() for l in lines]
+        items.extend((c.start, c.end, None) for c in block.children)
+        items.sort()
+
+        for start, end, prop_name in items:
+            if prop_name in modified:
+                if prop_name not in written:
+                    prop, attr = modified[prop_name]
+                    _encode_property(prop, getattr(component, attr), block, write)
+                    written.add(prop_name)
+            else:
+                write(_crlf(source[start:end]))
+
+    # properties that were not present in the source
+    for prop_name, (prop, attr) in modified.items():
+        if prop_name not in written:
+            _encode_property(prop, getattr(component, attr), block, write)
+
+    write('END:%s\r\n' % name)
+
+
+def write_calendar(calendar: VCALENDAR, write: Callable[[str], None]):
+    """ serialize a VCALENDAR resource (header, timezones, events, todos, freebusy) through `write` """
+    write('BEGIN:VCALENDAR\r\n')
+
+    if calendar.header:
+        write(_crlf(calendar.header))
+    else:
+        write(content_line('VERSION', {}, calendar.version))
+        write(content_line('PRODID', {}, calendar.prodid))
+
+    for tz in calendar.timezones.values():
+        write_component(tz, write)
+    for c in calendar.events + calendar.todos:
+        write_component(c, write)
+    if calendar.freebusy is not None:
+        write_component(calendar.freebusy, write)
+
+    write('END:VCALENDAR\r\n')
+
+
+def serialize(obj) -> str:
+    """ iCalendar text of a VCALENDAR or a single component """
+    out = []
+    if isinstance(obj, VCALENDAR):
+        write_calendar(obj, out.append)
+    else:
+        write_component(obj, out.append)
+    return ''.join(out)
+
+
+def _writer(fp, encoding: str) -> Callable[[str], None]:
+    if isinstance(fp, io.TextIOBase):
+        return fp.write
+    return lambda s: fp.write(s.encode(encoding))
+
+
+def dump(obj, fp, encoding: str='utf-8'):
+    """ write a VCALENDAR or a single component to a text or binary file object """
+    write = _writer(fp, encoding)
+    if isinstance(obj, VCALENDAR):
+        write_calendar(obj, write)
+    else:
+        write_component(obj, write)
+
+
+def dump_components(components: Iterable[VOBJECT], fp, prodid: str='-//calpy//calpy//EN', encoding: str='utf-8'):
+    """ stream any number of components (e.g. from Reader.read_components) into one VCALENDAR on a file object
+
+    components are written one at a time, memory does not grow with the number of components
+    """
+    write = _writer(fp, encoding)
+    write('BEGIN:VCALENDAR\r\n')
+    write(content_line('VERSION', {}, '2.0'))
+    write(content_line('PRODID', {}, prodid))
+    for c in components:
+        write_component(c, write)
+    write('END:VCALENDAR\r\n')
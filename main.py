@@ -24,10 +24,9 @@ for section in config.sections():
 client = Client(servers[0]['host'], servers[0]['port'], auth=(servers[0]['username'], servers[0]['password']),
                 protocol=servers[0]['protocol'])
 
-cals = client.discover()
+cals = client.load_all()
 print('found %s calendars' % len(cals))
 for i in cals:
-    i.load()
     events = i.get_events(datetime.today() - timedelta(days=7), end=datetime.today())
     for e in events:
         e.pretty_print()
@@ -0,0 +1,154 @@
+import asyncio
+import threading
+import unittest
+from datetime import datetime, timedelta
+
+from benchmarks.StandInServer import StandInServer, fixed_account, ics
+from calpy.caldav import AsyncServer
+from calpy.caldav.Client import Client
+from calpy.ical.VCALENDAR import VCALENDAR
+from calpy.ical.Writer import serialize
+
+
+@unittest.skipIf(AsyncServer.aiohttp is None, 'aiohttp is not installed')
+class TestAsyncClient(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.stand_in = StandInServer(fixed_account(20, 30)).__enter__()
+
+    def tearDown(self):
+        self.stand_in.__exit__(None, None, None)
+
+    def client(self, **kwargs):
+        from calpy.caldav.AsyncClient import AsyncClient
+        return AsyncClient('127.0.0.1', self.stand_in.port, protocol='http', **kwargs)
+
+    async def test_discover_and_load(self):
+        async with self.client(max_connections=5) as client:
+            cals = await client.discover()
+            self.assertEqual(sorted(c.path for c in cals), sorted(self.stand_in.calendars))
+
+            for cal in cals:
+                cal.multiget_batch_size = 7
+            await asyncio.gather(*[cal.load() for cal in cals])
+
+        for cal in cals:
+            self.assertEqual(sorted(e.href for e in cal.entries), sorted(self.stand_in.calendars[cal.path].resources))
+        self.assertEqual(cals[0].get_events(datetime(2020, 3, 2))[0].event.summary, cals[0].path[-3:-1] + 'e0')
+
+    async def test_sync(self):
+        async with self.client() as client:
+            cal = (await client.discover())[0]
+            self.assertTrue(await cal.sync())
+            self.assertFalse(await cal.sync())
+
+            fake = self.stand_in.calendars[cal.path]
+            fake.delete(next(iter(fake.resources)))
+            self.assertTrue(await cal.sync())
+            self.assertEqual(len(cal.entries), 29)
+
+    async def test_sync_failure(self):
+        async with self.client() as client:
+            cal = (await client.discover())[0]
+            self.assertTrue(await cal.sync())
+
+            fake = self.stand_in.calendars[cal.path]
+            fake.delete(next(iter(fake.resources)))
+            fake.down = True
+            self.assertFalse(await cal.sync())
+            self.assertEqual(len(cal.entries), 30)
+
+            fake.down = False
+            self.assertTrue(await cal.sync())
+            self.assertEqual(len(cal.entries), 29)
+
+    async def test_load_all(self):
+        async with self.client() as client:
+            cals = await client.load_all()
+            self.assertEqual(len(cals), 20)
+            self.assertTrue(all(len(c.entries) == 30 for c in cals))
+            self.assertEqual([changed for _, changed in await client.sync_all(cals)], [False] * 20)
+
+    async def test_put_and_delete_many(self):
+        day = datetime(2020, 3, 5, 9)
+        async with self.client() as client:
+            cal = (await client.discover())[0]
+            await cal.load()
+            fake = self.stand_in.calendars[cal.path]
+            new = [VCALENDAR(None, None, ics('new%s' % i, day, day + timedelta(hours=1))) for i in range(40)]
+
+            results = await cal.put_many(new + [VCALENDAR(cal.entries[0].href, None, serialize(cal.entries[0]))])
+            self.assertEqual([r.error is None for r in results], [True] * 40 + [False])
+            self.assertEqual(len(fake.resources), 70)
+            self.assertEqual(len(cal.get_events(day)), 40)
+
+            results = await cal.delete_many(e.href for e in new[:10])
+            self.assertTrue(all(r.error is None for r in results))
+            self.assertEqual(len(fake.resources), 60)
+            self.assertFalse(await cal.sync())
+
+    async def test_throttled(self):
+        self.stand_in.throttled = 3
+        async with self.client() as client:
+            cals = await client.load_all()
+        self.assertEqual(len(cals), 20)
+        self.assertEqual(self.stand_in.throttled, 0)
+        self.assertGreater(self.stand_in.compressed, 0)
+
+    async def test_operation_failed(self):
+        from calpy.caldav.Server import OperationFailed
+        async with self.client() as client:
+            with self.assertRaises(OperationFailed):
+                await client.server.send('REPORT', '/calendars/missing/', 207, data='<x/>')
+
+
+class TestStandInClient(unittest.TestCase):
+    def test_blocking_client(self):
+        with StandInServer(fixed_account(2, 5)) as stand_in:
+            client = Client('127.0.0.1', stand_in.port, protocol='http')
+            cals = client.discover()
+            for cal in cals:
+                cal.load()
+            self.assertEqual(sorted(len(c.entries) for c in cals), [5, 5])
+
+    def test_load_all(self):
+        with StandInServer(fixed_account(6, 5)) as stand_in:
+            client = Client('127.0.0.1', stand_in.port, protocol='http', max_connections=3)
+
+            loaded = client.load_all(stream=True)
+            self.assertNotIsInstance(loaded, list)
+            cals = list(loaded)
+            self.assertEqual(sorted(c.path for c in cals), sorted(stand_in.calendars))
+            self.assertTrue(all(len(c.entries) == 5 for c in cals))
+
+            fake = stand_in.calendars[cals[0].path]
+            fake.delete(next(iter(fake.resources)))
+            day = datetime(2020, 3, 5, 9)
+            results = cals[1].put_many(VCALENDAR(None, None, ics('new%s' % i, day, day + timedelta(hours=1)))
+                                       for i in range(20))
+            self.assertTrue(all(r.etag is not None for r in results))
+            self.assertEqual(len(stand_in.calendars[cals[1].path].resources), 25)
+            synced = dict(client.sync_all(cals))
+            self.assertEqual(sorted(synced.values()), [False] * 5 + [True])
+            self.assertTrue(synced[cals[0]])
+
+    def test_conflicts_release_connections(self):
+        with StandInServer(fixed_account(1, 5)) as stand_in:
+            client = Client('127.0.0.1', stand_in.port, protocol='http', max_connections=2)
+            cal = client.discover()[0]
+            cal.load()
+            fake = stand_in.calendars[cal.path]
+            for href, (etag, data) in list(fake.resources.items()):
+                fake.put(href, data)
+
+            results = []
+
+            def write():
+                results.extend(cal.put_many(VCALENDAR(e.href, e.etag, serialize(e)) for e in cal.entries))
+                results.extend(cal.put_many([VCALENDAR(None, None, ics('new', datetime(2020, 3, 5, 9),
+                                                                       datetime(2020, 3, 5, 10)))]))
+
+            thread = threading.Thread(target=write, daemon=True)
+            thread.start()
+            thread.join(10)
+            self.assertFalse(thread.is_alive(), 'writes blocked on the connection pool')
+            self.assertEqual([r.error.actual_code if r.error else None for r in results], [412] * 5 + [None])
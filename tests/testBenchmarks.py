@@ -0,0 +1,66 @@
+import json
+import os
+import tempfile
+import unittest
+
+from benchmarks import load, parse
+from benchmarks.Corpus import Corpus
+from calpy.ical.VCALENDAR import VCALENDAR
+
+
+class TestCorpus(unittest.TestCase):
+    def test_deterministic(self):
+        corpus = Corpus(seed=3, recurring=0.5, payload=300)
+        self.assertEqual(corpus.calendar('a'), Corpus(seed=3, recurring=0.5, payload=300).calendar('a'))
+        self.assertNotEqual(corpus.calendar('a'), Corpus(seed=4, recurring=0.5, payload=300).calendar('a'))
+
+        entries = [VCALENDAR('/%s.ics' % i, None, corpus.calendar(str(i))) for i in range(40)]
+        self.assertEqual([e.event.uid for e in entries], [str(i) for i in range(40)])
+        self.assertTrue(all(299 <= len(e.event.description) <= 300 for e in entries))
+        self.assertTrue(any(e.event.recurring() for e in entries))
+        self.assertTrue(all(max(len(l) for l in corpus.calendar(str(i)).split('\r\n')) <= 75 for i in range(40)))
+
+    def test_components(self):
+        corpus = Corpus(attendees=12, timezone=True)
+        entry = VCALENDAR('/e.ics', None, corpus.calendar('e'))
+        self.assertEqual(entry.timezone.tzid, 'Europe/Berlin')
+        self.assertEqual(entry.event.dtstart_tz.tzinfo.utcoffset(entry.event.dtstart_tz).total_seconds() % 3600, 0)
+        self.assertEqual(corpus.calendar('e').count('\r\nATTENDEE;'), 12)
+
+        todo = VCALENDAR('/t.ics', None, corpus.calendar('t', 'VTODO')).todo
+        self.assertEqual(todo.uid, 't')
+        self.assertGreater(todo.get_duration(), 0)
+
+        self.assertEqual([len(v) for v in corpus.datetimes(6)], [8, 15, 16] * 2)
+        self.assertTrue(all(v.startswith('P') for v in corpus.durations(10)))
+
+
+class TestParseBenchmark(unittest.TestCase):
+    def test_run(self):
+        results = parse.run(parse.parse_args(['--events', '10', '--repeat', '2'])).summary()
+        self.assertEqual(list(results), [name for name, _, _, _ in parse.stages(parse.parse_args(['--events', '1']))])
+        self.assertGreater(results['vcalendar']['bytes_per_s'], 0)
+        self.assertGreater(results['vcalendar']['blocks_per_item'], 0)
+        self.assertNotIn('bytes_per_s', results['localize'])
+
+        only = parse.run(parse.parse_args(['--events', '5', '--repeat', '1', '--stages', 'vevent']))
+        self.assertEqual(list(only.samples), ['vevent'])
+
+
+class TestLoadBenchmark(unittest.TestCase):
+    def test_run(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'load.json')
+            load.main(['--calendars', '2', '--events', '20', '--changes', '3', '--repeat', '1', '--json', path])
+            with open(path) as f:
+                results = json.load(f)
+
+        summary = results['summary']
+        self.assertEqual(list(summary), ['discovery', 'full_load', 'first_sync', 'unchanged_sync',
+                                         'incremental_sync', 'range_query', 'get_events'])
+        self.assertEqual(summary['full_load']['entries'], 40)
+        self.assertEqual(summary['unchanged_sync']['requests'], 2)
+        self.assertEqual(summary['incremental_sync']['requests'], 2 * 3)
+        self.assertGreater(summary['full_load']['bytes'], 0)
+        self.assertGreater(summary['full_load']['bytes_per_entry'], 0)
+        self.assertEqual(results['config']['events'], 20)
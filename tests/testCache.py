@@ -0,0 +1,137 @@
+import os
+import tempfile
+import threading
+import unittest
+import xml.etree.ElementTree as Xml
+from datetime import datetime, timedelta
+
+from benchmarks.StandInServer import Collection, ics
+from calpy.caldav.Cache import Cache
+from calpy.caldav.Calendar import Calendar
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.dir.name, 'cache.db')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_etag(self):
+        cache = Cache(self.filename)
+        cache.put('/cal/', '/cal/a.ics', '"1"', 'data a')
+
+        self.assertEqual(cache.get('/cal/', '/cal/a.ics', '"1"'), 'data a')
+        self.assertIsNone(cache.get('/cal/', '/cal/a.ics', '"2"'))
+        self.assertIsNone(cache.get('/other/', '/cal/a.ics', '"1"'))
+
+        cache.put('/cal/', '/cal/a.ics', '"2"', 'data a2')
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.get_many('/cal/', {'/cal/a.ics': '"2"', '/cal/b.ics': '"1"'}), {'/cal/a.ics': 'data a2'})
+
+        cache.remove('/cal/', ['/cal/a.ics'])
+        self.assertEqual(len(cache), 0)
+
+    def test_lru_eviction(self):
+        cache = Cache(self.filename, max_size=30, touch_interval=0)
+        for i in range(3):
+            cache.put('/cal/', '/cal/%s.ics' % i, '"1"', '%s' % i * 10)
+        self.assertEqual(cache.size(), 30)
+
+        cache.get('/cal/', '/cal/0.ics', '"1"')
+        cache.put('/cal/', '/cal/3.ics', '"1"', '3' * 10)
+
+        self.assertEqual(cache.size(), 30)
+        self.assertIsNone(cache.get('/cal/', '/cal/1.ics', '"1"'))
+        self.assertIsNotNone(cache.get('/cal/', '/cal/0.ics', '"1"'))
+
+    def test_touch_interval(self):
+        cache = Cache(self.filename)
+        cache.put('/cal/', '/cal/a.ics', '"1"', 'data a')
+        used = cache._connection().execute('SELECT used FROM resources').fetchone()[0]
+
+        cache.get('/cal/', '/cal/a.ics', '"1"')
+        self.assertEqual(cache._connection().execute('SELECT used FROM resources').fetchone()[0], used)
+
+        cache.touch_interval = 0
+        cache.get('/cal/', '/cal/a.ics', '"1"')
+        self.assertGreater(cache._connection().execute('SELECT used FROM resources').fetchone()[0], used)
+
+    def test_encoded_size(self):
+        cache = Cache(self.filename)
+        cache.put('/cal/', '/cal/a.ics', '"1"', '\u00e4' * 10)
+        self.assertEqual(cache.size(), 20)
+
+    def test_concurrent_readers(self):
+        cache = Cache(self.filename)
+        cache.put_many('/cal/', [('/cal/%s.ics' % i, '"1"', 'data') for i in range(100)])
+
+        errors = []
+
+        def read():
+            try:
+                other = Cache(self.filename)
+                for i in range(100):
+                    if other.get('/cal/', '/cal/%s.ics' % i, '"1"') != 'data':
+                        errors.append(i)
+                other.close()
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=read) for _ in range(4)]
+        for t in threads:
+            t.start()
+        cache.put_many('/cal/', [('/cal/new%s.ics' % i, '"1"', 'data') for i in range(100)])
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+
+    def test_warm_start(self):
+        day = datetime(2020, 3, 2, 9)
+        server = Collection(dict(('/cal/w%s.ics' % i, ('"1"', ics('w%s' % i, day, day + timedelta(hours=1))))
+                                  for i in range(5)))
+
+        cal = Calendar('VEVENT', server, Cache(self.filename))
+        cal.path = '/cal/'
+        cal.load()
+        self.assertEqual(len(cal.entries), 5)
+
+        server.put('/cal/w1.ics', ics('changed', day, day + timedelta(hours=1)))
+        server.requests = []
+
+        restarted = Calendar('VEVENT', server, Cache(self.filename))
+        restarted.path = '/cal/'
+        restarted.load()
+
+        multiget = Xml.fromstring(server.requests[-1])
+        self.assertEqual([h.text for h in multiget.findall('{DAV:}href')], ['/cal/w1.ics'])
+        self.assertEqual(sorted(e.href for e in restarted.entries), sorted(server.resources))
+        self.assertEqual(restarted.get_entry('/cal/w1.ics').event.summary, 'changed')
+        self.assertEqual(restarted.get_entry('/cal/w0.ics').event.summary, 'w0')
+
+    def test_discovery(self):
+        from calpy.caldav.Client import Client
+        from benchmarks.StandInServer import StandInServer, fixed_account
+
+        with StandInServer(fixed_account(3, 1)) as stand_in:
+            client = Client('127.0.0.1', stand_in.port, protocol='http', cache=Cache(self.filename))
+            found = client.discover()
+            self.assertEqual(stand_in.requests, 3)
+
+            restarted = Client('127.0.0.1', stand_in.port, protocol='http', cache=Cache(self.filename))
+            cached = restarted.discover()
+            self.assertEqual(stand_in.requests, 3)
+            self.assertEqual([(c.type, c.path, c.displayname, c.ctag) for c in cached],
+                             [(c.type, c.path, c.displayname, c.ctag) for c in found])
+            self.assertIs(cached[0].server, restarted.server)
+
+            restarted.discovery_ttl = 0
+            self.assertEqual(len(restarted.discover()), 3)
+            self.assertEqual(stand_in.requests, 4)
+            self.assertEqual(restarted.cache.get_discovery(restarted.account)[0]['principal'], '/principal/')
+
+            other = Client('127.0.0.1', stand_in.port, protocol='http', auth=('other', ''), cache=Cache(self.filename))
+            other.discover()
+            self.assertEqual(stand_in.requests, 7)
@@ -0,0 +1,266 @@
+import unittest
+import xml.etree.ElementTree as Xml
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+from unittest import mock
+
+from benchmarks.StandInServer import Collection, ics, resource
+from calpy.caldav.Calendar import Calendar
+from calpy.ical.VCALENDAR import VCALENDAR
+from calpy.ical.VOBJECT import MalformedVObjectException
+
+
+class TestCalendar(unittest.TestCase):
+    def setUp(self):
+        self.cal = Calendar('VEVENT', None)
+        base = datetime.now().replace(hour=9, minute=0, second=0, microsecond=0)
+        self.base = base
+        for i in range(50):
+            start = base + timedelta(days=i * 3 - 60, hours=i % 5)
+            self.cal.add_entry(resource('e%s' % i, start, start + timedelta(hours=(i % 7) * 11 + 1)))
+        self.cal.add_entry(resource('long', base - timedelta(days=400), base + timedelta(days=400)))
+        self.cal.add_entry(resource('weekly', base - timedelta(days=30), base - timedelta(days=30, hours=-1),
+                                    'FREQ=WEEKLY'))
+
+    def brute_force(self, start, end):
+        return set(e.href for e in self.cal.entries if e.is_on(start, end))
+
+    def test_get_events_matches_is_on(self):
+        for offset in range(-70, 100, 7):
+            start = self.base + timedelta(days=offset)
+            for length in (0, 1, 5):
+                end = start + timedelta(days=length)
+                self.assertEqual(set(e.href for e in self.cal.get_events(start, end)), self.brute_force(start, end))
+
+    def test_outside_horizon(self):
+        start = self.base + timedelta(days=5 * 366)
+        hrefs = set(e.href for e in self.cal.get_events(start, duration=timedelta(days=7)))
+        self.assertEqual(hrefs, {'/cal/weekly.ics'})
+
+    def test_outside_horizon_ordered(self):
+        start = self.base + timedelta(days=5 * 366)
+        late = datetime.combine(start.date(), datetime.min.time()) + timedelta(days=7, hours=22)
+        self.cal.add_entry(resource('late', late, late + timedelta(hours=1)))
+        self.cal.get_events(self.base)
+        with mock.patch.object(VCALENDAR, 'instances', autospec=True, side_effect=VCALENDAR.instances) as instances:
+            hrefs = [e.href for e in self.cal.get_events(start, duration=timedelta(days=7))]
+        self.assertEqual(hrefs, ['/cal/weekly.ics', '/cal/late.ics'])
+        self.assertEqual(instances.call_count, 1)
+
+    def test_incremental_update(self):
+        start = self.base + timedelta(days=200)
+        self.assertNotIn('/cal/e0.ics', [e.href for e in self.cal.get_events(start)])
+
+        index = self.cal._index
+        self.cal.add_entry(resource('e0', start, start + timedelta(hours=1)))
+        self.assertIs(self.cal._index, index)
+        self.assertIn('/cal/e0.ics', [e.href for e in self.cal.get_events(start)])
+        self.assertEqual(len([e for e in self.cal.entries if e.href == '/cal/e0.ics']), 1)
+
+        self.cal.remove_entry('/cal/e0.ics')
+        self.assertNotIn('/cal/e0.ics', [e.href for e in self.cal.get_events(start)])
+        self.assertEqual(self.cal.get_events(start), [self.cal.get_entry('/cal/long.ics')])
+
+    def test_remove_entry_positions(self):
+        first, moved = self.cal.entries[0], self.cal.entries[-1]
+        self.assertIs(self.cal.remove_entry(first.href), first)
+        self.assertIs(self.cal.entries[0], moved)
+
+        self.cal.add_entry(resource('weekly', self.base, self.base + timedelta(hours=1)))
+        self.assertEqual(len(self.cal.entries), 51)
+        self.assertFalse(self.cal.entries[0].event.recurring())
+        self.assertEqual([e.href for e in self.cal.entries].count('/cal/weekly.ics'), 1)
+
+    def test_single_instance_outside_horizon(self):
+        start = self.base - timedelta(days=3 * 366)
+        self.cal.add_entry(resource('old', start, start + timedelta(hours=1)))
+        self.assertEqual([e.href for e in self.cal.get_events(start)], ['/cal/old.ics'])
+
+    def test_load_time_range(self):
+        start = datetime(2020, 3, 2, 0, 0, tzinfo=timezone.utc)
+        server = Collection({'/cal/q.ics': ('"1"', ics('q', datetime(2020, 3, 3, 9), datetime(2020, 3, 3, 10)))})
+        cal = Calendar('VTODO', server)
+        cal.path = '/cal/'
+
+        cal.load(start=start, end=start + timedelta(days=7))
+
+        self.assertEqual([e.href for e in cal.entries], ['/cal/q.ics'])
+        self.assertEqual(cal.get_entry('/cal/q.ics').event.summary, 'q')
+        self.assertEqual(len(server.requests), 1)
+        request = Xml.fromstring(server.requests[0])
+        self.assertEqual(request.tag, '{urn:ietf:params:xml:ns:caldav}calendar-query')
+        self.assertEqual(request.find('.//{urn:ietf:params:xml:ns:caldav}comp-filter/*').get('name'), 'VTODO')
+        time_range = request.find('.//{urn:ietf:params:xml:ns:caldav}time-range')
+        self.assertEqual(time_range.attrib, {'start': '20200302T000000Z', 'end': '20200309T000000Z'})
+
+    def sync_calendar(self, sync: bool) -> Tuple[Calendar, Collection]:
+        day = datetime(2020, 3, 2, 9)
+        server = Collection(dict(('/cal/s%s.ics' % i, ('"1"', ics('s%s' % i, day, day + timedelta(hours=1))))
+                                  for i in range(10)), sync)
+        cal = Calendar('VEVENT', server)
+        cal.path = '/cal/'
+
+        self.assertTrue(cal.sync())
+        self.assertEqual(len(cal.entries), 10)
+        return cal, server
+
+    def check_sync(self, sync: bool):
+        cal, server = self.sync_calendar(sync)
+        unchanged = cal.get_entry('/cal/s0.ics')
+
+        server.requests = []
+        self.assertFalse(cal.sync())
+        self.assertEqual(len(server.requests), 1)
+
+        day = datetime(2020, 3, 3, 9)
+        server.put('/cal/s1.ics', ics('changed', day, day + timedelta(hours=1)))
+        server.put('/cal/new.ics', ics('new', day, day + timedelta(hours=1)))
+        server.delete('/cal/s2.ics')
+
+        server.requests = []
+        self.assertTrue(cal.sync())
+        multiget = Xml.fromstring(server.requests[-1])
+        self.assertEqual(sorted(h.text for h in multiget.findall('{DAV:}href')), ['/cal/new.ics', '/cal/s1.ics'])
+
+        self.assertEqual(len(cal.entries), 10)
+        self.assertIs(cal.get_entry('/cal/s0.ics'), unchanged)
+        self.assertIsNone(cal.get_entry('/cal/s2.ics'))
+        self.assertEqual(cal.get_entry('/cal/s1.ics').event.summary, 'changed')
+        self.assertEqual(sorted(e.href for e in cal.get_events(day)), ['/cal/new.ics', '/cal/s1.ics'])
+        return server
+
+    def test_sync_collection(self):
+        server = self.check_sync(True)
+        self.assertEqual(Xml.fromstring(server.requests[1]).tag, '{DAV:}sync-collection')
+
+    def test_sync_etags(self):
+        server = self.check_sync(False)
+        self.assertEqual(Xml.fromstring(server.requests[1]).tag, '{DAV:}propfind')
+
+    def test_sync_failure(self):
+        for sync in (True, False):
+            cal, server = self.sync_calendar(sync)
+            entries = list(cal.entries)
+            server.delete('/cal/s0.ics')
+
+            server.down = True
+            self.assertFalse(cal.sync())
+            self.assertEqual(cal.entries, entries)
+
+            # only the etag listing fails
+            server.down = False
+            propfind = server.propfind
+            server.propfind = lambda url, data, headers: None if headers['Depth'] == '1' \
+                else propfind(url, data, headers)
+            cal._synced_ctag = None
+            self.assertFalse(cal.sync())
+            self.assertEqual(cal.entries, entries)
+
+            del server.propfind
+            self.assertTrue(cal.sync())
+            self.assertEqual(sorted(e.href for e in cal.entries), sorted(server.resources))
+
+    def test_put_many(self):
+        cal, server = self.sync_calendar(True)
+        cal.write_workers = 3
+        day = datetime(2020, 3, 4, 9)
+        edited = cal.get_entry('/cal/s0.ics')
+        edited.event.summary = 'edited'
+        new = VCALENDAR(None, None, ics('n@1', day, day + timedelta(hours=1)))
+        stale = VCALENDAR('/cal/s1.ics', '"0"', ics('stale', day, day + timedelta(hours=1)))
+        taken = VCALENDAR('/cal/s2.ics', None, ics('taken', day, day + timedelta(hours=1)))
+        unnamed = VCALENDAR(None, None, ics('x', day, day + timedelta(hours=1)).replace('UID:x\n', ''))
+
+        results = cal.put_many([edited, new, stale, taken, unnamed])
+
+        self.assertEqual([r.href for r in results],
+                         ['/cal/s0.ics', '/cal/n@1.ics', '/cal/s1.ics', '/cal/s2.ics', None])
+        self.assertEqual([getattr(r.error, 'actual_code', None) for r in results[:4]], [None, None, 412, 412])
+        self.assertIsInstance(results[4].error, MalformedVObjectException)
+        self.assertIsNone(unnamed.href)
+        self.assertEqual(server.resources['/cal/s0.ics'][0], results[0].etag)
+        self.assertIn('SUMMARY:edited', server.resources['/cal/s0.ics'][1])
+        self.assertEqual(new.etag, results[1].etag)
+        self.assertIs(cal.get_entry('/cal/n@1.ics'), new)
+        self.assertEqual(cal.get_entry('/cal/s1.ics').event.summary, 's1')
+        self.assertEqual(len(cal.entries), 11)
+        self.assertEqual([e.href for e in cal.get_events(day)], ['/cal/n@1.ics'])
+
+        server.requests = []
+        self.assertFalse(cal.sync())
+        self.assertEqual(len(server.requests), 2)
+
+    def test_delete_many(self):
+        cal, server = self.sync_calendar(True)
+        server.put('/cal/s4.ics', ics('changed', datetime(2020, 3, 2, 9), datetime(2020, 3, 2, 10)))
+
+        results = cal.delete_many(['/cal/s3.ics', '/cal/missing.ics', '/cal/s4.ics'])
+
+        self.assertEqual([r.error.actual_code if r.error else None for r in results], [None, None, 412])
+        self.assertNotIn('/cal/s3.ics', server.resources)
+        self.assertIsNone(cal.get_entry('/cal/s3.ics'))
+        self.assertIsNotNone(cal.get_entry('/cal/s4.ics'))
+        self.assertEqual(len(cal.entries), 9)
+
+    def test_memory_report(self):
+        from calpy.caldav.Client import Client
+
+        report = self.cal.memory_report()
+        self.assertEqual(report['entries'], 52)
+        self.assertEqual(report['bytes'], report['entry_bytes'] + report['index_bytes'])
+        self.assertEqual(report['bytes_per_entry'], report['bytes'] / 52)
+        self.assertEqual(report['index_bytes'], self.cal.memory_report()['index_bytes'])
+
+        self.cal.get_events(self.base)
+        self.assertGreater(self.cal.memory_report()['index_bytes'], report['index_bytes'])
+
+        # the second calendar holds the same entries, everything it refers to was counted for the first one
+        other = Calendar('VEVENT', None)
+        other.path = '/other/'
+        self.cal.path = '/cal/'
+        other._set_entries(list(self.cal.entries))
+        reports = Client.memory_report([self.cal, other])
+        self.assertEqual(reports['/cal/']['entries'], reports['/other/']['entries'])
+        self.assertLess(reports['/other/']['bytes'], reports['/cal/']['bytes'] / 10)
+
+    def test_load_batches(self):
+        day = datetime(2020, 3, 2, 9)
+        server = Collection(dict(('/cal/b%s.ics' % i, ('"1"', ics('b%s' % i, day, day + timedelta(hours=1))))
+                                  for i in range(20)))
+        server.failures = 2
+        cal = Calendar('VEVENT', server)
+        cal.path = '/cal/'
+        cal.multiget_batch_size = 3
+
+        cal.load()
+
+        self.assertEqual(sorted(e.href for e in cal.entries), sorted(server.resources))
+        batches = [Xml.fromstring(r) for r in server.requests[1:]]
+        self.assertEqual(len(batches), 7 + 2)
+        self.assertTrue(all(len(b.findall('{DAV:}href')) <= 3 for b in batches))
+
+    def test_parse_pool(self):
+        from concurrent.futures import ProcessPoolExecutor
+        from calpy.ical.Writer import serialize
+        from tests.testVCALENDAR import DATA
+
+        resources = dict(('/cal/p%s.ics' % i, ('"1"', DATA.replace('UID:', 'UID:p%s' % i))) for i in range(12))
+        serial = Calendar('VEVENT', Collection(resources))
+        serial.path = '/cal/'
+        serial.load()
+
+        with ProcessPoolExecutor(2) as pool:
+            cal = Calendar('VEVENT', Collection(resources))
+            cal.path = '/cal/'
+            cal.parse_pool = pool
+            cal.parse_threshold = 0
+            cal.parse_chunk_size = len(DATA) * 5
+            cal.load()
+
+        self.assertEqual([e.href for e in cal.entries], [e.href for e in serial.entries])
+        for entry, expected in zip(cal.entries, serial.entries):
+            self.assertEqual(serialize(entry), serialize(expected))
+            self.assertEqual(entry.event.dtstart_tz, expected.event.dtstart_tz)
+            self.assertEqual(entry.event.dtstart_tz.utcoffset(), expected.event.dtstart_tz.utcoffset())
+            self.assertEqual(entry.overrides.keys(), expected.overrides.keys())
+        self.assertIs(cal.entries[0].timezone, cal.entries[-1].timezone)
@@ -0,0 +1,43 @@
+import unittest
+from datetime import datetime, timedelta
+
+from benchmarks.StandInServer import resource
+from calpy.caldav.Calendar import Calendar
+from calpy.caldav import EventStore as store
+
+
+@unittest.skipIf(store.numpy is None, 'numpy not installed')
+class TestEventStore(unittest.TestCase):
+    def setUp(self):
+        self.base = datetime(2016, 7, 30, 9)
+        self.calendars = []
+        for c in range(3):
+            cal = Calendar('VEVENT', None)
+            for i in range(20):
+                start = self.base + timedelta(days=i, hours=c)
+                cal.add_entry(resource('c%se%s' % (c, i), start, start + timedelta(hours=1)))
+            self.calendars.append(cal)
+        self.calendars[0].add_entry(resource('daily', self.base - timedelta(days=10), self.base - timedelta(days=10),
+                                             'FREQ=DAILY;COUNT=15'))
+        self.store = store.EventStore(self.calendars, datetime(2016, 1, 1), datetime(2017, 1, 1))
+
+    def test_query(self):
+        result = self.store.query(self.base + timedelta(days=2), self.base + timedelta(days=2, hours=1, minutes=30))
+        self.assertEqual([(self.calendars.index(c), e.href) for c, e in result],
+                         [(0, '/cal/c0e2.ics'), (0, '/cal/daily.ics'), (1, '/cal/c1e2.ics')])
+
+    def test_query_calendars(self):
+        result = self.store.query(self.base, self.base + timedelta(days=30), calendars=[self.calendars[2]])
+        self.assertEqual(len(result), 20)
+        self.assertTrue(all(c is self.calendars[2] for c, _ in result))
+
+        self.assertRaises(ValueError, self.store.query, self.base, self.base + timedelta(days=30),
+                          calendars=[Calendar('VEVENT', None)])
+
+    def test_recurring(self):
+        rows = self.store.query_rows(self.base - timedelta(days=20), self.base + timedelta(days=30),
+                                     calendars=[self.calendars[0]])
+        recurring = rows[(self.store.flags[rows] & store.FLAG_RECURRING) != 0]
+        self.assertEqual(len(recurring), 15)
+        self.assertEqual(len(self.store), 75)
+        self.assertEqual(self.store.nbytes(), 75 * (8 + 8 + 4 + 1 + 1 + 4))
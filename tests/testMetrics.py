@@ -0,0 +1,59 @@
+import unittest
+
+import calpy.Metrics as Metrics
+from calpy.ical.VCALENDAR import VCALENDAR
+
+
+DATA = "BEGIN:VCALENDAR\nVERSION:2.0\nPRODID:test\nBEGIN:VEVENT\nDTSTART:20160730\nEND:VEVENT\nEND:VCALENDAR\n"
+
+
+class TestMetrics(unittest.TestCase):
+
+    def tearDown(self):
+        Metrics.disable()
+
+    def test_disabled(self):
+        self.assertIsNone(Metrics.sink())
+        self.assertIs(Metrics.timer('a'), Metrics.timer('b'))
+        Metrics.count('a')
+        VCALENDAR(None, None, DATA)
+
+    def test_disabled_concurrently(self):
+        Metrics.enable()
+        timer = Metrics.timer('t')
+        with timer:
+            Metrics.disable()
+        Metrics.enabled = True
+        try:
+            Metrics.count('a')
+        finally:
+            Metrics.enabled = False
+
+    def test_abstract_sink(self):
+        self.assertRaises(TypeError, Metrics.Sink)
+
+    def test_stats(self):
+        sink = Metrics.enable()
+        Metrics.count('a')
+        Metrics.count('a', 2)
+        with Metrics.timer('t'):
+            pass
+        VCALENDAR(None, None, DATA)
+
+        stats = sink.stats()
+        self.assertEqual(stats['counters']['a'], 3)
+        self.assertEqual(stats['counters']['ical.components.vevent'], 1)
+        self.assertEqual(stats['timings']['t']['count'], 1)
+        self.assertEqual(stats['timings']['ical.parse.vcalendar']['count'], 1)
+
+    def test_prometheus(self):
+        sink = Metrics.enable(Metrics.PrometheusSink())
+        Metrics.count('caldav.http.requests')
+        Metrics.observe('caldav.http.report', 0.02)
+
+        text = sink.render()
+        self.assertIn('# TYPE calpy_caldav_http_requests_total counter\ncalpy_caldav_http_requests_total 1\n', text)
+        self.assertIn('calpy_caldav_http_report_seconds_bucket{le="0.01"} 0\n', text)
+        self.assertIn('calpy_caldav_http_report_seconds_bucket{le="0.05"} 1\n', text)
+        self.assertIn('calpy_caldav_http_report_seconds_bucket{le="+Inf"} 1\n', text)
+        self.assertIn('calpy_caldav_http_report_seconds_count 1\n', text)
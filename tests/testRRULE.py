@@ -0,0 +1,44 @@
+import unittest
+from datetime import datetime
+
+from calpy.ical.RRULE import RRULE, expand
+from calpy.ical.VOBJECT import MalformedVObjectException
+
+
+class TestRRULE(unittest.TestCase):
+    def setUp(self):
+        self.dtstart = datetime(2016, 7, 30, 12, 30)
+
+    def test_daily_count(self):
+        rule = RRULE('FREQ=DAILY;INTERVAL=2;COUNT=3')
+        self.assertEqual(rule.between(self.dtstart, datetime(2016, 1, 1), datetime(2017, 1, 1)),
+                         [datetime(2016, 7, 30, 12, 30), datetime(2016, 8, 1, 12, 30), datetime(2016, 8, 3, 12, 30)])
+        self.assertIsNone(rule.after(self.dtstart, datetime(2016, 8, 3, 12, 30)))
+
+    def test_weekly_byday(self):
+        rule = RRULE('FREQ=WEEKLY;BYDAY=MO,FR;UNTIL=20160812T000000')
+        self.assertEqual(rule.between(self.dtstart, datetime(2016, 1, 1), datetime(2017, 1, 1)),
+                         [datetime(2016, 8, 1, 12, 30), datetime(2016, 8, 5, 12, 30), datetime(2016, 8, 8, 12, 30)])
+
+    def test_monthly_last_weekday(self):
+        rule = RRULE('FREQ=MONTHLY;BYDAY=MO,TU,WE,TH,FR;BYSETPOS=-1')
+        self.assertEqual(rule.between(self.dtstart, datetime(2016, 9, 1), datetime(2016, 12, 1)),
+                         [datetime(2016, 9, 30, 12, 30), datetime(2016, 10, 31, 12, 30),
+                          datetime(2016, 11, 30, 12, 30)])
+
+    def test_yearly_nth_weekday(self):
+        rule = RRULE('FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU')
+        self.assertEqual(rule.after(datetime(1981, 3, 29, 2), datetime(2016, 7, 30)), datetime(2017, 3, 26, 2))
+
+    def test_window_skip_ahead(self):
+        """ a daily series is expanded only within the requested window, decades after dtstart """
+        occurrences = expand('FREQ=DAILY', self.dtstart, datetime(2066, 1, 1), datetime(2066, 1, 3, 23))
+        self.assertEqual(occurrences, (datetime(2066, 1, 1, 12, 30), datetime(2066, 1, 2, 12, 30),
+                                       datetime(2066, 1, 3, 12, 30)))
+        self.assertIs(expand('FREQ=DAILY', self.dtstart, datetime(2066, 1, 1), datetime(2066, 1, 3, 23)),
+                      occurrences)
+
+    def test_malformed(self):
+        self.assertRaises(MalformedVObjectException, RRULE, 'INTERVAL=2')
+        self.assertRaises(MalformedVObjectException, RRULE, 'FREQ=DAILY;COUNT=x')
+        self.assertRaises(MalformedVObjectException, RRULE, 'FREQ=YEARLY;BYWEEKNO=20;BYDAY=MO')
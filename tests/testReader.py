@@ -0,0 +1,64 @@
+import io
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from calpy.ical.Reader import read_components, read_file
+from calpy.ical.VEVENT import VEVENT
+from calpy.ical.VTIMEZONE import VTIMEZONE
+from calpy.ical.VTODO import VTODO
+
+
+DATA = """BEGIN:VCALENDAR\r
+VERSION:2.0\r
+BEGIN:VTIMEZONE\r
+TZID:UTC\r
+BEGIN:STANDARD\r
+DTSTART:19700101T000000\r
+TZOFFSETFROM:+0000\r
+TZOFFSETTO:+0000\r
+END:STANDARD\r
+END:VTIMEZONE\r
+BEGIN:VEVENT\r
+SUMMARY:first\r
+DTSTART:20160730T120000\r
+BEGIN:VALARM\r
+ACTION:DISPLAY\r
+END:VALARM\r
+END:VEVENT\r
+BEGIN:VTODO\r
+SUMMARY:todo\r
+END:VTODO\r
+BEGIN:VEVENT\r
+SUMMARY:sec\r
+ ond\r
+DTSTART:20160731\r
+END:VEVENT\r
+END:VCALENDAR\r
+"""
+
+
+class TestReader(unittest.TestCase):
+
+    def test_read_components(self):
+        comps = list(read_components(io.StringIO(DATA)))
+
+        self.assertEqual([type(c) for c in comps], [VTIMEZONE, VEVENT, VTODO, VEVENT])
+        self.assertEqual(comps[1].summary, 'first')
+        self.assertEqual(comps[3].summary, 'second')
+        self.assertEqual(comps[3].dtstart, datetime(2016, 7, 31))
+
+    def test_read_components_filter(self):
+        comps = list(read_components(io.BytesIO(DATA.encode()), components=('VEVENT',), lazy=True))
+        self.assertEqual([c.summary for c in comps], ['first', 'second'])
+
+    def test_read_file(self):
+        fd, path = tempfile.mkstemp(suffix='.ics')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(DATA.encode())
+            self.assertEqual([c.summary for c in read_file(path, components=('VEVENT', 'VTODO'))],
+                             ['first', 'todo', 'second'])
+        finally:
+            os.remove(path)
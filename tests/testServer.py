@@ -0,0 +1,65 @@
+import threading
+import unittest
+import xml.etree.ElementTree as Xml
+
+from benchmarks.StandInServer import StandInServer
+from calpy.caldav.Server import MultistatusParser, OperationFailed, Server
+
+
+class TestMultistatusParser(unittest.TestCase):
+    BODY = ('<d:multistatus xmlns:d="DAV:">%s<d:sync-token>t</d:sync-token></d:multistatus>'
+            % ''.join('<d:response><d:href>/e%s.ics</d:href><d:propstat><d:prop><d:getetag>"%s"</d:getetag>'
+                      '</d:prop></d:propstat></d:response>' % (i, i) for i in range(50))).encode('utf-8')
+
+    def test_chunks(self):
+        parser = MultistatusParser()
+        hrefs = []
+        held = 0
+        for i in range(0, len(self.BODY), 7):
+            for elem in parser.feed(self.BODY[i:i + 7]):
+                hrefs.append(elem.find('{DAV:}href').text)
+            held = max(held, len(parser._root) if parser._root is not None else 0)
+        for elem in parser.close():
+            hrefs.append(elem.find('{DAV:}href').text)
+
+        self.assertEqual(hrefs, ['/e%s.ics' % i for i in range(50)])
+        self.assertLessEqual(held, 3)
+
+    def test_single_chunk(self):
+        parser = MultistatusParser()
+        elems = parser.feed(self.BODY)
+        self.assertEqual(len(elems), 50)
+        self.assertEqual(elems[-1].find('.//{DAV:}getetag').text, '"49"')
+        self.assertEqual(parser.close(), [])
+
+    def test_malformed(self):
+        parser = MultistatusParser()
+        with self.assertRaises(Xml.ParseError):
+            parser.feed(self.BODY[:200] + b'</d:multistatus>')
+            parser.close()
+
+
+class TestServer(unittest.TestCase):
+    def run_bounded(self, func, timeout: float=5):
+        """ run func on a thread, failing instead of hanging the suite if it does not finish in time """
+        thread = threading.Thread(target=func, daemon=True)
+        thread.start()
+        thread.join(timeout)
+        self.assertFalse(thread.is_alive(), 'requests blocked on the connection pool')
+
+    def test_failed_requests_release_connections(self):
+        with StandInServer({}) as stand_in:
+            server = Server('127.0.0.1', stand_in.port, protocol='http', max_connections=2)
+            failures = []
+
+            def requests():
+                for _ in range(5):
+                    failures.append(server.report('/missing/', '<x/>', {'Depth': '1'}))
+                for _ in range(5):
+                    try:
+                        list(server.report_stream('/missing/', '<x/>', {'Depth': '1'}))
+                    except OperationFailed as e:
+                        failures.append(e.actual_code)
+
+            self.run_bounded(requests)
+            self.assertEqual(failures, [None] * 5 + [500] * 5)
@@ -0,0 +1,134 @@
+import asyncio
+import socket
+import threading
+import time
+import unittest
+from datetime import datetime, timezone
+from email.utils import format_datetime
+
+import requests
+
+from benchmarks.StandInServer import StandInServer, fixed_account
+from calpy.caldav.Client import Client
+from calpy.caldav.Server import Server
+from calpy.caldav.Throttle import Throttle, retry_after
+
+
+class TestThrottle(unittest.TestCase):
+    def test_retry_after(self):
+        now = datetime(2020, 3, 2, 12, tzinfo=timezone.utc).timestamp()
+        self.assertEqual(retry_after('120'), 120.0)
+        self.assertEqual(retry_after(format_datetime(datetime(2020, 3, 2, 12, 0, 30, tzinfo=timezone.utc),
+                                                     usegmt=True), now), 30.0)
+        self.assertEqual(retry_after('Mon, 02 Mar 2020 11:00:00 GMT', now), 0.0)
+        self.assertIsNone(retry_after('soon'))
+        self.assertIsNone(retry_after(None))
+
+    def test_aimd(self):
+        throttle = Throttle(8)
+        for _ in range(8):
+            self.assertEqual(throttle.try_acquire(), 0)
+        self.assertIsNone(throttle.try_acquire())
+
+        throttle.release(throttled=True, delay=0)
+        self.assertEqual(throttle.limit, 4)
+        for _ in range(7):
+            throttle.release()
+        self.assertGreater(throttle.limit, 4)
+        self.assertLess(throttle.limit, 8)
+
+        throttle.release(False)
+        limit = throttle.limit
+        throttle.active = 1
+        throttle.release(adapt=False)
+        self.assertEqual(throttle.limit, limit)
+        throttle.active = 0
+        throttle.release(throttled=True, delay=10)
+        self.assertGreater(throttle.try_acquire(), 9)
+
+    def test_blocking_acquire(self):
+        throttle = Throttle(1)
+        throttle.acquire()
+        acquired = threading.Event()
+        thread = threading.Thread(target=lambda: (throttle.acquire(), acquired.set()))
+        thread.start()
+        self.assertFalse(acquired.wait(0.05))
+        throttle.release()
+        self.assertTrue(acquired.wait(1))
+        thread.join()
+
+    def test_async_acquire(self):
+        throttle = Throttle(1)
+        throttle.acquire()
+
+        async def wait():
+            task = asyncio.ensure_future(throttle.acquire_async())
+            await asyncio.sleep(0.05)
+            self.assertFalse(task.done())
+            threading.Thread(target=throttle.release).start()
+            await asyncio.wait_for(task, 1)
+            self.assertEqual(throttle._waiters, [])
+
+        asyncio.run(wait())
+        self.assertEqual(throttle.active, 1)
+
+    def test_delay(self):
+        throttle = Throttle(4, backoff=0.5, max_backoff=3)
+        self.assertEqual(throttle.delay(0), 0.5)
+        self.assertEqual(throttle.delay(2), 2.0)
+        self.assertEqual(throttle.delay(5), 3)
+        self.assertEqual(throttle.delay(0, '2'), 2.0)
+
+
+class TestServerThrottling(unittest.TestCase):
+    def test_retry_and_compression(self):
+        with StandInServer(fixed_account(1, 5)) as stand_in:
+            client = Client('127.0.0.1', stand_in.port, protocol='http')
+            stand_in.throttled = 2
+
+            start = time.monotonic()
+            cals = client.load_all()
+
+            self.assertEqual(len(cals[0].entries), 5)
+            self.assertEqual(stand_in.throttled, 0)
+            self.assertLess(time.monotonic() - start, 2)
+            self.assertGreater(stand_in.compressed, 0)
+            self.assertLess(client.server.throttle.limit, client.server.throttle.max_limit)
+
+    def test_exhausted_retries(self):
+        with StandInServer(fixed_account(1, 1)) as stand_in:
+            client = Client('127.0.0.1', stand_in.port, protocol='http', max_connections=2)
+            client.server.max_retries = 1
+            stand_in.throttled = 10
+            results = []
+
+            thread = threading.Thread(target=lambda: results.extend(
+                client.server.report('/calendars/c0/', '<x/>', {'Depth': '1'}) for _ in range(5)), daemon=True)
+            thread.start()
+            thread.join(10)
+            self.assertFalse(thread.is_alive(), 'throttled responses were not released to the pool')
+            self.assertEqual(results, [None] * 5)
+            self.assertEqual(stand_in.throttled, 0)
+
+    def test_failed_connection(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        server = Server('127.0.0.1', port, protocol='http', max_connections=7)
+        server.throttle.limit = 3.0
+        self.assertRaises(requests.ConnectionError, server.send, 'PROPFIND', '/', 207)
+        self.assertEqual(server.throttle.limit, 3.0)
+        self.assertEqual(server.throttle.active, 0)
+
+    def test_shared_pool(self):
+        with StandInServer(fixed_account(1, 1)) as stand_in:
+            a = Client('127.0.0.1', stand_in.port, protocol='http')
+            b = Client('127.0.0.1', stand_in.port, protocol='http', auth=('user', 'secret'))
+            self.assertIs(a.server.throttle, b.server.throttle)
+            self.assertIs(a.server.session.get_adapter(a.server.baseurl),
+                          b.server.session.get_adapter(b.server.baseurl))
+            c = Client('127.0.0.1', stand_in.port, protocol='http', max_connections=3)
+            self.assertIsNot(a.server.throttle, c.server.throttle)
+            self.assertEqual(c.server.throttle.max_limit, 3)
+            self.assertIsNot(a.server.session.get_adapter(a.server.baseurl),
+                             c.server.session.get_adapter(c.server.baseurl))
@@ -0,0 +1,148 @@
+import pickle
+import unittest
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from calpy.ical import VTIMEZONE as VTIMEZONEModule
+from calpy.ical.VCALENDAR import VCALENDAR
+from calpy.ical.VFREEBUSY import VFREEBUSY
+from calpy.ical.VOBJECT import VOBJECT, MalformedVObjectException
+from calpy.ical.VTIMEZONE import VTIMEZONE
+
+
+DATA = """BEGIN:VCALENDAR
+VERSION:2.0
+PRODID:-//calpy//tests//EN
+BEGIN:VTIMEZONE
+TZID:Europe/Berlin
+BEGIN:DAYLIGHT
+TZOFFSETFROM:+0100
+TZOFFSETTO:+0200
+DTSTART:19810329T020000
+RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU
+END:DAYLIGHT
+BEGIN:STANDARD
+TZOFFSETFROM:+0200
+TZOFFSETTO:+0100
+DTSTART:19961027T030000
+RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU
+END:STANDARD
+END:VTIMEZONE
+BEGIN:VEVENT
+UID:event-1
+SUMMARY:Team
+ meeting
+DTSTART;TZID=Europe/Berlin:20160730T123000
+DTEND;TZID=Europe/Berlin:20160730T133000
+END:VEVENT
+END:VCALENDAR
+"""
+
+
+class TestVCALENDAR(unittest.TestCase):
+
+    def test_parse(self):
+        cal = VCALENDAR('/cal/event-1.ics', '"1"', DATA)
+
+        self.assertEqual(cal.version, '2.0')
+        self.assertEqual(cal.prodid, '-//calpy//tests//EN')
+        self.assertEqual(cal.timezone.tzid, 'Europe/Berlin')
+        self.assertEqual(cal.event.summary, 'Teammeeting')
+        self.assertEqual(cal.event.dtstart, datetime(2016, 7, 30, 12, 30))
+        self.assertEqual(cal.event.dtend, datetime(2016, 7, 30, 13, 30))
+        self.assertIsNone(cal.todo)
+
+    def test_required_properties(self):
+        self.assertRaises(MalformedVObjectException, VCALENDAR, None, None, DATA.replace('VERSION:2.0\n', ''))
+
+    def test_recurrence_overrides(self):
+        data = DATA.replace('END:VEVENT\n', 'RRULE:FREQ=WEEKLY\nEND:VEVENT\n'
+                            'BEGIN:VEVENT\nUID:event-1\nRECURRENCE-ID;TZID=Europe/Berlin:20160806T123000\n'
+                            'SUMMARY:Moved\nDTSTART;TZID=Europe/Berlin:20160806T150000\n'
+                            'DTEND;TZID=Europe/Berlin:20160806T160000\nEND:VEVENT\n'
+                            'BEGIN:VEVENT\nUID:event-1\nRECURRENCE-ID;TZID=Europe/Berlin:20160813T123000\n'
+                            'SUMMARY:Moved again\nDTSTART;TZID=Europe/Berlin:20160813T150000\nEND:VEVENT\n')
+        cal = VCALENDAR('/cal/event-1.ics', '"2"', data)
+
+        self.assertEqual(len(cal.events), 3)
+        self.assertEqual(cal.event.summary, 'Teammeeting')
+        self.assertTrue(cal.event.recurring())
+        self.assertEqual(cal.get_override('event-1', datetime(2016, 8, 13, 12, 30)).summary, 'Moved again')
+        self.assertIsNone(cal.get_override('event-1', datetime(2016, 8, 20, 12, 30)))
+        self.assertTrue(cal.is_on(datetime(2016, 8, 6)))
+
+    def test_recurring_instances(self):
+        data = DATA.replace('END:VEVENT\n', 'RRULE:FREQ=WEEKLY;COUNT=4\nEXDATE;TZID=Europe/Berlin:20160813T123000\n'
+                            'END:VEVENT\nBEGIN:VEVENT\nUID:event-1\nRECURRENCE-ID:20160806T123000\n'
+                            'DTSTART:20160807T090000\nDTEND:20160807T100000\nEND:VEVENT\n')
+        cal = VCALENDAR('/cal/event-1.ics', '"3"', data)
+
+        self.assertTrue(cal.is_on(datetime(2016, 8, 20)))
+        self.assertTrue(cal.is_on(datetime(2016, 8, 7)))
+        self.assertFalse(cal.is_on(datetime(2016, 8, 6)))
+        self.assertFalse(cal.is_on(datetime(2016, 8, 13)))
+        self.assertFalse(cal.is_on(datetime(2016, 8, 27)))
+
+        instances = cal.instances(datetime(2016, 7, 1), datetime(2016, 9, 1))
+        self.assertEqual([(s, c.summary) for s, _, c in instances],
+                         [(datetime(2016, 7, 30, 12, 30), 'Teammeeting'),
+                          (datetime(2016, 8, 20, 12, 30), 'Teammeeting'),
+                          (datetime(2016, 8, 7, 9), None)])
+
+    def test_timezone_localize(self):
+        tz = VCALENDAR('/cal/event-1.ics', '"1"', DATA).timezone
+
+        self.assertEqual(tz.localize(datetime(2016, 7, 30, 10, 30)), datetime(2016, 7, 30, 12, 30))
+        self.assertEqual(tz.localize(datetime(2016, 12, 24, 18, 0)), datetime(2016, 12, 24, 19, 0))
+        # transitions at 01:00 UTC on the last sunday of march and october
+        self.assertEqual(tz.localize(datetime(2016, 3, 27, 0, 59)), datetime(2016, 3, 27, 1, 59))
+        self.assertEqual(tz.localize(datetime(2016, 3, 27, 1, 0)), datetime(2016, 3, 27, 3, 0))
+        self.assertEqual(tz.localize(datetime(2016, 10, 30, 1, 0)), datetime(2016, 10, 30, 2, 0))
+        self.assertEqual(tz.localize(datetime(1970, 1, 1)), datetime(1970, 1, 1, 1, 0))
+
+        # resources share identical definitions, separately created ones still share the transition table
+        self.assertIs(VCALENDAR('/cal/event-2.ics', '"1"', DATA, lazy=True).timezone, tz)
+        other = VTIMEZONE(tz.rawdata)
+        self.assertIsNot(tz, other)
+        self.assertIsNot(tz._times, other._times)
+        self.assertIs(tz._compiled()[0], other._compiled()[0])
+        self.assertIs(pickle.loads(pickle.dumps(tz.tzinfo())).vtimezone, tz)
+
+    def test_timezone_shared_lru(self):
+        tz = VCALENDAR('/cal/event-1.ics', '"1"', DATA).timezone
+        other = tz.rawdata.replace('Europe/Berlin', 'Other/Berlin')
+        third = tz.rawdata.replace('Europe/Berlin', 'Third/Berlin')
+
+        with mock.patch.object(VTIMEZONEModule, '_shared', OrderedDict()), \
+                mock.patch.object(VTIMEZONEModule, 'SHARED_TIMEZONES', 2):
+            first = VTIMEZONE.shared(tz.rawdata)
+            second = VTIMEZONE.shared(other)
+            # a hit makes the definition the most recently used one, the least recently used one is dropped
+            self.assertIs(VTIMEZONE.shared(tz.rawdata), first)
+            VTIMEZONE.shared(third)
+            self.assertIs(VTIMEZONE.shared(tz.rawdata), first)
+            self.assertIsNot(VTIMEZONE.shared(other), second)
+
+    def test_source_only_components(self):
+        freebusy = 'BEGIN:VFREEBUSY\r\nUID:fb-1\r\nFREEBUSY:19980314T233000Z/19980315T003000Z\r\nEND:VFREEBUSY'
+        tz = VCALENDAR('/cal/event-1.ics', '"1"', DATA).timezone
+        self.assertIs(VTIMEZONE.rawdata, VOBJECT.rawdata)
+        self.assertIs(VFREEBUSY.rawdata, VOBJECT.rawdata)
+        try:
+            # their source is their only serialization, it is kept whatever the retention of other components
+            VOBJECT.source_retention = None
+            self.assertEqual(VFREEBUSY(freebusy).rawdata, freebusy)
+            self.assertEqual(VTIMEZONE(tz.rawdata).rawdata, tz.rawdata)
+        finally:
+            VOBJECT.source_retention = 'compressed'
+        self.assertEqual(pickle.loads(pickle.dumps(VFREEBUSY(freebusy))).rawdata, freebusy)
+
+    def test_timezone_aware(self):
+        cal = VCALENDAR('/cal/event-1.ics', '"1"', DATA.replace('TZID:Europe/Berlin', 'TZID:Custom Berlin')
+                        .replace('TZID=Europe/Berlin', 'TZID="Custom Berlin"'))
+
+        self.assertEqual(cal.event.dtstart_tz.utcoffset(), timedelta(hours=2))
+        self.assertEqual(cal.event.dtstart_tz, datetime(2016, 7, 30, 10, 30, tzinfo=timezone.utc))
+        self.assertEqual(cal.event.dtend_tz - cal.event.dtstart_tz, timedelta(hours=1))
+        self.assertFalse(cal.event.all_day())
@@ -1,7 +1,9 @@
 import unittest
-from datetime import datetime
+from datetime import date, datetime, timezone
+from unittest import mock
 
 from calpy.ical.VEVENT import VEVENT
+from calpy.ical.VOBJECT import VOBJECT
 
 
 class TestVEVENT(unittest.TestCase):
@@ -25,3 +27,67 @@ class TestVEVENT(unittest.TestCase):
         self.ev.dtstart = datetime(2016, 7, 30, 12, 30, 0)
         self.ev.dtend = datetime(2016, 7, 31, 13, 00, 30)
         self.assertEqual(self.ev.get_duration(), 88230)
+
+    def test_lazy(self):
+        data = "BEGIN:VEVENT\nSUMMARY:Lazy\nDTSTART:20160730T123000\nDURATION:PT1H\nRRULE:FREQ=DAILY\nEND:VEVENT"
+        ev = VEVENT(data, lazy=True)
+
+        self.assertFalse(hasattr(ev, '_dtstart'))
+        self.assertEqual(ev.dtstart, datetime(2016, 7, 30, 12, 30))
+        self.assertTrue(hasattr(ev, '_dtstart'))
+        self.assertEqual(ev.end(), datetime(2016, 7, 30, 13, 30))
+        self.assertIsNone(ev.dtend)
+        self.assertEqual(ev.rrules, ['FREQ=DAILY'])
+        self.assertEqual(ev.rawdata, data)
+
+        ev.summary = 'changed'
+        self.assertEqual(ev.summary, 'changed')
+
+        eager = VEVENT(data)
+        self.assertIsNone(eager._block)
+        self.assertEqual((eager.summary, eager.dtstart, eager.rrules), ('Lazy', ev.dtstart, ev.rrules))
+
+    def test_datetime_decoded_once(self):
+        data = "BEGIN:VEVENT\nDTSTART;TZID=Europe/Berlin:20160730T123000\nDTEND:20160730T133000Z\nEND:VEVENT"
+
+        with mock.patch.object(VOBJECT, 'parse_datetime', wraps=VOBJECT.parse_datetime) as parse:
+            ev = VEVENT(data)
+        self.assertEqual(parse.call_count, 2)
+        self.assertEqual(ev.dtstart, datetime(2016, 7, 30, 12, 30))
+        self.assertEqual(ev.dtstart_tz.utcoffset().total_seconds(), 7200)
+        self.assertEqual(ev.dtend, datetime(2016, 7, 30, 13, 30))
+        self.assertEqual(ev.dtend_tz, datetime(2016, 7, 30, 13, 30, tzinfo=timezone.utc))
+
+        lazy = VEVENT(data, lazy=True)
+        self.assertEqual((lazy.dtstart, lazy.dtend), (ev.dtstart, ev.dtend))
+
+        ev = VEVENT("BEGIN:VEVENT\nDTSTART;VALUE=DATE:20160730\nEND:VEVENT")
+        self.assertEqual((ev.dtstart, ev.dtstart_tz, ev.dtend), (datetime(2016, 7, 30), date(2016, 7, 30), None))
+
+    def test_recurrence_dates_in_other_zones(self):
+        data = "BEGIN:VEVENT\nDTSTART;TZID=Europe/Berlin:20200302T090000\nDURATION:PT1H\nRRULE:FREQ=DAILY;COUNT=3\n" \
+               "EXDATE:20200303T080000Z\nRDATE;TZID=America/New_York:20200310T040000\nEND:VEVENT"
+        expected = [datetime(2020, 3, 2, 9), datetime(2020, 3, 4, 9), datetime(2020, 3, 10, 9)]
+
+        for lazy in (False, True):
+            ev = VEVENT(data, lazy=lazy)
+            self.assertEqual(ev.occurrences(datetime(2020, 3, 1), datetime(2020, 3, 31)), expected)
+            self.assertEqual(ev.next_occurrence(datetime(2020, 3, 2, 9)), datetime(2020, 3, 4, 9))
+
+    def test_source_retention(self):
+        data = "BEGIN:VEVENT\r\nUID:1\r\nSUMMARY:Kept\r\nDTSTART:20160730T123000\r\nEND:VEVENT\r\n"
+
+        ev = VEVENT(data)
+        self.assertFalse(hasattr(ev, '__dict__'))
+        self.assertIsInstance(ev._source, bytes)
+        self.assertEqual(ev.rawdata, data)
+
+        try:
+            VEVENT.source_retention = 'text'
+            self.assertEqual(VEVENT(data)._source, data)
+            VEVENT.source_retention = None
+            ev = VEVENT(data)
+        finally:
+            del VEVENT.source_retention
+        self.assertIsNone(ev.rawdata)
+        self.assertEqual((ev.uid, ev.summary), ('1', 'Kept'))
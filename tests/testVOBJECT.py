@@ -1,5 +1,5 @@
 import unittest
-from datetime import datetime
+from datetime import date, datetime, timezone
 
 from calpy.ical.VOBJECT import VOBJECT
 
@@ -14,4 +14,55 @@ class TestVOBJECT(unittest.TestCase):
     def test_clean_vobject_block(self):
         val = "BEGIN:Vevent&#13;\ndtstart:20160730&#13;\nSUMMARY:Test Event\nEND:vEVENT&#13;\n"
         out = "BEGIN:VEVENT\nDTSTART:20160730\nSUMMARY:Test Event\nEND:VEVENT"
-        self.assertEqual(VOBJECT.clean_vobject_block(val), out)
\ No newline at end of file
+        self.assertEqual(VOBJECT.clean_vobject_block(val), out)
+
+    def test_tokenize(self):
+        val = "BEGIN:Vevent\r\nsummary:Long\r\n  folded\r\n\t line\r\n" \
+              "DTSTART;TZID=Europe/Berlin;value=DATE-TIME:20160730T120000&#13;\n" \
+              "ATTENDEE;CN=\"Doe; John\";ROLE=REQ-PARTICIPANT:mailto:john@example.com\nno colon here\nEND:VEVENT"
+        lines = list(VOBJECT.tokenize(val))
+
+        self.assertEqual([l.name for l in lines], ['BEGIN', 'SUMMARY', 'DTSTART', 'ATTENDEE', 'END'])
+        self.assertEqual(lines[1].value, 'Long folded line')
+        self.assertEqual(lines[2].params, {'TZID': 'Europe/Berlin', 'VALUE': 'DATE-TIME'})
+        self.assertEqual(lines[2].value, '20160730T120000')
+        self.assertEqual(lines[3].params, {'CN': 'Doe; John', 'ROLE': 'REQ-PARTICIPANT'})
+        self.assertEqual(lines[3].value, 'mailto:john@example.com')
+        self.assertEqual(val[lines[1].start:lines[1].end], "summary:Long\r\n  folded\r\n\t line\r\n")
+
+    def test_interning(self):
+        first, second = (list(VOBJECT.tokenize(''.join(parts))) for parts in (
+            ('ATTENDEE;PARTSTAT=', 'ACCEPTED;CN=', 'Anna', ':mailto:a@example.com\nSTATUS:', 'CONFIRMED\n'),
+            ('ATTENDEE;PARTSTAT=ACC', 'EPTED;CN=An', 'na:mailto:a@example.com\nSTATUS:CONF', 'IRMED\n')))
+
+        self.assertIs(first[0].params['PARTSTAT'], second[0].params['PARTSTAT'])
+        self.assertIs(first[1].value, second[1].value)
+        self.assertIs(first[0].name, second[0].name)
+        # free text is not interned
+        self.assertIsNot(first[0].params['CN'], second[0].params['CN'])
+
+    def test_parse_block(self):
+        val = "BEGIN:VCALENDAR\nVERSION:2.0\nBEGIN:VEVENT\nSUMMARY:a\nBEGIN:VALARM\nACTION:DISPLAY\n" \
+              "END:VALARM\nEND:VEVENT\nEND:VCALENDAR\n"
+        block = VOBJECT.parse_block(val).unwrap('VCALENDAR')
+
+        self.assertEqual(block.name, 'VCALENDAR')
+        self.assertEqual(block.value('VERSION'), '2.0')
+        self.assertIsNone(block.value('SUMMARY'))
+        event = block.blocks('VEVENT')[0]
+        self.assertEqual(event.value('SUMMARY'), 'a')
+        self.assertIsNone(event.value('ACTION'))
+        self.assertEqual(event.blocks('VALARM')[0].value('ACTION'), 'DISPLAY')
+        self.assertEqual(event.raw(), val[val.index('BEGIN:VEVENT'):val.index('END:VCALENDAR')])
+
+    def test_decode_datetime(self):
+        self.assertEqual(VOBJECT.decode_datetime('20160721', {'VALUE': 'DATE'}), date(2016, 7, 21))
+        self.assertEqual(VOBJECT.decode_datetime('20160721T130418Z'),
+                         datetime(2016, 7, 21, 13, 4, 18, tzinfo=timezone.utc))
+        self.assertEqual(VOBJECT.decode_datetime('20160721T130418'), datetime(2016, 7, 21, 13, 4, 18))
+        self.assertEqual(VOBJECT.decode_datetime('20160721T150418', {'TZID': 'Europe/Berlin'}),
+                         datetime(2016, 7, 21, 13, 4, 18, tzinfo=timezone.utc))
+        self.assertEqual(VOBJECT.decode_datetimes(['20160721', '20160721T130418Z']),
+                         [date(2016, 7, 21), datetime(2016, 7, 21, 13, 4, 18, tzinfo=timezone.utc)])
+        self.assertRaises(ValueError, VOBJECT.parse_datetime, '2016-07-21')
+        self.assertRaises(ValueError, VOBJECT.parse_datetime, '20161321')
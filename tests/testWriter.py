@@ -0,0 +1,69 @@
+import io
+import unittest
+from datetime import datetime, timezone
+
+from calpy.ical.Reader import read_components
+from calpy.ical.VCALENDAR import VCALENDAR
+from calpy.ical.VEVENT import VEVENT
+from calpy.ical.VOBJECT import VOBJECT
+from calpy.ical.Writer import fold, serialize, dump_components
+
+
+DATA = "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//calpy//tests//EN\r\nX-WR-CALNAME:Test\r\n" \
+       "BEGIN:VEVENT\r\nUID:1\r\nSUMMARY:Lunch\r\nDTSTART;TZID=Europe/Berlin:20160730T123000\r\n" \
+       "ATTENDEE;CN=\"Doe, John\":mailto:john@example.com\r\nBEGIN:VALARM\r\nACTION:DISPLAY\r\nEND:VALARM\r\n" \
+       "END:VEVENT\r\nEND:VCALENDAR\r\n"
+
+
+class TestWriter(unittest.TestCase):
+
+    def test_fold(self):
+        self.assertEqual(fold('SUMMARY:short'), 'SUMMARY:short\r\n')
+        folded = fold('DESCRIPTION:' + 'ä' * 80)
+        lines = folded.split('\r\n')
+        self.assertEqual(lines[-1], '')
+        self.assertTrue(all(len(l.encode()) <= 75 for l in lines))
+        self.assertEqual(''.join(l[1:] if i else l for i, l in enumerate(lines)), 'DESCRIPTION:' + 'ä' * 80)
+
+    def test_roundtrip_unmodified(self):
+        for lazy in (False, True):
+            self.assertEqual(serialize(VCALENDAR('/1.ics', '"1"', DATA, lazy)), DATA)
+            self.assertEqual(serialize(VCALENDAR('/1.ics', '"1"', DATA.replace('\r\n', '\n'), lazy)), DATA)
+
+    def test_without_source(self):
+        try:
+            VOBJECT.source_retention = None
+            cal = VCALENDAR('/1.ics', '"1"', DATA)
+        finally:
+            VOBJECT.source_retention = 'compressed'
+
+        # only the decoded properties are left
+        self.assertEqual(serialize(cal.event), 'BEGIN:VEVENT\r\nUID:1\r\nSUMMARY:Lunch\r\n'
+                                               'DTSTART;TZID=Europe/Berlin:20160730T123000\r\nEND:VEVENT\r\n')
+
+    def test_modified_properties(self):
+        cal = VCALENDAR('/1.ics', '"1"', DATA, lazy=True)
+        cal.event.summary = 'Dinner'
+        cal.event.dtstart = datetime(2016, 7, 30, 19)
+        cal.event.dtend_tz = datetime(2016, 7, 30, 19, 0, tzinfo=timezone.utc)
+
+        out = serialize(cal)
+        self.assertEqual(out, DATA.replace('SUMMARY:Lunch', 'SUMMARY:Dinner')
+                         .replace('20160730T123000', '20160730T190000')
+                         .replace('END:VALARM\r\n', 'END:VALARM\r\nDTEND:20160730T190000Z\r\n'))
+
+        event = VCALENDAR('/1.ics', '"2"', out).event
+        self.assertEqual((event.summary, event.dtstart), ('Dinner', datetime(2016, 7, 30, 19)))
+
+    def test_new_component(self):
+        ev = VEVENT('')
+        ev.uid = 'new'
+        ev.rrules = ['FREQ=DAILY', 'FREQ=WEEKLY']
+        self.assertEqual(serialize(ev), 'BEGIN:VEVENT\r\nUID:new\r\nRRULE:FREQ=DAILY\r\nRRULE:FREQ=WEEKLY\r\n'
+                                        'END:VEVENT\r\n')
+
+    def test_dump_components(self):
+        out = io.BytesIO()
+        dump_components(read_components(io.StringIO(DATA)), out)
+        self.assertEqual(out.getvalue().decode(), DATA.replace('X-WR-CALNAME:Test\r\n', '')
+                         .replace('PRODID:-//calpy//tests//EN', 'PRODID:-//calpy//calpy//EN'))